@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""Measure conversion throughput across the delivery matrix
+
+Synthetic plates are converted with convert_image for each file format and
+color depth and with convert_movie for each movie codec listed in
+vgenc.gui. Real oiiotool and ffmpeg binaries are needed.
+
+Usage:
+    python -m benchmarks.formats --resolution 2048 1080 --frames 48
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+from vgenc.convert import convert_image, convert_movie
+from vgenc.process import run, record_telemetry, Telemetry
+from vgenc.gui import (
+    file_formats, color_depths, movie_containers, movie_codecs,
+    oiiotool_bit_depths)
+
+exr_compressions = ['none', 'rle', 'zips', 'zip', 'piz', 'pxr24', 'b44',
+                    'dwaa', 'dwab']
+start_frame = 1001
+digits = 4
+
+
+def generate_plates(
+        directory: str,
+        resolution: tuple[int, int],
+        frame_count: int) -> str:
+    """Write deterministic half float EXR plates
+
+    A gradient with seeded noise is used so each frame is different but the
+    same on every run.
+
+    Returns:
+        The hash pattern path of the sequence
+    """
+    x, y = resolution
+    os.makedirs(directory, exist_ok=True)
+    for frame in range(start_frame, start_frame + frame_count):
+        run([
+            'oiiotool',
+            '--pattern', 'fill:top=0.05,0.1,0.2:bottom=0.9,0.6,0.3',
+            f'{x}x{y}', '3',
+            f'--noise:type=gaussian:mean=0:stddev=0.05:seed={frame}',
+            '-d', 'half',
+            '-o', os.path.join(directory, f'plate.{frame:0{digits}}.exr')],
+            check=True)
+    return os.path.join(directory, f"plate.{'#' * digits}.exr")
+
+
+def measure(telemetry: Telemetry, name: str, frame_count: int) -> dict:
+    records = [r for r in telemetry.records if r['category'] == 'process']
+    cpu = sum((r['user'] or 0.0) + (r['system'] or 0.0) for r in records)
+    written = sum(r['bytes_written'] for r in records)
+    wall = telemetry.wall_time
+    return {
+        'name': name,
+        'frames': frame_count,
+        'wall': wall,
+        'fps': frame_count / wall if wall else None,
+        'cpu_per_frame': cpu / frame_count,
+        'bytes_per_frame': written / frame_count,
+        'max_rss': max((r['max_rss'] or 0 for r in records), default=0),
+        'failures': sum(1 for r in records if r['returncode'] != 0)}
+
+
+def image_variants():
+    """Yield (name, extension, compression, data format) to benchmark"""
+    for format_name, format_data in file_formats.items():
+        ext = format_data['ext']
+        if ext == '.j2c':  # oiiotool can't write j2c, bpy is needed
+            continue
+        compressions = [format_data.get('compression')]
+        if ext == '.exr':
+            compressions = exr_compressions
+        for depth_name in format_data.get('color_depths', color_depths):
+            data_format = oiiotool_bit_depths[color_depths[depth_name]]
+            for compression in compressions:
+                name = f'{format_name} {depth_name}'
+                if compression is not None:
+                    name += f' {compression}'
+                yield name, ext, compression, data_format
+
+
+def movie_extension(codec_name: str) -> str:
+    for container in movie_containers.values():
+        if codec_name in container.get('codecs', []):
+            return container['ext']
+    return '.mkv'
+
+
+def run_matrix(
+        directory: str,
+        resolution: tuple[int, int],
+        frame_count: int) -> list[dict]:
+    plates = generate_plates(
+        os.path.join(directory, 'plates'), resolution, frame_count)
+    frame_range = (start_frame, start_frame + frame_count - 1)
+    results = []
+
+    for name, ext, compression, data_format in image_variants():
+        output_dir = os.path.join(directory, 'images', name.replace(' ', '_'))
+        with record_telemetry(name) as telemetry:
+            convert_image(
+                input_path=plates,
+                output_path=os.path.join(
+                    output_dir, f"image.{'#' * digits}{ext}"),
+                compression=compression,
+                data_format=data_format,
+                rgb_only=True,
+                image_sequence=True,
+                frame_range=frame_range,
+                progress_callback=lambda event: None)
+        results.append(measure(telemetry, name, frame_count))
+        print(_format_row(results[-1]), file=sys.stderr)
+        shutil.rmtree(output_dir)
+
+    # Movies are encoded from an 8 bits intermediate as done for deliveries
+    source_dir = os.path.join(directory, 'source')
+    convert_image(
+        input_path=plates,
+        output_path=os.path.join(source_dir, f"image.{'#' * digits}.png"),
+        data_format='uint8',
+        rgb_only=True,
+        image_sequence=True,
+        frame_range=frame_range,
+        progress_callback=lambda event: None)
+    for codec_name, codec_data in movie_codecs.items():
+        output_path = os.path.join(
+            directory, 'movies', f'movie{movie_extension(codec_name)}')
+        with record_telemetry(codec_name) as telemetry:
+            convert_movie(
+                input_path=os.path.join(source_dir, f'image.%0{digits}d.png'),
+                output_path=output_path,
+                frame_range=frame_range,
+                video_codec=codec_data.get('codec'),
+                video_profile=codec_data.get('profile'),
+                video_quality=codec_data.get('quality'),
+                constrained_quality=codec_data.get('crf'),
+                video_bitrate=codec_data.get('bitrate'),
+                pixel_format=codec_data.get('pixel_format'))
+        results.append(measure(telemetry, codec_name, frame_count))
+        print(_format_row(results[-1]), file=sys.stderr)
+        os.remove(output_path)
+    return results
+
+
+_columns = ('name', 'fps', 'cpu_per_frame', 'bytes_per_frame', 'max_rss',
+            'failures')
+
+
+def _format_row(row: dict) -> str:
+    values = [
+        f'{row[k]:.2f}' if isinstance(row[k], float) else str(row[k])
+        for k in _columns]
+    return '{:<36}{:>10}{:>16}{:>18}{:>14}{:>10}'.format(*values)
+
+
+def format_table(results: list[dict]) -> str:
+    lines = ['{:<36}{:>10}{:>16}{:>18}{:>14}{:>10}'.format(*_columns)]
+    lines.extend(_format_row(row) for row in results)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--resolution', type=int, nargs=2, default=(2048, 1080),
+        metavar=('x', 'y'))
+    parser.add_argument(
+        '--frames', type=int, default=24, metavar='number')
+    parser.add_argument(
+        '--json', required=False, metavar='path',
+        help='write results as JSON')
+    parser.add_argument(
+        '--keep', required=False, metavar='path',
+        help='work in this directory and keep generated plates')
+    args = parser.parse_args()
+
+    directory = args.keep or tempfile.mkdtemp(prefix='vgenc-formats-')
+    try:
+        results = run_matrix(directory, tuple(args.resolution), args.frames)
+    finally:
+        if args.keep is None:
+            shutil.rmtree(directory)
+    print(format_table(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
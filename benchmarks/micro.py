@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""Time the Python side of vgenc with stub binaries on PATH
+
+Usage:
+    python -m benchmarks.micro --sizes 10000 50000
+    python -m benchmarks.micro --large  # Add the 200000 frames case
+    python -m benchmarks.micro --save  # Record baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import argparse
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from vgenc import convert
+from vgenc.files import (
+    get_frame_info, find_image_sequence_range,
+    find_frame_mapping_from_hash_pattern, fill_missing_images,
+    generate_missing_frames)
+from .stubs import stub_binaries, generate_sequence
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baseline.json')
+start_frame = 1001
+digits = 6
+large_size = 200000
+
+
+def measure(function: Callable, repeat: int = 3) -> float:
+    """Return the best wall time of repeated calls"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@contextmanager
+def null_runner() -> Iterator[None]:
+    """Skip command execution to time command construction only"""
+    run, run_oiiotool = convert.run, convert.run_oiiotool
+    convert.run = lambda command, **_: None
+    convert.run_oiiotool = lambda command, **_: 0
+    logging.disable(logging.ERROR)  # Outputs are never generated
+    try:
+        yield
+    finally:
+        convert.run, convert.run_oiiotool = run, run_oiiotool
+        logging.disable(logging.NOTSET)
+
+
+def run_benchmarks(size: int, directory: str, repeat: int) -> dict:
+    sequence_dir = os.path.join(directory, str(size))
+    missing = generate_sequence(
+        sequence_dir, size, start=start_frame, digits=digits)
+    end_frame = start_frame + size - 1
+    hash_path = os.path.join(sequence_dir, f"image.{'#' * digits}.exr")
+    printf_path = os.path.join(sequence_dir, f'image.%0{digits}d.exr')
+    frame_paths = [
+        os.path.join(sequence_dir, f'image.{f:0{digits}}.exr')
+        for f in range(start_frame, end_frame + 1)]
+    _, frame_mapping = find_frame_mapping_from_hash_pattern(hash_path)
+    output_dir = os.path.join(directory, f'{size}_output')
+
+    def generate_missing_frames_previous():
+        created = generate_missing_frames(
+            printf_path, (start_frame, end_frame), start_frame, 'previous')
+        for path in created:
+            os.remove(path)
+
+    def convert_image_sequence():
+        with null_runner():
+            convert.convert_image(
+                input_path=hash_path,
+                output_path=os.path.join(
+                    output_dir, f"image.{'#' * digits}.jpg"),
+                input_colorspace='ACEScg',
+                display_view=('sRGB', 'ACES 1.0 - SDR Video'),
+                cut=((2048, 1080), (0, 0)),
+                compression='jpeg:95',
+                image_sequence=True,
+                frame_range=(start_frame, end_frame),
+                progress_callback=lambda event: None)
+
+    def write_ffmpeg_sendcmd():
+        convert.write_ffmpeg_sendcmd(
+            {f: f'frame {f}' for f in range(start_frame, end_frame + 1)},
+            frame_rate=24,
+            output_path=os.path.join(directory, f'{size}.cmd'))
+
+    benchmarks = {
+        'get_frame_info': lambda: [get_frame_info(p) for p in frame_paths],
+        'find_image_sequence_range': lambda: find_image_sequence_range(
+            frame_paths[0], digits=digits, prefix='image.', suffix='.exr'),
+        'find_frame_mapping_from_hash_pattern': (
+            lambda: find_frame_mapping_from_hash_pattern(hash_path)),
+        'fill_missing_images': lambda: fill_missing_images(
+            frame_mapping, start_frame, end_frame),
+        'generate_missing_frames': generate_missing_frames_previous,
+        'convert_image_sequence': convert_image_sequence,
+        'write_ffmpeg_sendcmd': write_ffmpeg_sendcmd}
+    results = {}
+    for name, function in benchmarks.items():
+        results[name] = measure(function, repeat=repeat)
+        print(
+            f'{name:<40}{size:>8} frames {results[name]:>10.4f}s'
+            f' ({len(missing)} missing)', file=sys.stderr)
+    return results
+
+
+def compare(
+        results: dict[str, dict[str, float]],
+        baseline: dict[str, dict[str, float]],
+        tolerance: float) -> list[str]:
+    """Return the benchmarks slower than baseline by more than tolerance"""
+    regressions = []
+    for size, timings in results.items():
+        for name, value in timings.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference and value > reference * (1 + tolerance):
+                regressions.append(
+                    f'{name}[{size}]: {value:.4f}s vs {reference:.4f}s')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--sizes', nargs='+', type=int, default=[10000, 50000],
+        metavar='number')
+    parser.add_argument(
+        '--large', action='store_true',
+        help=f'also run {large_size} frames (takes minutes)')
+    parser.add_argument(
+        '--repeat', type=int, default=3, metavar='number')
+    parser.add_argument(
+        '--save', action='store_true',
+        help='record results as the new baseline')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25, metavar='ratio',
+        help='allowed slowdown before reporting a regression')
+    args = parser.parse_args()
+
+    if args.large and large_size not in args.sizes:
+        args.sizes.append(large_size)
+
+    results = {}
+    directory = tempfile.mkdtemp(prefix='vgenc-bench-')
+    try:
+        with stub_binaries():
+            for size in args.sizes:
+                results[str(size)] = run_benchmarks(
+                    size, directory, repeat=args.repeat)
+    finally:
+        shutil.rmtree(directory)
+    print(json.dumps(results, indent=2))
+
+    if args.save:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if regressions := compare(results, baseline, args.tolerance):
+            print('Regressions:', *regressions, sep='\n', file=sys.stderr)
+            sys.exit(1)
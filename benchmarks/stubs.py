@@ -0,0 +1,104 @@
+import os
+import sys
+import stat
+import tempfile
+import shutil
+from contextlib import contextmanager
+from typing import Iterator
+
+# Each stub behaves like the real tool for what vgenc reads: output files
+# are created (empty) and probe tools print a fixed description.
+_stubs = {
+    'oiiotool': '''
+args = sys.argv[1:]
+if '-o' in args:
+    open(args[args.index('-o') + 1], 'wb').close()
+''',
+    'maketx': '''
+args = sys.argv[1:]
+if '-o' in args:
+    open(args[args.index('-o') + 1], 'wb').close()
+''',
+    'magick': '''
+args = sys.argv[1:]
+if args and not args[-1].startswith('-'):
+    open(args[-1], 'wb').close()
+''',
+    'ffmpeg': '''
+args = [a for a in sys.argv[1:] if a != '-y']
+output = args[-1] if args else None
+if output and '%' not in output and output not in ('NUL', '/dev/null'):
+    open(output, 'wb').close()
+if '-progress' in args:
+    print('frame=1\\nfps=0.0\\ntotal_size=0\\nspeed=N/A\\nprogress=end')
+''',
+    'ffprobe': '''
+print(json.dumps({
+    'format': {'duration': '10.0', 'tags': {}},
+    'streams': [{
+        'index': 0, 'codec_type': 'video', 'codec_name': 'h264',
+        'width': 1920, 'height': 1080, 'pix_fmt': 'yuv420p',
+        'r_frame_rate': '24/1', 'time_base': '1/24',
+        'nb_read_packets': '240'}]}))
+''',
+    'iinfo': '''
+path = sys.argv[-1]
+if '-v' in sys.argv:
+    print(f'{path} : 1920 x 1080, 3 channel, half openexr')
+    print('    channel list: R, G, B')
+    print('    compression: "zip"')
+    print('    PixelAspectRatio: 1')
+else:
+    print(f'{path} : 1920 x 1080, 3 channel, half openexr')
+'''}
+
+
+def write_stubs(directory: str) -> list[str]:
+    """Write stub executables of the external tools used by vgenc"""
+    paths = []
+    for name, body in _stubs.items():
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(f'#!{sys.executable}\nimport sys\nimport json\n{body}')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        paths.append(path)
+    return paths
+
+
+@contextmanager
+def stub_binaries() -> Iterator[str]:
+    """Put stub executables first on PATH for the duration of the context"""
+    directory = tempfile.mkdtemp(prefix='vgenc-stubs-')
+    write_stubs(directory)
+    previous_path = os.environ.get('PATH', '')
+    os.environ['PATH'] = os.pathsep.join((directory, previous_path))
+    try:
+        yield directory
+    finally:
+        os.environ['PATH'] = previous_path
+        shutil.rmtree(directory)
+
+
+def generate_sequence(
+        directory: str,
+        frame_count: int,
+        start: int = 1001,
+        gap_every: int = 97,
+        gap_size: int = 3,
+        name: str = 'image',
+        digits: int = 6,
+        ext: str = '.exr') -> list[int]:
+    """Create an empty image sequence with regular gaps
+
+    Returns:
+        The missing frame numbers
+    """
+    os.makedirs(directory, exist_ok=True)
+    missing = []
+    for frame in range(start, start + frame_count):
+        if gap_every and (frame - start) % gap_every >= gap_every - gap_size:
+            missing.append(frame)
+            continue
+        path = os.path.join(directory, f'{name}.{frame:0{digits}}{ext}')
+        open(path, 'wb').close()
+    return missing
@@ -0,0 +1,48 @@
+import struct
+import pytest
+
+
+def _attribute(name: str, type_name: str, value: bytes) -> bytes:
+    return (name.encode() + b'\0' + type_name.encode() + b'\0'
+            + struct.pack('<i', len(value)) + value)
+
+
+def write_exr(
+        path,
+        width: int = 4,
+        height: int = 2,
+        channels: tuple[str, ...] = ('B', 'G', 'R'),
+        strings: dict[str, str] | None = None,
+        floats: dict[str, float] | None = None,
+        truncate: bool = False) -> None:
+    """Write an uncompressed half float scanline OpenEXR file"""
+    chlist = b''.join(
+        name.encode() + b'\0' + struct.pack('<iB3xii', 1, 0, 1, 1)
+        for name in channels) + b'\0'
+    header = struct.pack('<ii', 20000630, 2)
+    header += _attribute('channels', 'chlist', chlist)
+    header += _attribute('compression', 'compression', b'\0')
+    header += _attribute(
+        'dataWindow', 'box2i', struct.pack('<iiii', 0, 0, width - 1,
+                                           height - 1))
+    header += _attribute('lineOrder', 'lineOrder', b'\0')
+    for name, value in (strings or {}).items():
+        header += _attribute(name, 'string', value.encode())
+    for name, value in (floats or {}).items():
+        header += _attribute(name, 'float', struct.pack('<f', value))
+    header += b'\0'
+    line_size = width * len(channels) * 2
+    table_end = len(header) + height * 8
+    offsets = [table_end + y * (8 + line_size) for y in range(height)]
+    data = header + struct.pack(f'<{height}Q', *offsets)
+    for y in range(height):
+        data += struct.pack('<ii', y, line_size) + b'\0' * line_size
+    if truncate:
+        data = data[:-line_size // 2]
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@pytest.fixture
+def make_exr():
+    return write_exr
@@ -0,0 +1,25 @@
+from vgenc import audio
+from vgenc.audio import prepare_audio
+
+
+def test_prepare_audio_cache(tmp_path, monkeypatch):
+    commands = []
+
+    def run(command, **_):
+        commands.append(command)
+        open(command[-2], 'wb').close()
+    monkeypatch.setattr(audio, 'run', run)
+    source = tmp_path / 'audio.wav'
+    source.write_bytes(b'wav')
+    cache_dir = str(tmp_path / 'cache')
+    (tmp_path / 'cache').mkdir()
+
+    assert prepare_audio(str(source), None) == str(source)
+    assert prepare_audio(str(source), 'copy') == str(source)
+    first = prepare_audio(str(source), 'opus', cache_dir=cache_dir)
+    assert prepare_audio(str(source), 'opus', cache_dir=cache_dir) == first
+    assert len(commands) == 1
+    assert commands[0][commands[0].index('-c:a') + 1] == 'libopus'
+    assert prepare_audio(
+        str(source), 'opus', audio_bitrate='96k', cache_dir=cache_dir) != first
+    assert len(commands) == 2
@@ -0,0 +1,119 @@
+from fractions import Fraction
+from types import SimpleNamespace
+import pytest
+from vgenc import autotune
+from vgenc.autotune import autotune_encoder, _get_psnr, _sample_ranges
+
+
+def test_sample_ranges():
+    assert _sample_ranges((1, 100), 3, 10) == [
+        (1, 10), (46, 55), (91, 100)]
+    assert _sample_ranges((1, 5), 3, 10) == [(1, 5)]
+
+
+@pytest.fixture
+def encodes(monkeypatch):
+    """Replace encodes with empty outputs and count them"""
+    calls = []
+
+    def convert_movie(output_path, frame_range, **kwargs):
+        calls.append(frame_range)
+        convert_movie.kwargs = kwargs
+        with open(output_path, 'wb') as f:
+            f.write(b'x' * 100)
+    monkeypatch.setattr(autotune, 'convert_movie', convert_movie)
+    return calls
+
+
+def test_frame_range_from_sequence(tmp_path, encodes):
+    for frame in range(1001, 1101):
+        (tmp_path / f'image.{frame}.png').touch()
+    autotune_encoder(
+        str(tmp_path / 'image.%04d.png'), 'h264',
+        candidates=[{'preset': 'fast'}],
+        cache_path=str(tmp_path / 'autotune.json'))
+    assert encodes[0][0] == 1001
+    assert encodes[-1][1] == 1100
+
+
+def test_cache_depends_on_encode_settings(tmp_path, encodes):
+    kwargs = {
+        'input_path': str(tmp_path / 'image.%04d.png'),
+        'video_codec': 'h264',
+        'frame_range': (1, 48),
+        'sample_count': 1,
+        'candidates': [{'preset': 'fast'}],
+        'cache_path': str(tmp_path / 'autotune.json')}
+    autotune_encoder(**kwargs)
+    autotune_encoder(**kwargs)
+    assert len(encodes) == 1
+    autotune_encoder(pixel_format='yuv444p', **kwargs)
+    assert len(encodes) == 2
+    autotune_encoder(pixel_format='yuv444p', video_bitrate=None, **kwargs)
+    assert len(encodes) == 3
+
+
+def test_movie_input(tmp_path, encodes, monkeypatch):
+    monkeypatch.setattr(
+        autotune, 'get_movie_frame_rate', lambda path: Fraction(24))
+    monkeypatch.setattr(autotune, 'get_movie_duration', lambda path: 100)
+    decision = autotune_encoder(
+        'in.mov', 'h264', candidates=[{'preset': 'fast'}],
+        cache_path=str(tmp_path / 'autotune.json'))
+    assert encodes[0][0] == 1 and encodes[-1][1] == 100
+    # Movies keep their frame rate
+    assert autotune.convert_movie.kwargs['frame_rate'] is None
+    assert decision['bitrate'] == 100 * 8 * 24 / 24
+    with pytest.raises(ValueError):
+        autotune_encoder(
+            ['left.mov', 'right.mov'], 'h264', refresh=True,
+            cache_path=str(tmp_path / 'autotune.json'))
+
+
+def test_get_psnr(monkeypatch):
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        return SimpleNamespace(stderr='[Parsed_psnr_0] PSNR average:41.5')
+    monkeypatch.setattr(autotune, 'run', run)
+    assert _get_psnr('a.mkv', 'in.%04d.exr', (1001, 1024), 25) == 41.5
+    assert commands[-1][3:7] == [
+        '-framerate', '25', '-start_number', '1001']
+    assert _get_psnr('a.mkv', 'in.mov', (25, 48), Fraction(24)) == 41.5
+    assert commands[-1][3:7] == ['-ss', f'{23.5 / 24:.6f}', '-i', 'in.mov']
+
+
+@pytest.mark.parametrize('targets, preset, met_target', [
+    ({}, 'ultrafast', True),
+    ({'target_bitrate': 2000, 'target_psnr': 35}, 'fast', True),
+    ({'target_bitrate': 1000}, 'slow', True),
+    ({'target_psnr': 45}, 'slow', False),
+    ({'target_bitrate': 500}, 'slow', False)])
+def test_candidate_selection(tmp_path, monkeypatch, targets, preset,
+                             met_target):
+    # Slower presets give smaller, better outputs
+    presets = {
+        'ultrafast': (1.0, 300, 30.0),
+        'fast': (2.0, 200, 38.0),
+        'slow': (4.0, 100, 42.0)}
+    clock = SimpleNamespace(now=0.0, preset=None)
+
+    def convert_movie(output_path, encoder_options, **_):
+        clock.preset = encoder_options['preset']
+        duration, size, _ = presets[clock.preset]
+        clock.now += duration
+        with open(output_path, 'wb') as f:
+            f.write(b'x' * size)
+    monkeypatch.setattr(autotune, 'convert_movie', convert_movie)
+    monkeypatch.setattr(autotune, 'time', SimpleNamespace(
+        perf_counter=lambda: clock.now))
+    monkeypatch.setattr(
+        autotune, '_get_psnr', lambda *args: presets[clock.preset][2])
+    decision = autotune_encoder(
+        'image.%04d.png', 'h264', frame_range=(1, 48), sample_count=1,
+        candidates=[{'preset': p} for p in presets],
+        cache_path=str(tmp_path / 'autotune.json'), **targets)
+    assert decision['options'] == {'preset': preset}
+    assert decision['met_target'] is met_target
+    assert decision['bitrate'] == presets[preset][1] * 8 * 25 / 24
@@ -0,0 +1,68 @@
+import json
+import subprocess
+import pytest
+from vgenc import batch
+from vgenc.batch import batch_convert_tx
+
+
+@pytest.fixture
+def maketx(monkeypatch):
+    """Fake TX files holding their attributes as JSON"""
+    converted = []
+
+    def convert_tx(input_path, output_path, metadata=None, **kwargs):
+        converted.append(input_path)
+        with open(output_path, 'w') as f:
+            json.dump(metadata, f)
+
+    def get_metadata_from_image(path):
+        with open(path) as f:
+            text = f.read()
+        if not text:
+            raise subprocess.CalledProcessError(1, ['iinfo', path])
+        return json.loads(text)
+
+    monkeypatch.setattr(batch, 'convert_tx', convert_tx)
+    monkeypatch.setattr(
+        batch, 'get_metadata_from_image', get_metadata_from_image)
+    return converted
+
+
+def test_batch_convert_tx(tmp_path, maketx):
+    for name, content in (('a', b'1'), ('b', b'1'), ('c', b'2')):
+        (tmp_path / f'{name}.png').write_bytes(content)
+    tx_paths = batch_convert_tx(str(tmp_path), workers=2)
+    assert sorted(tx_paths.values()) == [
+        str(tmp_path / f'{name}.tx') for name in 'abc']
+    # Identical sources are converted once
+    assert sorted(maketx) == [str(tmp_path / 'a.png'), str(tmp_path / 'c.png')]
+    # Copies are up to date on the next run
+    maketx.clear()
+    batch_convert_tx(str(tmp_path))
+    assert maketx == []
+    (tmp_path / 'b.png').write_bytes(b'3')
+    batch_convert_tx(str(tmp_path))
+    assert maketx == [str(tmp_path / 'b.png')]
+    maketx.clear()
+    batch_convert_tx(str(tmp_path), color_convert=('sRGB', 'ACEScg'))
+    assert len(maketx) == 3
+
+
+def test_batch_convert_tx_unreadable(tmp_path, maketx):
+    (tmp_path / 'a.png').write_bytes(b'1')
+    (tmp_path / 'a.tx').write_bytes(b'')
+    batch_convert_tx(str(tmp_path / 'a.png'))
+    assert maketx == [str(tmp_path / 'a.png')]
+
+
+def test_batch_convert_tx_copy_up_to_date(tmp_path, maketx):
+    (tmp_path / 'a.png').write_bytes(b'1')
+    batch_convert_tx(str(tmp_path))
+    # A new source identical to an up to date one is not converted
+    (tmp_path / 'b.png').write_bytes(b'1')
+    maketx.clear()
+    batch_convert_tx(str(tmp_path))
+    assert maketx == []
+    assert (tmp_path / 'b.tx').read_text() == (tmp_path / 'a.tx').read_text()
+    batch_convert_tx(str(tmp_path))
+    assert maketx == []
@@ -0,0 +1,61 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from vgenc.checksum import (
+    get_manifest_path, hash_file, read_manifest, write_checksum_manifest,
+    ChecksumManifest)
+
+
+def test_get_manifest_path():
+    assert get_manifest_path('/dir/image.####.exr') == '/dir/image.sha256'
+    assert get_manifest_path('/dir/image_%04d.exr', 'md5') == '/dir/image.md5'
+    assert get_manifest_path('/dir/movie.mov') == '/dir/movie.mov.sha256'
+    assert get_manifest_path('/dir/####.exr') == '/dir/sequence.exr.sha256'
+    assert get_manifest_path('/dir/%04d.jpg', 'sha1') == (
+        '/dir/sequence.jpg.sha1')
+
+
+def test_hash_file(tmp_path):
+    (tmp_path / 'a.bin').write_bytes(b'vgenc')
+    assert hash_file(str(tmp_path / 'a.bin'), 'md5') == (
+        hashlib.md5(b'vgenc').hexdigest())
+
+
+def test_manifest_keeps_previous_entries(tmp_path):
+    for name in ('a.0001.exr', 'a.0002.exr'):
+        (tmp_path / name).write_bytes(name.encode())
+    manifest_path = str(tmp_path / 'a.sha256')
+    write_checksum_manifest([str(tmp_path / 'a.0001.exr')], manifest_path)
+    with ChecksumManifest(manifest_path) as manifest:
+        manifest.add(str(tmp_path / 'a.0002.exr'))
+        manifest.add(str(tmp_path / 'missing.exr'))
+    entries = read_manifest(manifest_path)
+    assert entries == {
+        'a.0001.exr': hashlib.sha256(b'a.0001.exr').hexdigest(),
+        'a.0002.exr': hashlib.sha256(b'a.0002.exr').hexdigest()}
+
+
+def test_concurrent_manifests(tmp_path):
+    # Encodes of several sequences share the manifest of their directory
+    manifest_path = str(tmp_path / 'shots.sha256')
+    paths = []
+    for index in range(8):
+        paths.append(str(tmp_path / f'shot{index}.exr'))
+        with open(paths[-1], 'wb') as f:
+            f.write(bytes([index]))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(
+            lambda path: write_checksum_manifest([path], manifest_path),
+            paths))
+    assert len(read_manifest(manifest_path)) == 8
+    assert sorted(p.name for p in tmp_path.iterdir())[-1] == 'shots.sha256'
+
+
+def test_stale_lock(tmp_path):
+    (tmp_path / 'a.bin').write_bytes(b'vgenc')
+    manifest_path = str(tmp_path / 'a.sha256')
+    lock_path = tmp_path / 'a.sha256.lock'
+    lock_path.touch()
+    os.utime(lock_path, (0, 0))
+    write_checksum_manifest([str(tmp_path / 'a.bin')], manifest_path)
+    assert not lock_path.exists()
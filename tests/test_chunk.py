@@ -0,0 +1,198 @@
+import pytest
+from vgenc import chunk
+from vgenc.chunk import (
+    split_frame_range, _closed_gop_options, _offset_draw_text,
+    convert_movie_chunked)
+
+
+def test_split_frame_range():
+    assert split_frame_range((1001, 1010), 4) == [
+        (1001, 1004), (1005, 1008), (1009, 1010)]
+    assert split_frame_range((1, 3), 10) == [(1, 3)]
+
+
+def test_closed_gop_options():
+    assert _closed_gop_options('h264', {'preset': 'slow'}) == {
+        'preset': 'slow'}
+    assert _closed_gop_options('h265', None) == {
+        'x265-params': 'open-gop=0'}
+    assert _closed_gop_options('libx265', {'x265-params': 'keyint=24'}) == {
+        'x265-params': 'keyint=24:open-gop=0'}
+
+
+def test_offset_draw_text():
+    text = {'text': 'a', 'start_number': 1001}
+    assert _offset_draw_text(text, 10) == {'text': 'a', 'start_number': 1011}
+    assert _offset_draw_text([text, {'text': 'b'}], 5) == [
+        {'text': 'a', 'start_number': 1006}, {'text': 'b'}]
+    assert _offset_draw_text(text, 0) is text
+
+
+@pytest.fixture
+def encodes(monkeypatch):
+    """Fake encodes writing the frame range, joined by concatenation"""
+    calls = []
+
+    def convert_movie(output_path, frame_range, **_):
+        calls.append(tuple(frame_range))
+        with open(output_path, 'w') as f:
+            f.write('{} {}\n'.format(*frame_range))
+
+    def concatenate(input_paths, output_path, **_):
+        with open(output_path, 'w') as f:
+            for path in input_paths:
+                with open(path) as segment:
+                    f.write(segment.read())
+
+    def mux_movie(video_path, output_path, **_):
+        concatenate([video_path], output_path)
+
+    def get_movie_duration(path):
+        start, end = map(int, open(path).read().split())
+        return end - start + 1
+
+    monkeypatch.setattr(chunk, 'convert_movie', convert_movie)
+    monkeypatch.setattr(chunk, 'concatenate', concatenate)
+    monkeypatch.setattr(chunk, 'mux_movie', mux_movie)
+    monkeypatch.setattr(chunk, 'get_movie_duration', get_movie_duration)
+    return calls
+
+
+def test_convert_movie_chunked(tmp_path, encodes):
+    output_path = tmp_path / 'movie.mov'
+    convert_movie_chunked(
+        str(tmp_path / 'image.%04d.exr'), str(output_path), (1, 10),
+        chunk_size=4, workers=2)
+    assert sorted(encodes) == [(1, 4), (5, 8), (9, 10)]
+    assert output_path.read_text() == '1 4\n5 8\n9 10\n'
+    # Temporary chunk directory is removed
+    assert [p.name for p in tmp_path.iterdir()] == ['movie.mov']
+
+
+def test_job_dir_keeps_other_files(tmp_path, encodes):
+    # Job directory shared with the output and a user file
+    (tmp_path / 'notes.txt').write_text('keep')
+    convert_movie_chunked(
+        str(tmp_path / 'image.%04d.exr'), str(tmp_path / 'movie.mov'),
+        (1, 10), chunk_size=4, job_dir=str(tmp_path),
+        metadata={'title': 'a'})
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'movie.mov', 'notes.txt']
+
+
+def test_job_dir_removed_when_empty(tmp_path, encodes):
+    job_dir = tmp_path / 'job'
+    convert_movie_chunked(
+        str(tmp_path / 'image.%04d.exr'), str(tmp_path / 'movie.mov'),
+        (1, 10), chunk_size=4, job_dir=str(job_dir))
+    assert not job_dir.exists()
+
+
+def test_resume(tmp_path, encodes, monkeypatch):
+    job_dir = tmp_path / 'job'
+    kwargs = {
+        'input_path': str(tmp_path / 'image.%04d.exr'),
+        'output_path': str(tmp_path / 'movie.mov'),
+        'frame_range': (1, 10),
+        'chunk_size': 4,
+        'workers': 1,
+        'job_dir': str(job_dir)}
+    concatenate = chunk.concatenate
+
+    def crash(*args, **kwargs):
+        raise RuntimeError('crash')
+    monkeypatch.setattr(chunk, 'concatenate', crash)
+    with pytest.raises(RuntimeError):
+        convert_movie_chunked(**kwargs)
+    assert len(encodes) == 3
+    monkeypatch.setattr(chunk, 'concatenate', concatenate)
+    # CLI options and arguments that do not change segments keep them
+    convert_movie_chunked(
+        **kwargs, trace='trace.json', progress_json=True, command='movie',
+        record_cost=True, preflight=True, resize=None)
+    assert len(encodes) == 3
+    assert (tmp_path / 'movie.mov').read_text() == '1 4\n5 8\n9 10\n'
+    convert_movie_chunked(**kwargs, resize=(100, 100))
+    assert len(encodes) == 6
+
+
+def test_chunk_arguments(tmp_path, encodes, monkeypatch):
+    arguments = []
+    convert_movie = chunk.convert_movie
+
+    def record(**kwargs):
+        arguments.append(kwargs)
+        convert_movie(**kwargs)
+    monkeypatch.setattr(chunk, 'convert_movie', record)
+    for frame in range(1001, 1006):
+        (tmp_path / f'image.{frame}.exr').touch()
+    # Frame range of the sequence, only convert_movie arguments are given
+    convert_movie_chunked(
+        str(tmp_path / 'image.%04d.exr'), str(tmp_path / 'movie.mov'),
+        chunk_size=2, workers=1, trace='trace.json', resize=(10, 10))
+    assert encodes == [(1001, 1002), (1003, 1004), (1005, 1005)]
+    assert 'trace' not in arguments[0]
+    assert arguments[0]['resize'] == (10, 10)
+    with pytest.raises(ValueError):
+        convert_movie_chunked(
+            str(tmp_path / 'other.%04d.exr'), str(tmp_path / 'movie.mov'))
+
+
+def test_mux_movie_audio_codec(monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        chunk, 'run', lambda command, **kwargs: commands.append(command))
+    chunk.mux_movie('video.mp4', 'out.mp4', audio_path='audio.wav')
+    chunk.mux_movie(
+        'video.mp4', 'out.mp4', audio_path='audio.wav', audio_codec='aac')
+    # Default audio encoder of the output format, like convert_movie
+    assert '-c:a' not in commands[0]
+    assert commands[1][commands[1].index('-c:a') + 1] == 'aac'
+
+
+def test_journal_round_trip(tmp_path):
+    (tmp_path / 'chunk00000.mov').write_bytes(b'abc')
+    (tmp_path / 'chunk00001.mov').write_bytes(b'abcd')
+    entry = {'key': 'job', 'index': 0, 'frame_range': [1, 4],
+             'path': 'chunk00000.mov', 'size': 3, 'fingerprint': 'f'}
+    chunk._append_journal(str(tmp_path), entry)
+    chunk._append_journal(str(tmp_path), {
+        **entry, 'index': 1, 'path': 'chunk00001.mov', 'size': 2})
+    chunk._append_journal(str(tmp_path), {**entry, 'key': 'other'})
+    with open(tmp_path / 'journal.jsonl', 'a') as f:
+        f.write('{"cut by a cra')
+    # Segment 1 changed size since it was recorded
+    assert chunk.read_journal(str(tmp_path), 'job') == {0: entry}
+    assert chunk.read_journal(str(tmp_path / 'missing'), 'job') == {}
+
+
+def test_fingerprint_frames(tmp_path):
+    sequence = str(tmp_path / 'image.%04d.exr')
+    (tmp_path / 'image.0001.exr').write_bytes(b'a')
+    fingerprint = chunk.fingerprint_frames([sequence], (1, 2))
+    assert chunk.fingerprint_frames([sequence], (1, 2)) == fingerprint
+    # Filling a missing frame changes the fingerprint
+    (tmp_path / 'image.0002.exr').write_bytes(b'b')
+    assert chunk.fingerprint_frames([sequence], (1, 2)) != fingerprint
+
+
+def test_incremental(tmp_path, encodes):
+    for frame in range(1, 11):
+        (tmp_path / f'image.{frame:04d}.exr').write_bytes(b'a')
+    segments = tmp_path / 'movie.mov.segments'
+    kwargs = {
+        'input_path': str(tmp_path / 'image.%04d.exr'),
+        'output_path': str(tmp_path / 'movie.mov'),
+        'frame_range': (1, 10),
+        'chunk_size': 4,
+        'incremental': True}
+    convert_movie_chunked(**kwargs)
+    (segments / 'notes.txt').write_text('keep')
+    (segments / 'chunk00009.mov').write_text('stale')
+    (tmp_path / 'image.0006.exr').write_bytes(b'changed')
+    convert_movie_chunked(**kwargs)
+    assert sorted(encodes) == [(1, 4), (5, 8), (5, 8), (9, 10)]
+    assert (tmp_path / 'movie.mov').read_text() == '1 4\n5 8\n9 10\n'
+    assert sorted(p.name for p in segments.iterdir()) == [
+        'chunk00000.mov', 'chunk00001.mov', 'chunk00002.mov',
+        'journal.jsonl', 'notes.txt']
@@ -0,0 +1,79 @@
+import pytest
+from vgenc import convert
+from vgenc.convert import conform_inputs, _stream_signature
+
+
+def streams(extradata='a', level=40, width=1920):
+    return {'streams': [
+        {'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High',
+         'level': level, 'width': width, 'height': 1080,
+         'pix_fmt': 'yuv420p', 'r_frame_rate': '24/1',
+         'time_base': '1/12288', 'extradata_hash': f'sha256:{extradata}'},
+        {'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '48000',
+         'channels': 2}]}
+
+
+def test_stream_signature():
+    signature = _stream_signature(streams())
+    assert signature == _stream_signature(streams())
+    assert signature != _stream_signature(streams(level=41))
+    assert signature != _stream_signature(streams(extradata='b'))
+    assert _stream_signature({'streams': []}) == (None, None)
+
+
+@pytest.fixture
+def probes(tmp_path, monkeypatch):
+    """Fake probes, conformed files get the given encoder headers"""
+    state = {'infos': {}, 'encoder': 'a', 'conformed': []}
+
+    def get_stream_info(path, data_hash=False):
+        assert data_hash
+        return state['infos'][path]
+
+    def conform_movie(input_path, output_path, info, reference):
+        state['conformed'].append(input_path)
+        video, audio = reference['streams']
+        state['infos'][output_path] = {'streams': [
+            {**video, 'extradata_hash': f"sha256:{state['encoder']}"},
+            audio]}
+
+    monkeypatch.setattr(convert, 'get_stream_info', get_stream_info)
+    monkeypatch.setattr(convert, '_conform_movie', conform_movie)
+    return state
+
+
+def test_conform_inputs(tmp_path, probes):
+    probes['infos'] = {
+        'a.mp4': streams(), 'b.mp4': streams(level=41), 'c.mp4': streams()}
+    paths = conform_inputs(['a.mp4', 'b.mp4', 'c.mp4'], str(tmp_path))
+    assert paths == ['a.mp4', str(tmp_path / 'conform0001.mp4'), 'c.mp4']
+    assert probes['conformed'] == ['b.mp4']
+
+    probes['conformed'] = []
+    probes['infos']['b.mp4'] = streams()
+    assert conform_inputs(['a.mp4', 'b.mp4'], str(tmp_path)) == [
+        'a.mp4', 'b.mp4']
+    assert probes['conformed'] == []
+
+
+def test_conform_inputs_headers(tmp_path, probes):
+    # Global headers written by the encoder differ from the kept inputs
+    probes['infos'] = {
+        'a.mp4': streams(), 'b.mp4': streams(width=1280), 'c.mp4': streams()}
+    probes['encoder'] = 'x'
+    paths = conform_inputs(['a.mp4', 'b.mp4', 'c.mp4'], str(tmp_path))
+    assert paths == [str(tmp_path / f'conform{i:04d}.mp4') for i in range(3)]
+    assert sorted(probes['conformed']) == ['a.mp4', 'b.mp4', 'c.mp4']
+
+
+def test_conform_inputs_fails(tmp_path, probes, monkeypatch):
+    probes['infos'] = {'a.mp4': streams(), 'b.mp4': streams(width=1280)}
+    conform_movie = convert._conform_movie
+
+    def random_headers(input_path, *args):
+        probes['encoder'] = input_path
+        conform_movie(input_path, *args)
+
+    monkeypatch.setattr(convert, '_conform_movie', random_headers)
+    with pytest.raises(RuntimeError):
+        conform_inputs(['a.mp4', 'b.mp4'], str(tmp_path))
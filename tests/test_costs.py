@@ -0,0 +1,124 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from vgenc import batch
+from vgenc.process import inherit_telemetry, record_telemetry, run
+from vgenc.batch import plan_jobs, run_jobs
+from vgenc.costs import (
+    estimate_makespan, job_features, predict_duration, record_job)
+
+
+def movie(frames, codec='h264', resize=(1000, 1000)):
+    return {
+        'command': 'movie', 'input_path': '/shots/a.%04d.exr',
+        'output_path': '/out/a.mov', 'frame_range': (1, frames),
+        'video_codec': codec, 'resize': resize}
+
+
+def test_job_features():
+    assert job_features(movie(100)) == {
+        'command': 'movie', 'codec': 'h264', 'format': '.mov',
+        'frames': 100, 'pixels': 1000000}
+    job = {**movie(100), 'frame_jump': 10}
+    assert job_features(job)['frames'] == 10
+
+
+def test_predict_duration(tmp_path):
+    db_path = str(tmp_path / 'costs.sqlite')
+    features = job_features(movie(100))
+    assert predict_duration(features=features, db_path=db_path) is None
+    for wall in (10.0, 20.0, 30.0):
+        record_job(features, wall, db_path=db_path)
+    # Median rate scaled to frames and megapixels
+    assert predict_duration(
+        job=movie(50, resize=(2000, 1000)), db_path=db_path) == 20.0
+    # Jobs of another codec fall back to the same command and format
+    assert predict_duration(
+        job=movie(100, codec='prores'), db_path=db_path) == 20.0
+    # Frames without resolution are not compared to megapixel frames
+    assert predict_duration(
+        features={**features, 'pixels': None}, db_path=db_path) is None
+    # Jobs run with the same number of workers are preferred
+    record_job(features, 50.0, workers=4, db_path=db_path)
+    assert predict_duration(
+        features=features, workers=4, db_path=db_path) == 50.0
+    assert predict_duration(
+        features=features, workers=1, db_path=db_path) == 20.0
+    assert predict_duration(
+        features=features, workers=2, db_path=db_path) == 25.0
+
+
+def test_estimate_makespan():
+    assert estimate_makespan([], 4) == 0.0
+    assert estimate_makespan([5.0, 3.0, 3.0, 1.0], 1) == 12.0
+    assert estimate_makespan([5.0, 3.0, 3.0, 1.0], 2) == 6.0
+    # Shorter jobs first leave a long job alone at the end
+    assert estimate_makespan([1.0, 1.0, 5.0], 2) == 6.0
+    assert estimate_makespan([5.0, 1.0, 1.0], 2) == 5.0
+
+
+def test_plan_jobs(tmp_path):
+    db_path = str(tmp_path / 'costs.sqlite')
+    record_job(job_features(movie(10)), 1.0, db_path=db_path)
+    jobs = [movie(10), movie(50), {**movie(20), 'command': 'image'},
+            movie(30)]
+    plan = plan_jobs(jobs, workers=2, db_path=db_path)
+    assert plan['predicted'] == [1.0, 5.0, None, 3.0]
+    # Jobs without history get the median prediction, longest first
+    assert plan['order'] == [1, 2, 3, 0]
+    assert plan['eta'] == 6.0
+
+
+def test_run_jobs(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'costs.sqlite')
+    calls = []
+    monkeypatch.setattr(
+        batch, 'convert_movie', lambda **job: calls.append(job['frame_range']))
+    results = run_jobs([movie(10), movie(20)], db_path=db_path)
+    assert calls == [(1, 10), (1, 20)]
+    assert [r['predicted'] for r in results] == [None, None]
+    # Jobs without any command are not recorded
+    assert predict_duration(job=movie(10), db_path=db_path) is None
+
+
+def test_run_jobs_record(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'costs.sqlite')
+    monkeypatch.setattr(
+        batch, 'convert_movie',
+        lambda **job: run([sys.executable, '-c', 'pass'], check=True))
+    wall = run_jobs([movie(10)], db_path=db_path)[0]['wall']
+    assert predict_duration(job=movie(20), db_path=db_path) == pytest.approx(
+        2 * wall)
+
+
+def test_run_jobs_concurrent(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'costs.sqlite')
+    barrier = threading.Barrier(2)
+
+    def convert_movie(**job):
+        # Both jobs are running when the first command is run
+        barrier.wait()
+        if job['frame_range'] == (1, 10):
+            run([sys.executable, '-c', 'pass'], check=True)
+        barrier.wait()
+
+    monkeypatch.setattr(batch, 'convert_movie', convert_movie)
+    records = []
+    monkeypatch.setattr(
+        batch, 'record_job', lambda *args: records.append(args))
+    run_jobs([movie(10), movie(20)], workers=2, db_path=db_path)
+    # The command is not recorded in the concurrent no-op job
+    assert len(records) == 1
+    features, wall, cpu, workers, _ = records[0]
+    assert features['frames'] == 10
+    assert cpu is not None and workers == 2
+
+
+def test_inherit_telemetry():
+    with record_telemetry(job=True) as telemetry:
+        with ThreadPoolExecutor(initializer=inherit_telemetry()) as executor:
+            executor.submit(run, [sys.executable, '-c', 'pass']).result()
+        with ThreadPoolExecutor() as executor:
+            executor.submit(run, [sys.executable, '-c', 'pass']).result()
+    assert len(telemetry.records) == 1
@@ -0,0 +1,45 @@
+from fractions import Fraction
+from vgenc import extract
+from vgenc.extract import extract_frames_from_movie, plan_extraction
+
+
+def test_plan_extraction():
+    assert plan_extraction([1000], workers=1) == 'seek'
+    assert plan_extraction([1, 2, 3, 4], workers=1) == 'select'
+    assert plan_extraction(list(range(1, 11)), workers=1) == 'select'
+    frames = list(range(1, 1000, 100))
+    assert plan_extraction(frames, workers=1, gop_size=250) == 'select'
+    assert plan_extraction(frames, workers=4, gop_size=12) == 'seek'
+
+
+def fake_ffmpeg(monkeypatch):
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+    monkeypatch.setattr(extract, 'run', run)
+    monkeypatch.setattr(extract, 'run_ffmpeg', run)
+    monkeypatch.setattr(
+        extract, 'get_movie_frame_rate', lambda path: Fraction(24))
+    return commands
+
+
+def test_extract_seek(monkeypatch):
+    commands = fake_ffmpeg(monkeypatch)
+    extract_frames_from_movie(
+        'in.mov', 'out.%04d.png', [49, 25], method='seek', workers=1)
+    assert [(c[2], c[-2]) for c in commands] == [
+        ('0.979167', 'out.0001.png'), ('1.979167', 'out.0002.png')]
+
+
+def test_extract_single_output(monkeypatch):
+    commands = fake_ffmpeg(monkeypatch)
+    extract_frames_from_movie('in.mov', 'still.png', 1000)
+    command, = commands
+    assert command[1] == '-ss' and command[-2] == 'still.png'
+    # Several frames cannot be written to one path per seek
+    commands.clear()
+    extract_frames_from_movie(
+        'in.mov', 'still.png', [1000, 5000], method='seek')
+    command, = commands
+    assert command[3] == '-filter:v' and command[-2] == 'still.png'
@@ -0,0 +1,27 @@
+from vgenc.files import get_frame_info, find_image_sequence_range
+
+
+def test_get_frame_info():
+    assert get_frame_info('/a/image.####.exr') == {
+        'digits': 4, 'start': '/a/image.', 'end': '.exr', 'number': None}
+    assert get_frame_info('/a/image.%06d.exr')['digits'] == 6
+    assert get_frame_info('/a/image.1001.exr')['number'] == 1001
+    assert get_frame_info('/a/image.exr') is None
+
+
+def test_find_image_sequence_range(tmp_path):
+    for name in (
+            'a.0001.exr', 'a.0005.exr', 'a.0003.exr', 'b.0002.exr',
+            'b.0009.exr', 'readme.txt', 'z.exr'):
+        (tmp_path / name).touch()
+    # Prefix with directory as given by get_frame_info
+    frame_info = get_frame_info(str(tmp_path / 'b.####.exr'))
+    assert find_image_sequence_range(
+        str(tmp_path / 'b.####.exr'),
+        digits=frame_info['digits'],
+        prefix=frame_info['start'],
+        suffix=frame_info['end']) == (2, 9)
+    assert find_image_sequence_range(
+        str(tmp_path / 'a.####.exr'), 4, 'a.', '.exr') == (1, 5)
+    assert find_image_sequence_range(
+        str(tmp_path / 'c.####.exr'), 4, 'c.', '.exr') is None
@@ -0,0 +1,35 @@
+from vgenc import convert
+
+
+def fake_run(monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        convert, 'run', lambda command, **kwargs: commands.append(command))
+    return commands
+
+
+def test_convert_gif_palette(tmp_path, monkeypatch):
+    commands = fake_run(monkeypatch)
+    convert.convert_gif(['a.png', 'b.png'], str(tmp_path / 'out'))
+    palette, gif = commands
+    assert palette[palette.index('-vf') + 1].endswith(
+        'palettegen=max_colors=256:stats_mode=full')
+    assert gif[gif.index('-i', 6) + 1] == palette[-2]
+    graph = gif[gif.index('-filter_complex') + 1]
+    assert graph.endswith(
+        '[x][1:v]paletteuse=dither=sierra2_4a:diff_mode=rectangle')
+    assert gif[-2] == str(tmp_path / 'out.gif')
+
+
+def test_convert_gif_single_palette(tmp_path, monkeypatch):
+    commands = fake_run(monkeypatch)
+    convert.convert_gif(
+        ['a.png', 'b.png'], str(tmp_path / 'out.gif'), stats_mode='single',
+        optimize=False)
+    # Palettes are generated and used per frame in one graph
+    gif, = commands
+    assert gif.count('-i') == 1
+    assert gif[gif.index('-filter_complex') + 1] == (
+        '[0:v]setpts=N/15/TB,split[a][b];'
+        '[a]palettegen=max_colors=256:stats_mode=single[p];'
+        '[b][p]paletteuse=dither=sierra2_4a:new=1')
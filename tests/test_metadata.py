@@ -0,0 +1,95 @@
+import csv
+import sqlite3
+import pytest
+from vgenc import exr, metadata
+from vgenc.metadata import (
+    find_images, extract_metadata, extract_metadata_table, read_metadata,
+    write_metadata_table)
+
+
+def test_read_exr_header(tmp_path, make_exr):
+    make_exr(
+        tmp_path / 'a.exr', strings={'owner': 'vgenc'},
+        floats={'focalLength': 35.0})
+    header = exr.read_header(str(tmp_path / 'a.exr'))
+    assert header['owner'] == 'vgenc'
+    assert header['focalLength'] == 35.0
+    assert header['channels'] == ['B', 'G', 'R']
+    assert header['compression'] == 'none'
+    assert header['dataWindow'] == [0, 0, 3, 1]
+
+
+def test_read_exr_header_errors(tmp_path):
+    (tmp_path / 'a.exr').write_bytes(b'not an exr file')
+    with pytest.raises(ValueError):
+        exr.read_header(str(tmp_path / 'a.exr'))
+
+
+def test_find_images(tmp_path):
+    for name in ('a.0001.exr', 'a.0002.exr', 'a.02.exr', 'b.0001.exr'):
+        (tmp_path / name).touch()
+    assert find_images(str(tmp_path / 'a.####.exr')) == [
+        str(tmp_path / 'a.0001.exr'), str(tmp_path / 'a.0002.exr')]
+    assert find_images(str(tmp_path / 'a.%04d.exr'), (3, 4)) == [
+        str(tmp_path / 'a.0003.exr'), str(tmp_path / 'a.0004.exr')]
+    assert len(find_images(str(tmp_path))) == 4
+    # Single images
+    (tmp_path / 'plate.exr').touch()
+    assert find_images(str(tmp_path / 'plate.exr')) == [
+        str(tmp_path / 'plate.exr')]
+    assert find_images(str(tmp_path / 'b.0001.exr')) == [
+        str(tmp_path / 'b.0001.exr')]
+    assert find_images(str(tmp_path / 'missing.exr')) == []
+    rows = extract_metadata(
+        find_images(str(tmp_path / 'b.0001.exr')), workers=1,
+        input_path=str(tmp_path / 'b.0001.exr'))
+    assert rows[0]['frame'] == 1
+
+
+def test_frames_from_sequence_pattern(tmp_path, make_exr):
+    make_exr(tmp_path / 'shot2.0010.exr')
+    make_exr(tmp_path / 'shot2.0011.exr')
+    rows = extract_metadata(
+        find_images(str(tmp_path / 'shot2.####.exr')), workers=1,
+        input_path=str(tmp_path / 'shot2.####.exr'))
+    assert [row['frame'] for row in rows] == [10, 11]
+
+
+def test_frames_from_directory_names(tmp_path, make_exr):
+    make_exr(tmp_path / 'shot.exr')
+    make_exr(tmp_path / 'plate_0012.exr')
+    rows = extract_metadata(find_images(str(tmp_path)), workers=1)
+    frames = {row['path'].rsplit('/', 1)[1]: row['frame'] for row in rows}
+    assert frames == {'plate_0012.exr': 12, 'shot.exr': None}
+
+
+def test_metadata_tables(tmp_path, make_exr):
+    for frame in (1, 2):
+        make_exr(
+            tmp_path / f'image.{frame:04d}.exr', strings={'owner': 'me'})
+    rows = extract_metadata_table(
+        str(tmp_path / 'image.####.exr'), str(tmp_path / 'table.db'),
+        workers=1)
+    with sqlite3.connect(tmp_path / 'table.db') as connection:
+        stored = connection.execute(
+            'SELECT frame, Copyright FROM metadata ORDER BY frame'
+        ).fetchall()
+    assert stored == [(1, 'me'), (2, 'me')]
+    write_metadata_table(rows, str(tmp_path / 'table.csv'))
+    with open(tmp_path / 'table.csv') as f:
+        assert [r['frame'] for r in csv.DictReader(f)] == ['1', '2']
+    with pytest.raises(ValueError):
+        write_metadata_table(rows, str(tmp_path / 'table.txt'))
+
+
+def test_metadata_names(tmp_path, make_exr, monkeypatch):
+    # Attributes of EXR and other files end in the same columns
+    monkeypatch.setattr(
+        metadata, 'get_metadata_from_image',
+        lambda path: {'Copyright': 'me', 'channel list': 'R, G, B'})
+    make_exr(tmp_path / 'a.exr', strings={'owner': 'me'})
+    exr_row = read_metadata(str(tmp_path / 'a.exr'))
+    png_row = read_metadata(str(tmp_path / 'a.png'))
+    assert exr_row['Copyright'] == png_row['Copyright'] == 'me'
+    assert exr_row['channel list'] == 'B, G, R'
+    assert 'owner' not in exr_row and 'channels' not in exr_row
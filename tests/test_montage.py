@@ -0,0 +1,80 @@
+from fractions import Fraction
+import pytest
+from vgenc import montage
+from vgenc.montage import generate_contact_sheet
+
+
+class Result:
+    stderr = ''
+
+
+def test_contact_sheet_sequence_range(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        montage, 'run', lambda command, **kwargs: commands.append(
+            command) or Result())
+    input_path = str(tmp_path / 'image.%04d.png')
+    with pytest.raises(ValueError):
+        generate_contact_sheet(input_path, str(tmp_path / 'sheet.png'))
+    for frame in range(1001, 1051):
+        (tmp_path / f'image.{frame:04d}.png').write_bytes(b'')
+    (tmp_path / 'image.png').write_bytes(b'')
+    generate_contact_sheet(
+        input_path, str(tmp_path / 'sheet.png'), columns=5, rows=2)
+    command, = commands
+    assert command[command.index('-start_number') + 1] == '1001'
+    # 50 frames at 25 fps over 10 tiles
+    assert r'gte(t-prev_selected_t\,0.200000)' in command[
+        command.index('-vf') + 1]
+
+
+def test_vertical_sliced_movie(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        montage, 'run', lambda command, **kwargs: commands.append(command))
+    monkeypatch.setattr(
+        montage, 'get_movie_frame_rate', lambda path: Fraction(24))
+    montage.generate_vertical_sliced_movie(
+        ['a.%04d.exr', 'b.mov', 'c.mov'], 'out.mov', 1000, 540,
+        frame_range=(25, 48))
+    command, = commands
+    # Movies are sought half a frame early, sequences start at the range
+    assert command[command.index('-start_number') + 1] == '25'
+    assert command[command.index('-ss') + 1] == f'{23.5 / 24:.6f}'
+    graph = command[command.index('-filter_complex') + 1].split(';')
+    # Even slice width for chroma subsampled encoders
+    assert graph[0] == '[0:v]scale=-2:540,crop=332:540:0:0[s0]'
+    assert graph[-1] == '[s0][s1][s2]hstack=inputs=3:shortest=1[out]'
+    assert command[command.index('-frames:v') + 1] == '24'
+
+
+def test_vertical_sliced_sequence(monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        montage, 'run', lambda command, **kwargs: commands.append(command))
+    montage.generate_vertical_sliced_movie(
+        ['a.%04d.exr'], 'out.%04d.png', 333, 540, frame_range=(1001, 1010))
+    command, = commands
+    assert command[command.index('-filter_complex') + 1] == (
+        '[0:v]scale=-2:540,crop=333:540:0:0[out]')
+    assert command[-4:] == ['-start_number', '1001', 'out.%04d.png', '-y']
+
+
+def test_contact_sheet_movie_start_time(monkeypatch):
+    class Showinfo:
+        stderr = '\n'.join(
+            f'[Parsed_showinfo_2 @ 0x0] n:{n} pts:0 pts_time:{time} '
+            'duration:1 s:320x180 fmt:yuv420p'
+            for n, time in enumerate((10.0, 12.5, 3610.0)))
+
+    monkeypatch.setattr(montage, 'run', lambda command, **kwargs: Showinfo)
+    monkeypatch.setattr(montage, 'get_video_stream', lambda path: {
+        'r_frame_rate': '24000/1001', 'start_time': '10.000000'})
+    monkeypatch.setattr(montage, 'get_movie_seconds', lambda path: 3600.0)
+    sheet = generate_contact_sheet('in.mov', 'sheet.png', columns=3, rows=1)
+    # Frames and times from the first frame, 1 based frames
+    assert [t['time'] for t in sheet['tiles']] == [0.0, 2.5, 3600.0]
+    assert [t['frame'] for t in sheet['tiles']] == [1, 61, 86315]
+    assert [t['x'] for t in sheet['tiles']] == [0, 320, 640]
+    # Non-drop-frame timecode at 24 frames per timecode second
+    assert sheet['tiles'][2]['timecode'] == '00:59:56:10'
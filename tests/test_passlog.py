@@ -0,0 +1,71 @@
+import os
+import pytest
+from vgenc import convert
+from vgenc.convert import _first_pass_key
+
+
+def test_first_pass_key(tmp_path):
+    for frame in (1, 2, 3):
+        (tmp_path / f'image.{frame:04d}.png').write_bytes(b'x')
+    input_path = str(tmp_path / 'image.%04d.png')
+    command = ['ffmpeg', '-i', input_path, '-c:v', 'libx264', '-b:v', '2M',
+               '-passlogfile', '/tmp/a/passlog']
+    key = _first_pass_key(command, [input_path], None)
+    # Bitrate and pass log path do not change the first pass
+    other = command[:-3] + ['4M', '-passlogfile', '/tmp/b/passlog']
+    assert _first_pass_key(other, [input_path], None) == key
+    assert _first_pass_key(
+        command[:4] + ['libx265'] + command[5:], [input_path], None) != key
+    # Any input frame change invalidates the stats
+    (tmp_path / 'image.0003.png').write_bytes(b'xy')
+    assert _first_pass_key(command, [input_path], None) != key
+    changed = _first_pass_key(command, [input_path], None)
+    assert _first_pass_key(command, [input_path], (1, 2)) != changed
+    os.remove(tmp_path / 'image.0002.png')
+    assert _first_pass_key(command, [input_path], (1, 3)) != changed
+
+
+@pytest.fixture
+def encodes(tmp_path, monkeypatch):
+    """Fake ffmpeg, return the first pass commands"""
+    monkeypatch.setenv('VGENC_CACHE_DIR', str(tmp_path / 'cache'))
+    first_passes = []
+
+    def run_ffmpeg(command, **kwargs):
+        if '-pass' in command and command[command.index('-pass') + 1] == '1':
+            first_passes.append(command)
+            passlog = command[command.index('-passlogfile') + 1]
+            with open(f'{passlog}-0.log', 'w') as f:
+                f.write('stats')
+        return 0
+
+    monkeypatch.setattr(convert, 'run_ffmpeg', run_ffmpeg)
+    monkeypatch.setattr(convert, 'convert_image', lambda source, target, **_: (
+        open(target, 'wb').close()))
+    return first_passes
+
+
+def test_first_pass_cache_temporary_files(tmp_path, encodes):
+    shots = tmp_path / 'shots'
+    shots.mkdir()
+    for frame in (1, 2, 3):
+        (shots / f'image.{frame:04d}.exr').write_bytes(b'x')
+    kwargs = {
+        'input_path': str(shots / 'image.%04d.exr'),
+        'output_path': str(tmp_path / 'out.mp4'),
+        'frame_range': (1, 3),
+        'video_codec': 'h264',
+        'two_pass': True,
+        'convert_input_images': True,
+        'draw_text': {
+            'fontfile': 'font.ttf', 'fontsize': 20, 'fontcolor': 'white',
+            'x': 0, 'y': 0, 'text': {1: 'a', 2: 'b', 3: 'c'}}}
+    convert.convert_movie(**kwargs)
+    # Converted inputs and sendcmd files are in new temporary paths
+    convert.convert_movie(**kwargs)
+    assert len(encodes) == 1
+    kwargs['draw_text']['text'][3] = 'd'
+    convert.convert_movie(**kwargs)
+    assert len(encodes) == 2
+    convert.convert_movie(**kwargs, look='show')
+    assert len(encodes) == 3
@@ -0,0 +1,34 @@
+from vgenc.preflight import read_image_header, validate_sequence
+
+
+def test_read_exr_header(tmp_path, make_exr):
+    make_exr(tmp_path / 'a.exr', width=8, height=3)
+    assert read_image_header(str(tmp_path / 'a.exr')) == {
+        'width': 8,
+        'height': 3,
+        'channels': ('B', 'G', 'R'),
+        'data_type': 'half'}
+
+
+def test_validate_sequence(tmp_path, make_exr):
+    for frame in range(1, 9):
+        make_exr(tmp_path / f'image.{frame:04d}.exr')
+    (tmp_path / 'image.0002.exr').unlink()
+    (tmp_path / 'image.0003.exr').write_bytes(b'')
+    make_exr(tmp_path / 'image.0004.exr', truncate=True)
+    make_exr(tmp_path / 'image.0005.exr', width=6)
+    report = validate_sequence(str(tmp_path / 'image.####.exr'), (1, 8))
+    assert not report['ok']
+    assert report['missing'] == [2]
+    assert report['empty'] == [3]
+    assert list(report['unreadable']) == [4]
+    assert list(report['mismatched']) == [5]
+    assert report['reference']['width'] == 4
+
+
+def test_validate_sequence_allow_missing(tmp_path, make_exr):
+    make_exr(tmp_path / 'image.0001.exr')
+    report = validate_sequence(
+        str(tmp_path / 'image.%04d.exr'), (1, 2), allow_missing=True)
+    assert report['ok']
+    assert report['missing'] == [2]
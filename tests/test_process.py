@@ -0,0 +1,50 @@
+import sys
+import json
+from subprocess import PIPE, CalledProcessError
+import pytest
+from vgenc.process import run, record_telemetry, span
+
+
+def test_run_records_command(tmp_path):
+    output_path = tmp_path / 'out.bin'
+    script = f'open({str(output_path)!r}, "wb").write(b"x" * 10)'
+    with record_telemetry() as telemetry:
+        result = run(
+            [sys.executable, '-c', script], check=True,
+            outputs=[str(output_path)])
+    assert result.returncode == 0
+    record, = telemetry.records
+    assert record['category'] == 'process'
+    assert record['argv'][1:] == ['-c', script]
+    assert record['bytes_written'] == 10
+    assert record['returncode'] == 0
+
+
+def test_run_on_line_and_capture():
+    lines = []
+    run([sys.executable, '-c', 'print("a"); print("b")'], on_line=lines.append)
+    assert [line.strip() for line in lines] == ['a', 'b']
+    result = run(
+        [sys.executable, '-c', 'print("c")'], stdout=PIPE, text=True)
+    assert result.stdout.strip() == 'c'
+
+
+def test_run_check_raises():
+    with pytest.raises(CalledProcessError):
+        run([sys.executable, '-c', 'raise SystemExit(3)'], check=True)
+
+
+def test_summary_and_trace(tmp_path):
+    trace_path = tmp_path / 'trace.json'
+    with record_telemetry(trace_path=str(trace_path)) as telemetry:
+        with span('step'):
+            run([sys.executable, '-c', 'pass'])
+            run([sys.executable, '-c', 'raise SystemExit(1)'])
+    *process_rows, python_row = telemetry.summary()
+    assert process_rows[0]['count'] == 2
+    assert process_rows[0]['failures'] == 1
+    # Job time not covered by any command
+    assert python_row['name'] == 'python'
+    assert python_row['cpu'] is None
+    events = json.loads(trace_path.read_text())['traceEvents']
+    assert {event['cat'] for event in events} == {'job', 'process', 'python'}
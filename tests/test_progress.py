@@ -0,0 +1,47 @@
+import io
+import json
+from vgenc.progress import (
+    ProgressTracker, ffmpeg_progress_parser, json_lines_emitter, _to_number)
+
+
+def test_ffmpeg_progress_parser_groups_blocks():
+    blocks = []
+    parse_line = ffmpeg_progress_parser(blocks.append)
+    for line in (
+            'frame=10\n', 'fps=25.00\n', 'total_size=2048\n',
+            'speed=1.5x\n', 'progress=continue\n', 'not a key value\n',
+            'frame=20\n', 'progress=end\n'):
+        parse_line(line)
+    assert blocks == [
+        {'frame': '10', 'fps': '25.00', 'total_size': '2048',
+         'speed': '1.5x', 'progress': 'continue'},
+        {'frame': '20', 'progress': 'end'}]
+
+
+def test_to_number():
+    assert _to_number('1.5x') == 1.5
+    assert _to_number('42', int) == 42
+    assert _to_number('N/A') is None
+    assert _to_number(None) is None
+
+
+def test_progress_tracker_events():
+    events = []
+    tracker = ProgressTracker(events.append, total_frames=100, stage='movie')
+    tracker.update(frames_done=25, fps=5.0)
+    tracker.finish(frames_done=100)
+    assert events[0]['stage'] == 'movie'
+    assert events[0]['status'] == 'progress'
+    assert events[0]['eta'] == 15.0
+    assert events[1]['status'] == 'end'
+    assert events[1]['frames_done'] == 100
+    assert events[1]['eta'] == 0.0
+
+
+def test_json_lines_emitter():
+    stream = io.StringIO()
+    emit = json_lines_emitter(stream)
+    emit({'status': 'progress', 'frames_done': 1})
+    emit({'status': 'end', 'frames_done': 2})
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line)['frames_done'] for line in lines] == [1, 2]
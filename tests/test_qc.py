@@ -0,0 +1,58 @@
+import json
+from vgenc import qc
+from vgenc.qc import (
+    build_qc_filter, escape_filter_value, parse_qc_stats, write_qc_stats)
+
+raw_stats = '''frame:0    pts:0       pts_time:0
+lavfi.signalstats.YMIN=16
+lavfi.signalstats.YMAX=235
+lavfi.signalstats.YAVG=120.5
+lavfi.black_start=0
+frame:1    pts:1       pts_time:0.04
+lavfi.signalstats.YMIN=16
+lavfi.signalstats.YMAX=16
+lavfi.signalstats.YAVG=16
+lavfi.black_end=0.08
+lavfi.freezedetect.freeze_start=0.04
+frame:2    pts:2       pts_time:0.08
+lavfi.signalstats.YAVG=100
+'''
+
+
+def test_parse_qc_stats(tmp_path):
+    (tmp_path / 'raw.txt').write_text(raw_stats)
+    rows = parse_qc_stats(str(tmp_path / 'raw.txt'))
+    assert [row['frame'] for row in rows] == [0, 1, 2]
+    assert rows[0]['y_avg'] == 120.5
+    assert rows[2]['y_min'] is None
+    assert [row['black'] for row in rows] == [True, True, False]
+    # Freeze without end lasts until the last frame
+    assert [row['frozen'] for row in rows] == [False, True, True]
+
+
+def test_write_qc_stats(tmp_path):
+    rows = [{'frame': 0, 'pts_time': 0.0, 'y_min': 16.0, 'y_max': 235.0,
+             'y_avg': 100.0, 'black': False, 'frozen': False}]
+    write_qc_stats(rows, str(tmp_path / 'qc.json'))
+    assert json.loads((tmp_path / 'qc.json').read_text()) == rows
+    write_qc_stats(rows, str(tmp_path / 'qc.csv'))
+    lines = (tmp_path / 'qc.csv').read_text().splitlines()
+    assert lines[0] == 'frame,pts_time,y_min,y_max,y_avg,black,frozen'
+
+
+def test_build_qc_filter():
+    graph = build_qc_filter('/tmp/qc:raw.txt')
+    assert graph.startswith('[qc]signalstats,')
+    assert graph.endswith(',nullsink')
+    assert escape_filter_value('/tmp/qc:raw.txt') in graph
+    assert escape_filter_value("a:b'c") == "a\\\\:b\\\\\\'c"
+
+
+def test_escape_filter_value_windows(monkeypatch):
+    monkeypatch.setattr(qc.os, 'name', 'nt')
+    path = escape_filter_value(r'C:\tmp\qc.txt', is_path=True)
+    text = escape_filter_value(r'shot\010')
+    monkeypatch.undo()
+    assert path == r'C\\:/tmp/qc.txt'
+    # Backslashes of texts are kept
+    assert text == r'shot\\\\010'
@@ -0,0 +1,33 @@
+from fractions import Fraction
+from vgenc import convert
+
+
+def test_movie_input_seek(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        convert, 'get_movie_frame_rate', lambda path: Fraction(24))
+    monkeypatch.setattr(
+        convert, 'run_ffmpeg', lambda command, **kwargs: commands.append(
+            command) or 0)
+    convert.convert_movie(
+        'in.mov', str(tmp_path / 'out.mp4'), frame_range=(25, 48))
+    command, = commands
+    index = command.index('-ss')
+    # Half a frame before the first frame, seeking before the input
+    assert float(command[index + 1]) == round((24 - 0.5) / 24, 6)
+    assert command[index + 2:index + 4] == ['-i', 'in.mov']
+    assert command[command.index('-frames:v') + 1] == '24'
+    assert float(command[command.index('-t') + 1]) == 1.0
+
+
+def test_movie_input_seek_start(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        convert, 'get_movie_frame_rate', lambda path: Fraction(25))
+    monkeypatch.setattr(
+        convert, 'run_ffmpeg', lambda command, **kwargs: commands.append(
+            command) or 0)
+    convert.convert_movie(
+        'in.mov', str(tmp_path / 'out.mp4'), frame_range=(1, 10))
+    command, = commands
+    assert float(command[command.index('-ss') + 1]) == 0
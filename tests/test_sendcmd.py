@@ -0,0 +1,28 @@
+from vgenc.convert import write_ffmpeg_sendcmd
+
+
+def test_write_ffmpeg_sendcmd(tmp_path):
+    path = tmp_path / 'text.cmd'
+    frames = {1001: 'a', 1002: 'a', 1003: 'b', 1004: 'b', 1005: 'a'}
+    first = write_ffmpeg_sendcmd(frames, 25, str(path), start_number=1001)
+    assert first == 'a'
+    # One command per text change, half a frame early
+    assert path.read_text().splitlines() == [
+        "0.000000 drawtext reinit text='a';",
+        "0.060000 drawtext reinit text='b';",
+        "0.140000 drawtext reinit text='a';"]
+
+
+def test_write_ffmpeg_sendcmd_escape(tmp_path):
+    path = tmp_path / 'text.cmd'
+    first = write_ffmpeg_sendcmd(
+        iter([(0, r"C:\shot's")]), 24, str(path), target='drawtext@t0')
+    assert first == r"C:\shot's"
+    assert path.read_text() == (
+        "0.000000 drawtext@t0 reinit text='C\\:\\\\shot'\\\\\\''s';\n")
+
+
+def test_write_ffmpeg_sendcmd_empty(tmp_path):
+    path = tmp_path / 'text.cmd'
+    assert write_ffmpeg_sendcmd({}, 24, str(path)) is None
+    assert path.read_text() == ''
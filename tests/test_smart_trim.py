@@ -0,0 +1,78 @@
+import pytest
+from vgenc import convert
+from vgenc.convert import smart_trim, _matching_encoder_args
+
+stream = {
+    'codec_name': 'h264', 'profile': 'High', 'pix_fmt': 'yuv420p',
+    'r_frame_rate': '24/1', 'bit_rate': '1000000',
+    'color_space': 'bt709', 'color_transfer': 'unknown'}
+
+
+@pytest.fixture
+def trim(tmp_path, monkeypatch):
+    """Fake probes and commands, return the segments of each attempt"""
+    state = {'segments': [], 'hashes': {}, 'decodes': [True]}
+
+    def run(command, **_):
+        if '-frames:v' in command:
+            start = float(command[command.index('-ss') + 1])
+            frames = int(command[command.index('-frames:v') + 1])
+            copy = command[command.index('-c:v') + 1] == 'copy'
+            # Seeks are half a frame after (copy) or before the first frame
+            first = round(start * 24 + (-0.5 if copy else 0.5))
+            state['segments'].append((first, frames, copy))
+        open(command[-2], 'wb').close()
+
+    def get_extradata_hash(path):
+        return state['hashes'].get(path.rsplit('/', 1)[-1], 'sha256:source')
+
+    monkeypatch.setattr(convert, 'run', run)
+    monkeypatch.setattr(convert, 'get_video_stream', lambda path: stream)
+    monkeypatch.setattr(
+        convert, 'get_keyframes', lambda path, rate: ([0, 24, 48], 72))
+    monkeypatch.setattr(convert, 'get_extradata_hash', get_extradata_hash)
+    monkeypatch.setattr(
+        convert, 'concatenate', lambda paths, output: open(
+            output, 'wb').close())
+    monkeypatch.setattr(
+        convert, 'check_decode',
+        lambda path, frames: state['decodes'].pop(0))
+    state['output_path'] = str(tmp_path / 'trim.mp4')
+    return state
+
+
+def test_copy_inner_gops(trim):
+    smart_trim('in.mp4', trim['output_path'], (11, 61))
+    # Frames 10 to 60 (0 based): partial GOPs are re-encoded
+    assert trim['segments'] == [(10, 14, False), (24, 24, True),
+                                (48, 13, False)]
+
+
+def test_reencode_on_header_mismatch(trim):
+    trim['hashes']['segment0.mp4'] = 'sha256:other'
+    smart_trim('in.mp4', trim['output_path'], (11, 61))
+    assert trim['segments'][3:] == [(10, 51, False)]
+
+
+def test_reencode_on_decode_error(trim):
+    trim['decodes'] = [False, True]
+    smart_trim('in.mp4', trim['output_path'], (11, 61))
+    assert trim['segments'][3:] == [(10, 51, False)]
+
+
+def test_decode_error_after_reencode(trim):
+    trim['decodes'] = [False, False]
+    with pytest.raises(RuntimeError):
+        smart_trim('in.mp4', trim['output_path'], (11, 61))
+
+
+def test_matching_encoder_args():
+    args = _matching_encoder_args(stream)
+    assert args[:4] == ['-c:v', 'libx264', '-pix_fmt', 'yuv420p']
+    assert args[args.index('-profile:v') + 1] == 'high'
+    assert '-color_trc' not in args
+    assert '-level:v' not in args
+    args = _matching_encoder_args({**stream, 'level': 41})
+    assert args[args.index('-level:v') + 1] == '4.1'
+    with pytest.raises(ValueError):
+        _matching_encoder_args({**stream, 'codec_name': 'dnxhd'})
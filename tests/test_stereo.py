@@ -0,0 +1,17 @@
+from vgenc import convert
+
+
+def test_stereo_layouts(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        convert, 'run_ffmpeg', lambda command, **kwargs: commands.append(
+            command) or 0)
+    inputs = ['left.%04d.png', 'right.%04d.png']
+    for layout in ('anaglyph', 'sbs', 'tb'):
+        convert.convert_movie(
+            inputs, str(tmp_path / 'out.mp4'), is_stereo=True,
+            stereo_layout=layout, frame_range=(1, 10))
+    # Both views are encoded by a single command
+    assert [c[c.index('-filter_complex') + 1] for c in commands] == [
+        'hstack,stereo3d=sbsl:arcg', 'hstack', 'vstack']
+    assert all(c.count('-i') == 2 for c in commands)
@@ -1,16 +1,25 @@
 #!/usr/bin/env python
 
+import json
 import argparse
 from .convert import convert_image, convert_movie
+from .chunk import convert_movie_chunked
 from .extract import extract_frames_from_movie
+from .autotune import autotune_encoder
+from .batch import batch_convert_tx, plan_jobs, run_jobs
+from .costs import job_features, record_job, telemetry_cpu_time
+from .metadata import extract_metadata_table, find_images
+from .process import record_telemetry
+from .progress import json_lines_emitter
 
 parser = argparse.ArgumentParser()
 parser.add_argument(
-    'command', help='image, movie, extract')
+    'command', help='image, movie, extract, metadata, tx, jobs')
 parser.add_argument(
     '-i', '--input-path', required=True, nargs='+', metavar='path')
 parser.add_argument(
-    '-o', '--output-path', required=True, metavar='path')
+    '-o', '--output-path', required=False, metavar='path',
+    help='required except for tx and jobs (JSON lists of job arguments)')
 # Convert image arguments
 parser.add_argument(
     '--input-colorspace', required=False, metavar='name')
@@ -62,22 +71,135 @@ parser.add_argument(
     '--resize', required=False, type=int, nargs=2, metavar=('x', 'y'))
 parser.add_argument(
     '--is-stereo', action='store_true', required=False)
+parser.add_argument(
+    '--stereo-layout', required=False, default='anaglyph',
+    choices=('anaglyph', 'sbs', 'tb'),
+    help='packing of a stereo pair (with --is-stereo)')
 parser.add_argument(
     '--two-pass', action='store_true', required=False)
+parser.add_argument(
+    '--qc-stats', dest='qc_stats_path', required=False, metavar='path',
+    help='write per-frame QC statistics (csv or json)')
+parser.add_argument(
+    '--preflight', action='store_true', required=False,
+    help='validate input frames before encoding')
+parser.add_argument(
+    '--autotune', required=False, metavar='profile',
+    help='choose encoder options from sample encodes, cached per profile')
+parser.add_argument(
+    '--target-bitrate', required=False, type=int, metavar='number')
+parser.add_argument(
+    '--target-psnr', required=False, type=float, metavar='number')
+parser.add_argument(
+    '--smart-cut', action='store_true', required=False,
+    help='trim a movie to frame range re-encoding only cut point GOPs')
+parser.add_argument(
+    '--chunk-size', required=False, type=int, metavar='number',
+    help='encode frame range in concurrent chunks of this many frames')
+parser.add_argument(
+    '--job-dir', required=False, metavar='path',
+    help='keep chunks and a journal there to resume an interrupted encode')
+parser.add_argument(
+    '--incremental', action='store_true', required=False,
+    help='keep chunks next to the output to only re-encode changed frames')
+parser.add_argument(
+    '--workers', required=False, type=int, metavar='number')
+# TX
+parser.add_argument(
+    '--force', action='store_true', required=False,
+    help='rebuild up to date TX')
 # Extract frames
 parser.add_argument(
     '--frames', required=False, nargs='+', type=int, metavar='number')
+parser.add_argument(
+    '--checksum', required=False, metavar='algorithm',
+    help='md5, sha1, sha256, xxh64, xxh3, xxh128')
+# Progress
+parser.add_argument(
+    '--progress-json', action='store_true', required=False,
+    help='print progress events as JSON lines')
+parser.add_argument(
+    '--trace', required=False, metavar='path',
+    help='write a Chrome trace of the external commands')
+parser.add_argument(
+    '--record-cost', action='store_true', required=False,
+    help='record the duration of image and movie commands to predict '
+         'the duration of jobs')
 
 args = parser.parse_args()
+if args.output_path is None and args.command not in ('tx', 'jobs'):
+    parser.error('the following arguments are required: -o/--output-path')
 if len(args.input_path) == 1:
     args.input_path = args.input_path[0]
+elif args.autotune is not None:
+    parser.error('--autotune needs a single image sequence or movie')
+if args.progress_json:
+    args.progress_callback = json_lines_emitter()
+
+with record_telemetry(
+        name=args.command,
+        trace_path=args.trace,
+        print_summary=args.trace is not None) as telemetry:
+    match args.command:
+        case 'image':
+            convert_image(**vars(args))
+        case 'movie':
+            if args.autotune is not None:
+                decision = autotune_encoder(
+                    input_path=args.input_path,
+                    video_codec=args.video_codec,
+                    frame_range=args.frame_range,
+                    profile=args.autotune,
+                    frame_rate=args.frame_rate or 25,
+                    target_bitrate=args.target_bitrate,
+                    target_psnr=args.target_psnr,
+                    constrained_quality=args.constrained_quality,
+                    video_bitrate=args.video_bitrate,
+                    pixel_format=args.pixel_format)
+                args.encoder_options = decision['options']
+            if (args.job_dir is not None or args.incremental) \
+                    and args.chunk_size is None:
+                args.chunk_size = 250
+            if args.chunk_size is not None:
+                convert_movie_chunked(**vars(args))
+            else:
+                convert_movie(**vars(args))
+        case 'extract':
+            extract_frames_from_movie(**vars(args))
+        case 'metadata':
+            extract_metadata_table(
+                input_path=args.input_path,
+                output_path=args.output_path,
+                frame_range=args.frame_range)
+        case 'tx':
+            batch_convert_tx(
+                input_paths=args.input_path,
+                color_convert=args.color_convert,
+                workers=args.workers,
+                force=args.force)
+        case 'jobs':
+            jobs = []
+            for path in ([args.input_path] if isinstance(
+                    args.input_path, str) else args.input_path):
+                with open(path) as f:
+                    jobs.extend(json.load(f))
+            workers = args.workers or 1
+            plan = plan_jobs(jobs, workers)
+            unknown = plan['predicted'].count(None)
+            print(f"{len(jobs)} jobs, ETA {plan['eta']:.0f}s on {workers} "
+                  f"workers ({unknown} without history)")
+            run_jobs(jobs, workers, plan=plan)
+        case _:
+            print('No command are specified')
 
-match args.command:
-    case 'image':
-        convert_image(**vars(args))
-    case 'movie':
-        convert_movie(**vars(args))
-    case 'extract':
-        extract_frames_from_movie(**vars(args))
-    case _:
-        print('No command are specified')
+# Feed the cost model used to schedule jobs (jobs always record theirs),
+# only with runs that succeeded
+processes = [r for r in telemetry.records if r['category'] == 'process']
+if args.record_cost and args.command in ('image', 'movie') \
+        and args.autotune is None and processes \
+        and all(r['returncode'] == 0 for r in processes) \
+        and find_images(args.output_path):
+    record_job(
+        job_features(vars(args)),
+        telemetry.wall_time,
+        telemetry_cpu_time(telemetry))
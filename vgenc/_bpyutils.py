@@ -3,16 +3,6 @@ import sys
 import bpy
 
 
-def convert_os_path(path):
-    if sys.platform.startswith('linux'):
-        if path.startswith(r'\\'):
-            path = '/' + path.replace('\\', '/')[2:]
-    elif sys.platform.startswith('win'):
-        if path.startswith('/') and not path.startswith('//'):
-            path = r'\\' + os.path.normpath(path)[1:]
-    return path
-
-
 def normpath(path):
     # Remove double slash to be able to use for absolute path
     if sys.platform.startswith('linux'):
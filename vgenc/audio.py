@@ -0,0 +1,50 @@
+import os
+import threading
+from .cache import get_cache_dir, file_signature, hash_key
+from .convert import ffmpeg_audio_codecs
+from .process import run
+
+
+def prepare_audio(
+        audio_path: str,
+        audio_codec: str | None = None,
+        audio_quality: int | None = None,
+        audio_bitrate: str | None = None,
+        cache_dir: str | None = None) -> str:
+    """Encode audio once to a cached Matroska audio file
+
+    The cache is keyed by the audio file signature and codec settings, so
+    every rendition of a job (and later jobs) can mux the same stream with
+    `-c:a copy` instead of encoding it again.
+
+    Args:
+        audio_codec: codec name (see ffmpeg_audio_codecs), the source is
+          returned as is if None or 'copy'
+        cache_dir: directory of encoded audio (default: vgenc cache dir)
+
+    Returns:
+        Path of the encoded audio
+    """
+    ac = ffmpeg_audio_codecs.get(audio_codec, audio_codec)
+    if ac in (None, 'copy'):
+        return audio_path
+    if cache_dir is None:
+        cache_dir = get_cache_dir('audio')
+    key = hash_key(
+        file_signature(audio_path), ac, audio_quality, audio_bitrate)
+    output_path = os.path.join(cache_dir, f'{key}.mka')
+    if os.path.exists(output_path):
+        return output_path
+
+    # Unique temporary name as renditions can prepare audio concurrently
+    tmp_path = os.path.join(
+        cache_dir, f'{key}.tmp{os.getpid()}-{threading.get_ident()}.mka')
+    command = ['ffmpeg', '-i', audio_path, '-vn', '-c:a', ac]
+    if audio_quality is not None:
+        command.extend(['-q:a', str(audio_quality)])
+    if audio_bitrate is not None:
+        command.extend(['-b:a', str(audio_bitrate)])
+    command.extend([tmp_path, '-y'])
+    run(command, check=True, outputs=[tmp_path])
+    os.replace(tmp_path, output_path)
+    return output_path
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+import logging
+from fractions import Fraction
+from subprocess import PIPE
+from .cache import get_cache_dir
+from .convert import convert_movie, ffmpeg_video_codecs
+from .files import get_frame_info, find_image_sequence_range
+from .probe import get_movie_duration, get_movie_frame_rate
+from .process import run
+
+# Candidate encoder options ordered from the fastest to the slowest
+encoder_candidates = {
+    'libx264': [
+        {'preset': p} for p in (
+            'ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium',
+            'slow')],
+    'libx265': [
+        {'preset': p} for p in (
+            'ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium',
+            'slow')],
+    'libvpx-vp9': [
+        {'deadline': 'good', 'cpu-used': c, 'row-mt': 1,
+         'tile-columns': t} for c in (8, 6, 5, 4, 2) for t in (2, 0)],
+    'libaom-av1': [
+        {'cpu-used': c, 'row-mt': 1, 'tiles': t}
+        for c in (8, 7, 6, 5, 4) for t in ('2x2', '1x1')]}
+
+cache_name = 'autotune.json'
+
+
+def _sample_ranges(
+        frame_range: tuple[int, int],
+        sample_count: int,
+        sample_length: int) -> list[tuple[int, int]]:
+    """Spread sample ranges evenly over the frame range"""
+    start, end = frame_range
+    length = end - start + 1
+    sample_length = min(sample_length, length)
+    sample_count = max(1, min(sample_count, length // sample_length))
+    if sample_count == 1:
+        return [(start, start + sample_length - 1)]
+    step = (length - sample_length) / (sample_count - 1)
+    return [
+        (start + round(i * step), start + round(i * step) + sample_length - 1)
+        for i in range(sample_count)]
+
+
+def _get_psnr(
+        encoded_path: str,
+        input_path: str,
+        frame_range: tuple[int, int],
+        frame_rate: int | Fraction) -> float | None:
+    start, end = frame_range
+    command = ['ffmpeg', '-i', encoded_path]
+    if '%' in input_path:
+        command.extend([
+            '-framerate', str(frame_rate), '-start_number', str(start)])
+    else:
+        # Same seek as convert_movie, half a frame before the first frame
+        seek = max(0, (start - 1 - Fraction(1, 2)) / frame_rate)
+        command.extend(['-ss', f'{float(seek):.6f}'])
+    command.extend([
+        '-i', input_path,
+        '-lavfi', 'psnr', '-frames:v', str(end - start + 1),
+        '-f', 'null', '-'])
+    output = run(command, stderr=PIPE, text=True).stderr
+    if matched := re.search(r'average:(\d+(?:\.\d+)?|inf)', output):
+        return float(matched.group(1))
+
+
+def load_cache(cache_path: str | None = None) -> dict:
+    cache_path = cache_path or os.path.join(get_cache_dir(), cache_name)
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_cache(key: str, decision: dict, cache_path: str | None) -> None:
+    cache_path = cache_path or os.path.join(get_cache_dir(), cache_name)
+    data = load_cache(cache_path)
+    data[key] = decision
+    tmp_path = f'{cache_path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, cache_path)
+
+
+def autotune_encoder(
+        input_path: str,
+        video_codec: str,
+        frame_range: tuple[int, int] | None = None,
+        profile: str = 'default',
+        frame_rate: int = 25,
+        target_bitrate: int | None = None,
+        target_psnr: float | None = None,
+        constrained_quality: int | None = 25,
+        video_bitrate: int | None = 0,
+        pixel_format: str | None = None,
+        sample_count: int = 3,
+        sample_length: int = 24,
+        candidates: list[dict] | None = None,
+        refresh: bool = False,
+        cache_path: str | None = None) -> dict:
+    """Find the fastest encoder options meeting a bitrate or quality target
+
+    Short samples of the input are encoded with each candidate. The fastest
+    candidate whose bitrate is below target_bitrate and whose PSNR is above
+    target_psnr is kept. Without any valid candidate, the one with the lowest
+    bitrate (or best PSNR) is kept. The decision is cached per profile and
+    codec.
+
+    Args:
+        input_path: image sequence with printf syntax padding or movie
+        video_codec: name from ffmpeg_video_codecs or encoder name
+        frame_range: range samples are taken from, 1 based for movies
+          (default: all the frames of the input)
+        frame_rate: image sequence frame rate, movies use the stream one
+        profile: name of the cache entry (show, delivery, etc)
+        target_bitrate: maximum bits per second
+        target_psnr: minimum average PSNR in dB
+        refresh: ignore cached decision (it is also ignored when targets,
+          quality, bitrate or pixel format differ)
+
+    Returns:
+        The decision with 'options' to give as convert_movie encoder_options
+    """
+    encoder = ffmpeg_video_codecs.get(video_codec, video_codec)
+    key = f'{profile}:{encoder}'
+    decision = load_cache(cache_path).get(key)
+    if not refresh and decision is not None and (
+            decision['target_bitrate'] == target_bitrate
+            and decision['target_psnr'] == target_psnr
+            and decision['constrained_quality'] == constrained_quality
+            and decision.get('video_bitrate') == video_bitrate
+            and decision.get('pixel_format') == pixel_format):
+        return decision
+    if not isinstance(input_path, str):
+        raise ValueError('Autotune needs a single image sequence or movie')
+    is_movie = '%' not in input_path
+    encode_rate = None if is_movie else frame_rate
+    if is_movie:
+        frame_rate = get_movie_frame_rate(input_path)
+        frame_range = frame_range or (1, get_movie_duration(input_path))
+    elif frame_range is None:
+        frame_info = get_frame_info(input_path)
+        frame_range = find_image_sequence_range(
+            input_path,
+            digits=frame_info['digits'],
+            prefix=frame_info['start'],
+            suffix=frame_info['end'])
+        if frame_range is None:
+            raise ValueError(f'Cannot find sequence frames: {input_path}')
+    candidates = candidates or encoder_candidates.get(encoder, [{}])
+    samples = _sample_ranges(frame_range, sample_count, sample_length)
+    tmp_dir = tempfile.mkdtemp(prefix='vgenc-autotune-')
+    results = []
+    try:
+        for options in candidates:
+            frames = 0
+            wall = 0.0
+            size = 0
+            psnrs = []
+            for index, sample_range in enumerate(samples):
+                output_path = os.path.join(tmp_dir, f'sample{index}.mkv')
+                start = time.perf_counter()
+                convert_movie(
+                    input_path=input_path,
+                    output_path=output_path,
+                    frame_rate=encode_rate,
+                    frame_range=sample_range,
+                    video_codec=encoder,
+                    constrained_quality=constrained_quality,
+                    video_bitrate=video_bitrate,
+                    pixel_format=pixel_format,
+                    encoder_options=options)
+                wall += time.perf_counter() - start
+                if not os.path.exists(output_path):
+                    break
+                frames += sample_range[1] - sample_range[0] + 1
+                size += os.path.getsize(output_path)
+                if target_psnr is not None:
+                    psnr = _get_psnr(
+                        output_path, input_path, sample_range, frame_rate)
+                    if psnr is not None:
+                        psnrs.append(psnr)
+                os.remove(output_path)
+            else:
+                result = {
+                    'options': options,
+                    'fps': frames / wall if wall else None,
+                    'bitrate': float(size * 8 * frame_rate / frames),
+                    'psnr': min(psnrs) if psnrs else None}
+                logging.info(f'autotune {encoder} {result}')
+                results.append(result)
+                continue
+            logging.warning(f'autotune {encoder} failed with {options}')
+    finally:
+        shutil.rmtree(tmp_dir)
+    if not results:
+        return {'options': {}}
+
+    def is_valid(result: dict) -> bool:
+        if target_bitrate is not None and result['bitrate'] > target_bitrate:
+            return False
+        if target_psnr is not None and (
+                result['psnr'] is None or result['psnr'] < target_psnr):
+            return False
+        return True
+
+    if valid := [r for r in results if is_valid(r)]:
+        decision = max(valid, key=lambda r: r['fps'] or 0)
+    elif target_psnr is not None:
+        decision = max(results, key=lambda r: r['psnr'] or 0)
+    else:
+        decision = min(results, key=lambda r: r['bitrate'])
+    decision = {
+        **decision,
+        'target_bitrate': target_bitrate,
+        'target_psnr': target_psnr,
+        'constrained_quality': constrained_quality,
+        'video_bitrate': video_bitrate,
+        'pixel_format': pixel_format,
+        'met_target': bool(valid)}
+    _save_cache(key, decision, cache_path)
+    return decision
@@ -1,10 +1,24 @@
 #!/usr/bin/env python
 
 import os
+import shutil
+import logging
 import argparse
-from .files import get_frame_info
-from .convert import convert_image
-from ._bpyutils import convert_os_path
+import statistics
+from contextlib import nullcontext
+from subprocess import CalledProcessError
+from concurrent.futures import ThreadPoolExecutor
+from .cache import hash_key
+from .checksum import ChecksumLiteral, hash_file
+from .files import get_frame_info, convert_os_path
+from .convert import convert_image, convert_movie, convert_tx
+from .costs import (
+    job_features, predict_duration, record_job, telemetry_cpu_time,
+    estimate_makespan)
+from .probe import get_metadata_from_image
+from .preflight import PreflightError, validate_sequence
+from .process import record_telemetry
+from .progress import ProgressCallback, json_lines_emitter
 
 
 def batch_convert_image(
@@ -18,68 +32,301 @@ def batch_convert_image(
         data_format: str,
         color_depth: int,
         input_colorspace: str,
-        display_view: tuple[str, str]):
-    frame_info = get_frame_info(input_path)
-    if os.path.splitext(output_path)[1] == '.j2c':
-        # Special case for JPEG 2000: openimageio can't create j2c file format
-        # and set it's bitrate. Instead, temporary tiff are created from
-        # oiiotool and converted with bpy to j2c with cinema bitrate.
-        # bpy as convert backend could be used directly without intermediary
-        # tiff files and should reduce compute time but the crop and aspect
-        # ratio feature needs to be implemented.
-        tmp_output = f'{output_path}.tmp.tif'
-        convert_image(
-            input_path=input_path,
-            output_path=tmp_output,
-            input_colorspace=input_colorspace,
-            display_view=display_view,
-            cut=cut,
-            fit=fit,
-            compression=compression,
-            rgb_only=True,
-            data_format=data_format,
-            image_sequence=True,
-            frame_range=frame_range,
-            frame_jump=frame_jump)
-        convert_image(
-            input_path=tmp_output,
-            output_path=output_path,
-            input_colorspace='Raw',
-            display_view=('None', 'Raw'),
-            image_sequence=True,
-            frame_range=frame_range,
-            frame_jump=frame_jump,
-            use_bpy=True,
-            file_format='JPEG2000',
-            color_mode='RGB',
-            color_depth=color_depth,
-            quality=None,  # Use cinema presets instead
-            codec='J2K',
-            additional_image_settings={
-                'use_jpeg2k_cinema_preset': True,
-                'use_jpeg2k_cinema_48': True})
-        # Remove temp files
-        frame_start, frame_end = frame_range
-        for frame in range(frame_start, frame_end + 1):
-            file_path = tmp_output.replace(
-                '#' * frame_info['digits'],
-                f"{frame:0{frame_info['digits']}}")
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        display_view: tuple[str, str],
+        progress_callback: ProgressCallback | None = None,
+        trace_path: str | None = None,
+        preflight: bool = False,
+        checksum: ChecksumLiteral | None = None):
+    """Convert an image sequence for delivery
+
+    Args:
+        trace_path: record the external commands and write a Chrome
+          trace_event JSON file, a summary table is printed at the end
+        preflight: validate input frames before converting and raise
+          PreflightError if a frame is not usable
+        checksum: algorithm used to write a checksum manifest of outputs
+    """
+    if preflight:
+        report = validate_sequence(input_path, frame_range, frame_jump)
+        if not report['ok']:
+            raise PreflightError(report)
+    if trace_path is None:
+        telemetry = nullcontext()
     else:
-        convert_image(
-            input_path=input_path,
-            output_path=output_path,
-            input_colorspace=input_colorspace,
-            display_view=display_view,
-            cut=cut,
-            fit=fit,
-            compression=compression,
-            rgb_only=True,
-            data_format=data_format,
-            image_sequence=True,
-            frame_range=frame_range,
-            frame_jump=frame_jump)
+        telemetry = record_telemetry(
+            name=os.path.basename(output_path),
+            trace_path=trace_path,
+            print_summary=True)
+    with telemetry:
+        frame_info = get_frame_info(input_path)
+        if os.path.splitext(output_path)[1] == '.j2c':
+            # Special case for JPEG 2000: openimageio can't create j2c file
+            # format and set it's bitrate. Instead, temporary tiff are
+            # created from oiiotool and converted with bpy to j2c with cinema
+            # bitrate. bpy as convert backend could be used directly without
+            # intermediary tiff files and should reduce compute time but the
+            # crop and aspect ratio feature needs to be implemented.
+            tmp_output = f'{output_path}.tmp.tif'
+            convert_image(
+                input_path=input_path,
+                output_path=tmp_output,
+                input_colorspace=input_colorspace,
+                display_view=display_view,
+                cut=cut,
+                fit=fit,
+                compression=compression,
+                rgb_only=True,
+                data_format=data_format,
+                image_sequence=True,
+                frame_range=frame_range,
+                frame_jump=frame_jump,
+                progress_callback=progress_callback)
+            convert_image(
+                input_path=tmp_output,
+                output_path=output_path,
+                input_colorspace='Raw',
+                display_view=('None', 'Raw'),
+                image_sequence=True,
+                frame_range=frame_range,
+                frame_jump=frame_jump,
+                use_bpy=True,
+                file_format='JPEG2000',
+                color_mode='RGB',
+                color_depth=color_depth,
+                quality=None,  # Use cinema presets instead
+                codec='J2K',
+                additional_image_settings={
+                    'use_jpeg2k_cinema_preset': True,
+                    'use_jpeg2k_cinema_48': True},
+                progress_callback=progress_callback,
+                checksum=checksum)
+            # Remove temp files
+            frame_start, frame_end = frame_range
+            for frame in range(frame_start, frame_end + 1):
+                file_path = tmp_output.replace(
+                    '#' * frame_info['digits'],
+                    f"{frame:0{frame_info['digits']}}")
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        else:
+            convert_image(
+                input_path=input_path,
+                output_path=output_path,
+                input_colorspace=input_colorspace,
+                display_view=display_view,
+                cut=cut,
+                fit=fit,
+                compression=compression,
+                rgb_only=True,
+                data_format=data_format,
+                image_sequence=True,
+                frame_range=frame_range,
+                frame_jump=frame_jump,
+                progress_callback=progress_callback,
+                checksum=checksum)
+
+
+texture_extensions = (
+    '.exr', '.tif', '.tiff', '.png', '.jpg', '.jpeg', '.tga', '.hdr')
+
+
+def find_textures(paths: str | list[str]) -> list[str]:
+    """List texture files from files and directory trees (.tx excepted)"""
+    if isinstance(paths, str):
+        paths = [paths]
+    textures = []
+    for path in paths:
+        if not os.path.isdir(path):
+            textures.append(path)
+            continue
+        for root, _, files in os.walk(path):
+            textures.extend(
+                os.path.join(root, f) for f in files
+                if os.path.splitext(f)[1].lower() in texture_extensions)
+    return sorted(textures)
+
+
+def _source_stamp(path: str) -> str:
+    stat = os.stat(path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def _tx_state(tx_path: str) -> dict | None:
+    """Read vgenc attributes recorded in a TX file"""
+    if not os.path.exists(tx_path):
+        return None
+    try:
+        metadata = get_metadata_from_image(tx_path)
+    except (OSError, CalledProcessError):  # Unreadable TX is rebuilt
+        return None
+    return {
+        k.split(':', 1)[1]: str(v) for k, v in metadata.items()
+        if k.startswith('vgenc:')}
+
+
+def batch_convert_tx(
+        input_paths: str | list[str],
+        color_convert: tuple[str, str] | None = None,
+        file_format: str | None = None,
+        workers: int | None = None,
+        force: bool = False,
+        hash_algorithm: ChecksumLiteral = 'sha256') -> dict[str, str]:
+    """Convert texture libraries to TX on a pool of maketx processes
+
+    Source size/mtime, content hash and conversion parameters are stored
+    in TX attributes (vgenc:source_stamp, vgenc:source_hash,
+    vgenc:params). A TX is rebuilt only when parameters changed, or when
+    the source stamp changed and its content hash differs. Sources with
+    identical content are converted once and the TX is copied, with the
+    stamps of every source. A source identical to one with an up to date
+    TX gets a copy of it.
+
+    Args:
+        input_paths: texture files or directories (walked recursively),
+          TX files are written next to sources
+        workers: number of concurrent maketx (default: a quarter of CPUs)
+        force: rebuild all TX
+
+    Returns:
+        {source path: TX path}
+    """
+    sources = find_textures(input_paths)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // 4)
+    params = hash_key(color_convert, file_format)
+    tx_paths = {s: os.path.splitext(s)[0] + '.tx' for s in sources}
+
+    def check(source: str) -> tuple[str, str | None, bool]:
+        """Return the source hash and whether the TX is up to date
+
+        The hash of an up to date source is the recorded one (None if
+        missing).
+        """
+        state = None if force else _tx_state(tx_paths[source])
+        if state is not None and state.get('params') == params:
+            stamps = state.get('source_stamp', '').split()
+            if _source_stamp(source) in stamps:
+                return source, state.get('source_hash'), True
+            source_hash = hash_file(source, hash_algorithm)
+            if state.get('source_hash') == source_hash:
+                return source, source_hash, True
+            return source, source_hash, False
+        return source, hash_file(source, hash_algorithm), False
+
+    def convert(sources_group: list[str]) -> None:
+        first, *duplicates = sources_group
+        convert_tx(
+            first, tx_paths[first],
+            color_convert=color_convert,
+            file_format=file_format,
+            # Copies share the TX attributes, the stamps of all sources
+            # are recorded so each copy is found up to date
+            metadata={
+                'vgenc:source_stamp': ' '.join(
+                    _source_stamp(s) for s in sources_group),
+                'vgenc:source_hash': stale[first],
+                'vgenc:params': params},
+            overwrite=True)
+        for duplicate in duplicates:
+            shutil.copy2(tx_paths[first], tx_paths[duplicate])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        checked = list(executor.map(check, sources))
+        stale = {s: h for s, h, up_to_date in checked if not up_to_date}
+        built = {
+            h: tx_paths[s] for s, h, up_to_date in checked
+            if up_to_date and h is not None}
+        # Identical sources share one conversion, or an up to date TX
+        groups: dict[str, list[str]] = {}
+        for source, source_hash in stale.items():
+            groups.setdefault(source_hash, []).append(source)
+        copies = {h: groups.pop(h) for h in list(groups) if h in built}
+        logging.info(
+            f'{len(sources) - len(stale)} TX up to date, {len(groups)} to '
+            f'convert, {len(stale) - len(groups)} duplicates')
+        for source_hash, group in copies.items():
+            for source in group:
+                shutil.copy2(built[source_hash], tx_paths[source])
+        list(executor.map(convert, groups.values()))
+    return tx_paths
+
+
+def plan_jobs(
+        jobs: list[dict],
+        workers: int = 1,
+        db_path: str | None = None) -> dict:
+    """Order conversion jobs longest first from predicted durations
+
+    Durations are predicted from the recorded cost of similar jobs (see
+    costs.predict_duration), jobs without history are given the median
+    predicted duration. Starting the longest jobs first shortens the total
+    time on a pool of workers.
+
+    Args:
+        jobs: 'command' ('image', 'movie' or 'batch_image') and the
+          arguments of its function
+        workers: number of jobs running at the same time
+        db_path: cost database (default: vgenc cache dir)
+
+    Returns:
+        'order' of job indices, 'features' and 'predicted' seconds of each
+        job (None without history), and total 'eta' seconds
+    """
+    features = [job_features(job) for job in jobs]
+    predictions = [
+        predict_duration(features=f, workers=workers, db_path=db_path)
+        for f in features]
+    known = [p for p in predictions if p is not None]
+    default = statistics.median(known) if known else 0.0
+    durations = [default if p is None else p for p in predictions]
+    order = sorted(range(len(jobs)), key=lambda i: durations[i], reverse=True)
+    return {
+        'order': order,
+        'features': features,
+        'predicted': predictions,
+        'eta': estimate_makespan([durations[i] for i in order], workers)}
+
+
+def run_jobs(
+        jobs: list[dict],
+        workers: int = 1,
+        db_path: str | None = None,
+        plan: dict | None = None) -> list[dict]:
+    """Run conversion jobs longest first and record their cost
+
+    Args:
+        jobs: see plan_jobs
+        plan: result of plan_jobs for the same jobs and workers
+
+    Returns:
+        'predicted' and measured 'wall' seconds of each job (jobs order)
+    """
+    functions = {
+        'image': convert_image,
+        'movie': convert_movie,
+        'batch_image': batch_convert_image}
+    if plan is None:
+        plan = plan_jobs(jobs, workers, db_path)
+    logging.info(
+        f"{len(jobs)} jobs, ETA {plan['eta']:.0f}s on {workers} workers")
+
+    def run(index: int) -> dict:
+        job = {k: v for k, v in jobs[index].items() if k != 'command'}
+        with record_telemetry(
+                name=jobs[index]['command'], job=True) as telemetry:
+            functions[jobs[index]['command']](**job)
+        # Nothing was run (up to date outputs, etc)
+        if any(r['category'] == 'process' for r in telemetry.records):
+            record_job(
+                plan['features'][index], telemetry.wall_time,
+                telemetry_cpu_time(telemetry), workers, db_path)
+        return {
+            'predicted': plan['predicted'][index],
+            'wall': telemetry.wall_time}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(plan['order'], executor.map(run, plan['order'])))
+    return [results[i] for i in range(len(jobs))]
 
 
 if __name__ == '__main__':
@@ -112,6 +359,18 @@ if __name__ == '__main__':
         '--color-depth', required=True, type=int, metavar='number')
     parser.add_argument(
         '--data-format', required=True, metavar='number')
+    parser.add_argument(
+        '--progress-json', action='store_true', required=False,
+        help='print progress events as JSON lines')
+    parser.add_argument(
+        '--trace', required=False, metavar='path',
+        help='write a Chrome trace of the external commands')
+    parser.add_argument(
+        '--preflight', action='store_true', required=False,
+        help='validate input frames before converting')
+    parser.add_argument(
+        '--checksum', required=False, metavar='algorithm',
+        help='md5, sha1, sha256, xxh64, xxh3, xxh128')
 
     args = parser.parse_args()
     match args.command:
@@ -131,6 +390,11 @@ if __name__ == '__main__':
                 data_format=args.data_format,
                 color_depth=args.color_depth,
                 input_colorspace=args.input_colorspace,
-                display_view=args.display_view)
+                display_view=args.display_view,
+                progress_callback=(
+                    json_lines_emitter() if args.progress_json else None),
+                trace_path=args.trace,
+                preflight=args.preflight,
+                checksum=args.checksum)
         case _:
             print('No command are specified')
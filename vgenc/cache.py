@@ -0,0 +1,30 @@
+import os
+import json
+import hashlib
+
+
+def get_cache_dir(*names: str) -> str:
+    """Return a vgenc cache directory, created if needed
+
+    VGENC_CACHE_DIR overrides the default location (XDG cache directory).
+    """
+    root = os.environ.get('VGENC_CACHE_DIR')
+    if root is None:
+        root = os.path.join(
+            os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+            'vgenc')
+    directory = os.path.join(root, *names)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def file_signature(path: str) -> list:
+    """Cheap identity of a file: absolute path, size and modification time"""
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def hash_key(*values) -> str:
+    """Hash JSON serializable values to build a cache key"""
+    data = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
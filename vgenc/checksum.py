@@ -0,0 +1,174 @@
+import os
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Literal, Iterator
+from concurrent.futures import ThreadPoolExecutor, Future
+from .files import get_frame_info
+try:
+    import xxhash  # Needed for xxHash algorithms only
+except ImportError:
+    xxhash = None
+
+ChecksumLiteral = Literal['md5', 'sha1', 'sha256', 'xxh64', 'xxh3', 'xxh128']
+
+# Extensions follow the *sum tools so manifests can be checked with
+# `md5sum -c`, `sha256sum -c`, `xxhsum -c`
+manifest_extensions = {
+    'md5': '.md5',
+    'sha1': '.sha1',
+    'sha256': '.sha256',
+    'xxh64': '.xxh64',
+    'xxh3': '.xxh3',
+    'xxh128': '.xxh128'}
+
+
+def _new_hash(algorithm: str):
+    if algorithm.startswith('xxh'):
+        if xxhash is None:
+            raise ImportError('xxhash is needed for xxHash checksums')
+        return {
+            'xxh64': xxhash.xxh64,
+            'xxh3': xxhash.xxh3_64,
+            'xxh128': xxhash.xxh3_128}[algorithm]()
+    return hashlib.new(algorithm)
+
+
+def hash_file(
+        path: str,
+        algorithm: ChecksumLiteral = 'sha256',
+        chunk_size: int = 1 << 20) -> str:
+    checksum = _new_hash(algorithm)
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_manifest_path(
+        output_path: str, algorithm: ChecksumLiteral = 'sha256') -> str:
+    """Return manifest path next to outputs
+
+    image.####.exr gives image.sha256, movie.mov gives movie.mov.sha256,
+    a sequence without prefix (####.exr) gives sequence.exr.sha256
+    """
+    ext = manifest_extensions.get(algorithm, f'.{algorithm}')
+    if any(x in output_path for x in ('#', '%')):
+        frame_info = get_frame_info(output_path)
+        directory, name = os.path.split(frame_info['start'])
+        name = name.rstrip('._-')
+        if not name:
+            # Never a hidden file shared by the sequences of the directory
+            name = 'sequence' + frame_info['end']
+        return os.path.join(directory, name + ext)
+    return output_path + ext
+
+
+def read_manifest(manifest_path: str) -> dict[str, str]:
+    """Read manifest lines '<checksum>  <relative path>'"""
+    entries = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            for line in f:
+                checksum, sep, name = line.rstrip('\n').partition('  ')
+                if sep:
+                    entries[name] = checksum
+    return entries
+
+
+@contextmanager
+def _lock_file(path: str, stale_time: float = 60.0) -> Iterator[None]:
+    """Hold path.lock, created exclusively, while a file is updated
+
+    A lock older than stale_time was left by a killed process and is
+    taken over.
+    """
+    lock_path = f'{path}.lock'
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_time:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+class ChecksumManifest:
+    """Hash files in background threads and write a checksum manifest
+
+    Files are hashed as soon as they are added, while they are still in
+    the page cache, overlapping with the conversion of the next ones.
+    Entries of an existing manifest are kept and updated, under a lock
+    file so concurrent encodes to the same directory keep all entries.
+    """
+
+    def __init__(
+            self,
+            manifest_path: str,
+            algorithm: ChecksumLiteral = 'sha256',
+            workers: int = 2):
+        _new_hash(algorithm)  # Fail early on unsupported algorithm
+        self.manifest_path = manifest_path
+        self.algorithm = algorithm
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def add(self, path: str) -> None:
+        if not os.path.exists(path):
+            return
+        future = self.executor.submit(hash_file, path, self.algorithm)
+        with self._lock:
+            self.futures[path] = future
+
+    def close(self) -> dict[str, str]:
+        """Wait for hashes and write the manifest
+
+        Returns:
+            All manifest entries {relative path: checksum}
+        """
+        self.executor.shutdown(wait=True)
+        directory = os.path.dirname(os.path.abspath(self.manifest_path))
+        checksums = {}
+        for path, future in self.futures.items():
+            name = os.path.relpath(os.path.abspath(path), directory)
+            checksums[name.replace(os.sep, '/')] = future.result()
+        with _lock_file(self.manifest_path):
+            entries = read_manifest(self.manifest_path)
+            entries.update(checksums)
+            tmp_path = f'{self.manifest_path}.tmp{os.getpid()}'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for name, checksum in sorted(entries.items()):
+                    f.write(f'{checksum}  {name}\n')
+            os.replace(tmp_path, self.manifest_path)
+        return entries
+
+    def __enter__(self) -> 'ChecksumManifest':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.executor.shutdown(wait=True)
+
+
+def write_checksum_manifest(
+        paths: list[str],
+        manifest_path: str,
+        algorithm: ChecksumLiteral = 'sha256') -> dict[str, str]:
+    with ChecksumManifest(manifest_path, algorithm) as manifest:
+        for path in paths:
+            manifest.add(path)
+    return read_manifest(manifest_path)
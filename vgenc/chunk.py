@@ -0,0 +1,406 @@
+import os
+import re
+import json
+import shutil
+import inspect
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .convert import (
+    convert_movie, concatenate, ffmpeg_video_codecs, ffmpeg_audio_codecs)
+from .cache import file_signature, hash_key
+from .checksum import ChecksumLiteral, ChecksumManifest, get_manifest_path
+from .files import (
+    MissingFramesLiteral, generate_missing_frames, get_frame_info,
+    find_image_sequence_range)
+from .probe import get_movie_duration
+from .process import inherit_telemetry, run
+from .qc import write_qc_stats
+from .progress import ProgressCallback
+
+# Files a job writes in its job directory: segments, their QC rows and
+# temporary names, joined segments and the journal
+_job_file_pattern = re.compile(
+    r'chunk(\d{5}(\.part)?|s)\.\w+|journal\.jsonl(\.tmp\d+)?')
+# convert_movie arguments given to each chunk, and those that do not
+# change encoded segments (left out of the resumable job key)
+_chunk_arguments = {
+    name: parameter.default
+    for name, parameter in inspect.signature(convert_movie).parameters.items()
+    if parameter.kind == parameter.POSITIONAL_OR_KEYWORD}
+_unkeyed_arguments = ('preflight', 'cache_first_pass', 'checksum')
+
+
+def split_frame_range(
+        frame_range: tuple[int, int],
+        chunk_size: int) -> list[tuple[int, int]]:
+    start, end = frame_range
+    return [
+        (s, min(s + chunk_size - 1, end))
+        for s in range(start, end + 1, chunk_size)]
+
+
+def _closed_gop_options(
+        video_codec: str | None,
+        encoder_options: dict | None) -> dict:
+    """Make sure each chunk is a closed GOP starting with a keyframe
+
+    libx264 uses closed GOP by default, libx265 needs open-gop=0. Every
+    encode starts with a keyframe so chunk boundaries are always cuts.
+    """
+    options = dict(encoder_options or {})
+    if ffmpeg_video_codecs.get(video_codec, video_codec) == 'libx265':
+        params = options.get('x265-params')
+        options['x265-params'] = (
+            f'{params}:open-gop=0' if params else 'open-gop=0')
+    return options
+
+
+def fingerprint_frames(
+        sequences: list[str], frame_range: tuple[int, int]) -> str:
+    """Hash signatures (size, mtime) of source frames of a segment
+
+    Frames missing on disk are part of the fingerprint, so filling a gap
+    later changes it too.
+    """
+    signatures = []
+    for sequence in sequences:
+        for frame in range(frame_range[0], frame_range[1] + 1):
+            path = sequence % frame
+            signatures.append(
+                file_signature(path) if os.path.exists(path) else path)
+    return hash_key(signatures)
+
+
+def read_journal(job_dir: str, job_key: str) -> dict[int, dict]:
+    """Read verified segments of a resumable job
+
+    Entries of another job (different key) or whose segment file changed
+    are ignored, so these segments are encoded again. The last entry of a
+    segment wins.
+
+    Returns:
+        {chunk index: journal entry}
+    """
+    journal_path = os.path.join(job_dir, 'journal.jsonl')
+    entries = {}
+    if not os.path.exists(journal_path):
+        return entries
+    with open(journal_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:  # Line cut by a crash
+                continue
+            path = os.path.join(job_dir, entry['path'])
+            if entry['key'] != job_key:
+                logging.warning(f'Ignore segment of another job: {path}')
+            elif (
+                    os.path.exists(path)
+                    and os.path.getsize(path) == entry['size']):
+                entries[entry['index']] = entry
+    return entries
+
+
+def _append_journal(job_dir: str, entry: dict) -> None:
+    with open(os.path.join(job_dir, 'journal.jsonl'), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _remove_job_files(job_dir: str, keep: set[str] | None = None) -> None:
+    """Remove files written by jobs in job_dir, other files are left"""
+    for name in os.listdir(job_dir):
+        if name not in (keep or ()) and _job_file_pattern.fullmatch(name):
+            os.remove(os.path.join(job_dir, name))
+
+
+def _compact_journal(job_dir: str, entries: list[dict]) -> None:
+    """Rewrite the journal with current segments and remove stale ones"""
+    journal_path = os.path.join(job_dir, 'journal.jsonl')
+    tmp_path = f'{journal_path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+    os.replace(tmp_path, journal_path)
+    names = {entry['path'] for entry in entries}
+    names.update(
+        os.path.splitext(name)[0] + '.json' for name in list(names))
+    names.add('journal.jsonl')
+    _remove_job_files(job_dir, keep=names)
+
+
+def _offset_draw_text(
+        draw_text: dict | list[dict] | None,
+        offset: int) -> dict | list[dict] | None:
+    """Shift drawtext start_number so frame numbers continue across chunks
+    """
+    if draw_text is None or offset == 0:
+        return draw_text
+    texts = [draw_text] if isinstance(draw_text, dict) else draw_text
+    texts = [
+        {**t, 'start_number': t['start_number'] + offset}
+        if t.get('start_number') is not None else t
+        for t in texts]
+    return texts[0] if isinstance(draw_text, dict) else texts
+
+
+def _merge_qc_stats(
+        chunk_dir: str,
+        chunks: list[tuple[int, int]],
+        frame_rate: int,
+        qc_stats_path: str) -> None:
+    """Merge per chunk QC rows with frame numbers and times of the movie"""
+    rows = []
+    offset = 0
+    for index, (start, end) in enumerate(chunks):
+        path = os.path.join(chunk_dir, f'chunk{index:05d}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                for row in json.load(f):
+                    row['frame'] += offset
+                    row['pts_time'] += offset / frame_rate
+                    rows.append(row)
+        offset += end - start + 1
+    write_qc_stats(rows, qc_stats_path)
+
+
+def mux_movie(
+        video_path: str,
+        output_path: str,
+        audio_path: str | None = None,
+        audio_codec: str | None = None,
+        audio_quality: int | None = None,
+        audio_bitrate: str | None = None,
+        metadata: dict | None = None) -> None:
+    """Copy video stream to output adding audio and metadata"""
+    command = ['ffmpeg', '-i', video_path]
+    if audio_path is not None:
+        command.extend(['-i', audio_path, '-map', '0:v', '-map', '1:a'])
+    command.extend(['-c:v', 'copy'])
+    if audio_path is not None:
+        # Same as convert_movie: default encoder of the output format
+        if audio_codec is not None:
+            ac = ffmpeg_audio_codecs.get(audio_codec, audio_codec)
+            command.extend(['-c:a', ac])
+        if audio_quality is not None:
+            command.extend(['-q:a', str(audio_quality)])
+        if audio_bitrate is not None:
+            command.extend(['-b:a', str(audio_bitrate)])
+    if metadata is not None:
+        command.extend(['-movflags', 'use_metadata_tags'])
+        for k, v in metadata.items():
+            if v is not None:
+                command.extend(['-metadata', f'{k}={v}'])
+    command.extend([output_path, '-y'])
+    run(command, outputs=[output_path])
+
+
+def convert_movie_chunked(
+        input_path: str | list[str],
+        output_path: str,
+        frame_range: tuple[int, int] | None = None,
+        chunk_size: int = 250,
+        workers: int | None = None,
+        missing_frames: MissingFramesLiteral | None = None,
+        video_codec: str | None = None,
+        encoder_options: dict | None = None,
+        draw_text: dict | list[dict] | None = None,
+        audio_codec: str | None = None,
+        audio_quality: int | None = None,
+        audio_bitrate: str | None = None,
+        metadata: dict | None = None,
+        checksum: ChecksumLiteral | None = None,
+        qc_stats_path: str | None = None,
+        frame_rate: int | None = None,
+        progress_callback: ProgressCallback | None = None,
+        job_dir: str | None = None,
+        incremental: bool = False,
+        **kwargs) -> None:
+    """Encode an image sequence in concurrent chunks joined by stream copy
+
+    The frame range is split in closed GOP chunks encoded with the same
+    rate control settings, then concatenated with concatenate(). Audio and
+    metadata are added in a last stream copy.
+
+    With job_dir, the job is resumable: each finished segment is verified
+    (number of frames) and recorded in job_dir/journal.jsonl. Running the
+    same command again only encodes segments not in the journal, or whose
+    source frames changed (size or modification time). Files of the job
+    are removed once the output is written, and job_dir too if it is then
+    empty.
+
+    With incremental, the job directory (default: output_path.segments)
+    is kept as a segment map of the output. A later run only re-encodes
+    segments with changed source frames and re-assembles the movie by
+    stream copy.
+
+    Args:
+        input_path: image sequences with printf syntax padding, other paths
+          (audio) are muxed at the end
+        frame_range: frames to encode (default: all the frames of the first
+          sequence)
+        chunk_size: number of frames of each chunk
+        workers: number of concurrent encodes (default: a quarter of CPUs)
+        qc_stats_path: QC statistics of all chunks merged in one file
+        job_dir: keep segments and journal in this directory to resume
+          an interrupted encode
+        incremental: keep job_dir segments to only re-encode changed ones
+          next time
+        kwargs: other convert_movie arguments used for each chunk, others
+          (CLI options for instance) are ignored
+    """
+    if isinstance(input_path, str):
+        input_path = [input_path]
+    if incremental and job_dir is None:
+        job_dir = f'{output_path}.segments'
+    kwargs = {k: v for k, v in kwargs.items() if k in _chunk_arguments}
+    sequences = [i for i in input_path if '%' in i]
+    audio_paths = [i for i in input_path if '%' not in i]
+    if frame_range is None and sequences:
+        frame_info = get_frame_info(sequences[0])
+        frame_range = find_image_sequence_range(
+            sequences[0],
+            digits=frame_info['digits'],
+            prefix=frame_info['start'],
+            suffix=frame_info['end'])
+    if frame_range is None:
+        raise ValueError(f'Cannot find sequence frames: {input_path}')
+    chunks = split_frame_range(frame_range, chunk_size)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // 4)
+
+    # Fingerprint sources before generated frames are added
+    fingerprints = []
+    if job_dir is not None:
+        fingerprints = [fingerprint_frames(sequences, c) for c in chunks]
+
+    # Fill missing frames once so chunks can look outside their range
+    missing_files = []
+    if missing_frames is not None:
+        for sequence in sequences:
+            if paths := generate_missing_frames(
+                    sequence, frame_range, frame_range[0], missing_frames):
+                missing_files.extend(paths)
+
+    ext = os.path.splitext(output_path)[1]
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    options = _closed_gop_options(video_codec, encoder_options)
+    done = {}
+    if job_dir is None:
+        chunk_dir = tempfile.mkdtemp(prefix='vgenc-chunks-', dir=output_dir)
+    else:
+        chunk_dir = job_dir
+        os.makedirs(chunk_dir, exist_ok=True)
+        # Frame range is not part of the key so a range change keeps the
+        # segments that still match. Arguments left to their default are
+        # not either, so a new convert_movie argument keeps the segments.
+        encode_arguments = {
+            k: v for k, v in kwargs.items()
+            if k not in _unkeyed_arguments and v != _chunk_arguments[k]}
+        job_key = hash_key(
+            sequences, frame_range[0], chunk_size, frame_rate, video_codec,
+            options, draw_text, qc_stats_path is not None, encode_arguments)
+        done = {
+            index: entry
+            for index, entry in read_journal(chunk_dir, job_key).items()
+            if index < len(chunks)
+            and tuple(entry['frame_range']) == chunks[index]
+            and entry.get('fingerprint') == fingerprints[index]}
+        if done:
+            logging.info(
+                f'Reuse {len(done)}/{len(chunks)} segments of {output_path}')
+    journal_lock = threading.Lock()
+
+    def encode_chunk(index: int) -> str:
+        name = f'chunk{index:05d}{ext}'
+        chunk_path = os.path.join(chunk_dir, name)
+        if index in done:
+            return chunk_path
+        # Encode to a temporary name so a crash never leaves a file that
+        # looks finished
+        part_path = os.path.join(chunk_dir, f'chunk{index:05d}.part{ext}')
+        qc_path = None
+        if qc_stats_path is not None:
+            qc_path = os.path.join(chunk_dir, f'chunk{index:05d}.json')
+        def chunk_callback(event: dict) -> None:
+            progress_callback({**event, 'chunk': index})
+
+        convert_movie(
+            input_path=sequences,
+            output_path=part_path,
+            frame_range=chunks[index],
+            frame_rate=frame_rate,
+            video_codec=video_codec,
+            encoder_options=options,
+            draw_text=_offset_draw_text(
+                draw_text, chunks[index][0] - frame_range[0]),
+            progress_callback=(
+                None if progress_callback is None else chunk_callback),
+            qc_stats_path=qc_path,
+            **kwargs)
+        if not os.path.exists(part_path):
+            raise RuntimeError(f'Chunk {chunks[index]} failed: {part_path}')
+        if job_dir is not None:
+            frames = chunks[index][1] - chunks[index][0] + 1
+            if (encoded := get_movie_duration(part_path)) != frames:
+                raise RuntimeError(
+                    f'Chunk {chunks[index]} has {encoded} frames instead '
+                    f'of {frames}: {part_path}')
+        os.replace(part_path, chunk_path)
+        if job_dir is not None:
+            with journal_lock:
+                _append_journal(chunk_dir, {
+                    'key': job_key,
+                    'index': index,
+                    'frame_range': chunks[index],
+                    'path': name,
+                    'size': os.path.getsize(chunk_path),
+                    'fingerprint': fingerprints[index]})
+        return chunk_path
+
+    succeeded = False
+    try:
+        with ThreadPoolExecutor(
+                max_workers=workers,
+                initializer=inherit_telemetry()) as executor:
+            chunk_paths = list(executor.map(encode_chunk, range(len(chunks))))
+        if qc_stats_path is not None:
+            _merge_qc_stats(chunk_dir, chunks, frame_rate or 25, qc_stats_path)
+        if audio_paths or metadata is not None:
+            video_path = os.path.join(chunk_dir, f'chunks{ext}')
+            concatenate(chunk_paths, video_path)
+            mux_movie(
+                video_path,
+                output_path,
+                audio_path=audio_paths[0] if audio_paths else None,
+                audio_codec=audio_codec,
+                audio_quality=audio_quality,
+                audio_bitrate=audio_bitrate,
+                metadata=metadata)
+        else:
+            concatenate(chunk_paths, output_path)
+        succeeded = os.path.exists(output_path)
+        if succeeded and incremental:
+            entries = read_journal(chunk_dir, job_key)
+            _compact_journal(
+                chunk_dir, [entries[index] for index in range(len(chunks))])
+    finally:
+        # Segments of a resumable job are kept until the output exists,
+        # job_dir can be shared with other files (the output for instance)
+        if job_dir is None:
+            shutil.rmtree(chunk_dir)
+        elif succeeded and not incremental:
+            _remove_job_files(chunk_dir)
+            if not os.listdir(chunk_dir):
+                os.rmdir(chunk_dir)
+        for f in missing_files:
+            os.remove(f)
+    if checksum is not None and os.path.exists(output_path):
+        with ChecksumManifest(
+                get_manifest_path(output_path, checksum),
+                checksum) as manifest:
+            manifest.add(output_path)
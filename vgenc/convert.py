@@ -2,13 +2,29 @@ import os
 import tempfile
 import shutil
 import logging
-from pathlib import Path
+from subprocess import PIPE
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
 from tempfile import NamedTemporaryFile
-from subprocess import run
-from typing import Literal
+from typing import Literal, Iterable, Iterator
 from .files import (
-    MissingFramesLiteral, get_frame_info, generate_missing_frames)
-from .probe import get_image_size
+    MissingFramesLiteral, get_frame_info, find_image_sequence_range,
+    generate_missing_frames)
+from .probe import (
+    get_image_size, get_stream_info, get_video_stream, get_movie_frame_rate,
+    get_keyframes, get_movie_duration, get_extradata_hash)
+from .cache import get_cache_dir, file_signature, hash_key
+from . import exr
+from .checksum import (
+    ChecksumLiteral, ChecksumManifest, get_manifest_path, hash_file)
+from .qc import (
+    build_qc_filter, escape_filter_value, parse_qc_stats, write_qc_stats)
+from .preflight import PreflightError, validate_sequence
+from .process import inherit_telemetry, run
+from .progress import (
+    ProgressCallback, ProgressTracker, print_progress, run_ffmpeg,
+    run_oiiotool)
 try:
     import bpy  # Can be used as backend but shouldn't be mandatory
     from ._bpyutils import (
@@ -36,6 +52,11 @@ ffmpeg_audio_codecs = {
     'opus': 'libopus',
     'vorbis': 'libvorbis',
     'mp3': 'libmp3lame'}
+# Filters packing a left/right pair of inputs into one frame
+ffmpeg_stereo_layouts = {
+    'anaglyph': 'hstack,stereo3d=sbsl:arcg',
+    'sbs': 'hstack',
+    'tb': 'vstack'}
 ffmpeg_color_options = {
     'mjpeg': {
         'colorspace': {
@@ -146,12 +167,19 @@ def convert_image(
         quality: int | None = None,
         codec: str | None = None,
         additional_image_settings: dict | None = None,
+        progress_callback: ProgressCallback | None = None,
+        checksum: ChecksumLiteral | None = None,
+        _report: bool = True,
         **_) -> None:
     """Convert image using oiiotool or bpy
 
     Args:
         input_colorspace: needed for display_view
         auto_cut: resize is mandatory
+        progress_callback: called with progress events (see ProgressTracker),
+          print the progress if None
+        checksum: hash outputs while converting and write a manifest next
+          to them (see get_manifest_path)
     """
 
     if image_sequence:
@@ -165,10 +193,20 @@ def convert_image(
 
         frame_start, frame_end = frame_range
         all_frames = range(frame_start, frame_end + 1, frame_jump)
+        tracker = ProgressTracker(
+            progress_callback or print_progress,
+            total_frames=len(all_frames),
+            stage='image')
+        manifest = None
+        if checksum is not None:
+            manifest = ChecksumManifest(
+                get_manifest_path(output_path, checksum), checksum)
+        bytes_written = 0
         for index, frame in enumerate(all_frames):
+            frame_output_path = build_path(output_path, frame=frame)
             convert_image(
                 input_path=build_path(input_path, frame=frame),
-                output_path=build_path(output_path, frame=frame),
+                output_path=frame_output_path,
                 input_colorspace=input_colorspace,
                 color_convert=color_convert,
                 look=look,
@@ -186,9 +224,20 @@ def convert_image(
                 color_mode=color_mode,
                 color_depth=color_depth,
                 quality=quality,
-                codec=codec)
-            percentage = ((index + 1) * 100) / len(all_frames)
-            print(f'Progress: {round(percentage)}%')
+                codec=codec,
+                progress_callback=progress_callback,
+                _report=progress_callback is None)
+            if os.path.exists(frame_output_path):
+                bytes_written += os.path.getsize(frame_output_path)
+                if manifest is not None:
+                    manifest.add(frame_output_path)
+            tracker.update(
+                frames_done=index + 1,
+                bytes_written=bytes_written,
+                path=frame_output_path)
+        if manifest is not None:
+            manifest.close()
+        tracker.finish()
         return
 
     if use_bpy:
@@ -218,6 +267,8 @@ def convert_image(
                 additional_image_settings=additional_image_settings)
             image.save_render(filepath=output_path)
         print(f'bpy: {output_path}')
+        if checksum is not None and _report:
+            _write_checksum(output_path, checksum)
         data.images.remove(image)
         return
 
@@ -268,13 +319,31 @@ def convert_image(
             command.extend(['-d', d])
     command.extend(['-o', output_path])
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    run(command)
+    if progress_callback is None:
+        run(command, outputs=[output_path])
+    else:
+        run_oiiotool(command, outputs=[output_path])
     if os.path.exists(output_path):
-        print(f'{output_path} is generated.')
+        if checksum is not None and _report:
+            _write_checksum(output_path, checksum)
+        if progress_callback is not None and _report:
+            ProgressTracker(
+                progress_callback, total_frames=1, stage='image').finish(
+                    frames_done=1,
+                    bytes_written=os.path.getsize(output_path),
+                    path=output_path)
+        elif _report:
+            print(f'{output_path} is generated.')
     else:
         logging.error(f'{output_path} was not able to be generated.')
 
 
+def _write_checksum(output_path: str, checksum: ChecksumLiteral) -> None:
+    with ChecksumManifest(
+            get_manifest_path(output_path, checksum), checksum) as manifest:
+        manifest.add(output_path)
+
+
 def _replace_ext(file_path: str, ext: str) -> str:
     path, old_ext = os.path.splitext(file_path)
     return path + ext
@@ -319,36 +388,149 @@ def convert_tx(
     if metadata is not None:
         for md, mdv in metadata.items():
             attrib_arg = '--sattrib' if isinstance(mdv, str) else '--attrib'
-            command.extend([attrib_arg, md, mdv])
+            command.extend([attrib_arg, md, str(mdv)])
     command.extend(['-o', tx_path])
-    run(command)
+    run(command, outputs=[tx_path])
     return tx_path
 
 
+def _first_pass_key(
+        command: list[str],
+        input_paths: list[str],
+        frame_range: tuple[int, int] | None,
+        replacements: dict[str, str] | None = None) -> str:
+    """Identify first pass stats from inputs and encoding parameters
+
+    Input files are identified by size and modification time. Bitrate and
+    pass log path are ignored: stats can be reused for another bitrate.
+
+    Args:
+        input_paths: source inputs (before any temporary conversion)
+        replacements: stable values of temporary paths found in the
+          command (content hash of a sendcmd file, etc)
+    """
+    signature = []
+    for path in input_paths:
+        if '%' not in path:
+            if os.path.exists(path):
+                signature.append(file_signature(path))
+            continue
+        frame_info = get_frame_info(path)
+        sequence_range = frame_range or find_image_sequence_range(
+            path,
+            digits=frame_info['digits'],
+            prefix=frame_info['start'],
+            suffix=frame_info['end']) or (0, -1)
+        paths = [
+            f"{frame_info['start']}{frame:0{frame_info['digits']}}"
+            f"{frame_info['end']}"
+            for frame in range(sequence_range[0], sequence_range[1] + 1)]
+        signature.extend(file_signature(p) for p in paths if os.path.exists(p))
+    parameters = []
+    skip = False
+    for arg in command:
+        if skip:
+            skip = False
+        elif arg in ('-b:v', '-passlogfile'):
+            skip = True
+        else:
+            for path, value in (replacements or {}).items():
+                arg = arg.replace(path, value)
+            parameters.append(arg)
+    return hash_key(signature, parameters)
+
+
+def _store_pass_logs(passlog_dir: str, cache_dir: str) -> None:
+    """Copy pass logs to the cache, visible only once complete"""
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(cache_dir))
+    for name in os.listdir(passlog_dir):
+        shutil.copy(os.path.join(passlog_dir, name), tmp_dir)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:  # Stored by a concurrent job
+        shutil.rmtree(tmp_dir)
+
+
 def write_ffmpeg_sendcmd(
-        frame_data: dict[int, str],
+        frame_data: dict[int, str] | Iterable[tuple[int, str]],
         frame_rate: int,
-        output_path: str):
+        output_path: str,
+        target: str = 'drawtext',
+        start_number: int = 0) -> str | None:
     """Generate an ffmpeg sendcmd file for dynamic drawtext
+
+    Lines are written while frame_data is iterated and a command is only
+    written when the text changes, so long runs of the same text cost one
+    line.
+
+    Args:
+        frame_data: {frame: text} or (frame, text) pairs in frame order
+        target: filter receiving the commands (drawtext@name for a named
+          instance)
+        start_number: frame displayed at time 0
+
+    Returns:
+        Text of the first frame (None if there is no frame)
     """
     dt = 1 / frame_rate  # frame time in seconds
 
     def escape_text(text):
-        return text.replace('\\', '\\\\').replace(':', '\\:')
-
-    lines = []
-    for frame_num, text in sorted(frame_data.items()):
-        # ts = f'{frame_num * dt:.6f}'  # timestamp with microseconds
-        # Offset by half a frame so the text appears visible on the intended
-        # frame. FFmpeg applies `sendcmd` changes from the given timestamp, not
-        # before. This ensures the text is visible exactly when the frame
-        # starts.
-        ts = f'{max((frame_num - 0.5) * dt, 0):.6f}'
-        safe_text = escape_text(text)
-        line = f"{ts} drawtext reinit text='{safe_text}';"
-        lines.append(line)
-    output_path = Path(output_path)
-    output_path.write_text('\n'.join(lines), encoding='utf-8')
+        # Quotes are removed by sendcmd then by the option parser
+        return (
+            text.replace('\\', '\\\\').replace(':', '\\:')
+            .replace("'", r"'\\\''"))
+
+    if isinstance(frame_data, dict):
+        frame_data = sorted(frame_data.items())
+    first_text = previous_text = None
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for frame_num, text in frame_data:
+            if text == previous_text:
+                continue
+            if first_text is None:
+                first_text = text
+            previous_text = text
+            # Offset by half a frame so the text appears visible on the
+            # intended frame. FFmpeg applies `sendcmd` changes from the given
+            # timestamp, not before. This ensures the text is visible exactly
+            # when the frame starts.
+            ts = f'{max((frame_num - start_number - 0.5) * dt, 0):.6f}'
+            f.write(f"{ts} {target} reinit text='{escape_text(text)}';\n")
+    return first_text
+
+
+class _MissingFields(dict):
+    def __missing__(self, key):
+        return ''
+
+
+def iter_exr_header_texts(
+        input_path: str,
+        frame_range: tuple[int, int],
+        template: str,
+        workers: int | None = None) -> Iterator[tuple[int, str]]:
+    """Format a text per frame with fields of EXR headers
+
+    Headers are decoded in Python (no image data is read) by a thread
+    pool. Frames that are missing or can't be formatted are skipped, the
+    previous text stays visible.
+
+    Args:
+        input_path: EXR sequence with printf syntax padding
+        template: str.format template ('{owner} {focalLength:.1f}mm')
+    """
+    def read_text(frame: int) -> str | None:
+        try:
+            header = exr.read_header(input_path % frame)
+            return template.format_map(_MissingFields(header))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    frames = range(frame_range[0], frame_range[1] + 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for frame, text in zip(frames, executor.map(read_text, frames)):
+            if text is not None:
+                yield frame, text
 
 
 def convert_movie(
@@ -367,11 +549,13 @@ def convert_movie(
         color_primaries: str | int | None = None,
         color_transfer: str | int | None = None,
         pixel_format: str | None = None,
+        encoder_options: dict | None = None,
         audio_codec: str | None = None,
         audio_quality: int | None = None,
         audio_bitrate: str | None = None,
         resize: tuple[int, int] | None = None,
         is_stereo: bool = False,
+        stereo_layout: Literal['anaglyph', 'sbs', 'tb'] = 'anaglyph',
         two_pass: bool = False,
         video_filter: dict | list[dict] | None = None,
         draw_text: dict | list[dict] | None = None,
@@ -395,6 +579,12 @@ def convert_movie(
         resolution: tuple[int, int] | None = None,
         scale: tuple[int, int] | None = None,
         crop:  tuple[int, int, int, int] | None = None,
+        progress_callback: ProgressCallback | None = None,
+        preflight: bool = False,
+        checksum: ChecksumLiteral | None = None,
+        qc_stats_path: str | None = None,
+        cache_first_pass: bool = True,
+        smart_cut: bool = False,
         _keep_data: bool = False,
         _render: bool = True,
         **_) -> None:
@@ -405,9 +595,54 @@ def convert_movie(
           ffmpeg: set frame number with printf syntax padding (%04d, %06d, etc)
           bpy: set frame number with hash pattern (###, ####, etc)
         frame_range:
-          needed for missing frames, first item overrides start_number
+          needed for missing frames, first item overrides start_number and
+          the number of frames is limited. For movie inputs, frames are 1
+          based (like extract_frames_from_movie) and sought directly.
+        encoder_options: additional encoder options without dash
+          ({'preset': 'slow', 'row-mt': 1})
+        draw_text: drawtext options, text can also be a {frame: text}
+          mapping, or 'header_text' a str.format template of EXR header
+          fields ('{owner} {focalLength:.1f}mm') read for each frame of
+          frame_range. Per-frame texts are sent with sendcmd.
+        is_stereo: the first two inputs are the left and right views
+        stereo_layout: output of a stereo pair, red/cyan 'anaglyph', or
+          packed side by side ('sbs') or top/bottom ('tb') at full size
+        progress_callback: called with progress events parsed from ffmpeg
+        preflight: validate image sequence inputs in frame_range before
+          encoding and raise PreflightError if a frame is not usable
+        checksum: hash the output and write a manifest next to it
+        qc_stats_path: write per-frame luma min/max/average, black and frozen
+          flags (CSV or JSON) computed in the same filter graph
+        cache_first_pass: reuse two-pass stats of a previous encode with the
+          same inputs and parameters (bitrate excepted)
+        smart_cut: trim a single movie input to frame_range (1 based) by
+          stream copy, only re-encoding partial GOPs at the cut points with
+          the source parameters (no filter can be applied)
     """
 
+    if smart_cut and frame_range is not None:
+        paths = [input_path] if isinstance(input_path, str) else input_path
+        filtered = any(x is not None for x in (
+            resize, video_filter, draw_text, qc_stats_path)) or is_stereo
+        if len(paths) == 1 and '%' not in paths[0] and not filtered:
+            smart_trim(paths[0], output_path, frame_range)
+            if checksum is not None:
+                _write_checksum(output_path, checksum)
+            return
+        logging.warning(
+            'Smart cut needs a single movie input without filters, '
+            'the movie is fully encoded')
+
+    if preflight and frame_range is not None:
+        paths = [input_path] if isinstance(input_path, str) else input_path
+        for path in paths:
+            if not any(x in path for x in ('%', '#')):  # Movie or audio
+                continue
+            report = validate_sequence(
+                path, frame_range, allow_missing=missing_frames is not None)
+            if not report['ok']:
+                raise PreflightError(report)
+
     if use_bpy:
         directory, frame_mapping = find_frame_mapping_from_hash_pattern(
             path=input_path)
@@ -497,8 +732,44 @@ def convert_movie(
 
     if isinstance(input_path, str):
         input_path = [input_path]
+    total_frames = None
+    movie_frame_rate = None
     if frame_range is not None:
-        start_number = frame_range[0]
+        total_frames = frame_range[1] - frame_range[0] + 1
+        if any('%' in i for i in input_path):
+            start_number = frame_range[0]
+        else:
+            # Movie inputs: frames (1 based) are converted to times with
+            # the video stream frame rate
+            movie_frame_rate = get_movie_frame_rate(input_path[0])
+
+    # Per-frame texts are compiled once to streamed sendcmd files
+    if isinstance(draw_text, dict):
+        draw_text = [draw_text]
+    sendcmd_dir = None
+    text_commands = {}
+    for index, t in enumerate(draw_text or []):
+        if not isinstance(t.get('text'), dict) and 'header_text' not in t:
+            continue
+        if sendcmd_dir is None:
+            sendcmd_dir = tempfile.mkdtemp(prefix='vgenc-sendcmd-')
+        first_frame = (
+            frame_range[0] if frame_range is not None else start_number or 0)
+        if 'header_text' in t:
+            if frame_range is None:
+                raise ValueError('header_text needs frame_range')
+            frame_data = iter_exr_header_texts(
+                input_path[0], frame_range, t['header_text'])
+        else:
+            frame_data = t['text']
+        sendcmd_path = os.path.join(sendcmd_dir, f'text{index}.cmd')
+        first_text = write_ffmpeg_sendcmd(
+            frame_data,
+            frame_rate or movie_frame_rate or 25,
+            sendcmd_path,
+            target=f'drawtext@text{index}',
+            start_number=first_frame)
+        text_commands[index] = (sendcmd_path, first_text)
 
     def build_drawtext(
             fontfile: str,
@@ -507,7 +778,8 @@ def convert_movie(
             text: str,
             x: int | str,
             y: int | str,
-            start_number: int | None = None) -> str:
+            start_number: int | None = None,
+            name: str | None = None) -> str:
         content = [
             f'fontfile={fontfile}',
             f'text={text}',
@@ -517,12 +789,13 @@ def convert_movie(
             f'y={y}']
         if start_number is not None:
             content.extend([f'start_number={start_number}'])
-        return f'drawtext={":".join(content)}'
+        instance = 'drawtext' if name is None else f'drawtext@{name}'
+        return f'{instance}={":".join(content)}'
 
-    def build_filter(command: list) -> None:
+    def build_filter(command: list, qc_raw_path: str | None = None) -> None:
         args = []
         if is_stereo:
-            args.append('hstack,stereo3d=sbsl:arcg')
+            args.append(ffmpeg_stereo_layouts[stereo_layout])
         if resize is not None:
             x, y = resize
             args.append(f'scale={x}:{y}')
@@ -538,12 +811,23 @@ def convert_movie(
         if draw_text is not None:
             # Can draw a single text with dict or multiple one with list of
             # dict
-            if isinstance(draw_text, dict):
-                texts = [draw_text]
-            else:
-                texts = draw_text
-            for t in texts:
-                args.append(build_drawtext(**t))
+            for index, t in enumerate(draw_text):
+                if index not in text_commands:
+                    args.append(build_drawtext(**t))
+                    continue
+                sendcmd_path, first_text = text_commands[index]
+                if first_text is None:  # No text on any frame
+                    continue
+                options = {
+                    k: v for k, v in t.items() if k != 'header_text'}
+                options['text'] = escape_filter_value(first_text)
+                args.append('sendcmd=f=' + escape_filter_value(
+                    sendcmd_path, is_path=True))
+                args.append(build_drawtext(name=f'text{index}', **options))
+        if qc_raw_path is not None:
+            # Analyze a copy of the filtered frames in the same graph, the
+            # other split output stays unlabeled to be encoded
+            args.append(f'split=2[qc];{build_qc_filter(qc_raw_path)}')
         if args:
             command.extend(['-filter_complex', ','.join(args)])
 
@@ -555,9 +839,10 @@ def convert_movie(
 
     # Convert all images to a temporary directory
     tmp_dir = None
+    source_paths = list(input_path)
     if convert_input_images and '%' in input_path[0]:
         tmp_dir = tempfile.mkdtemp()
-        source_dir, source_name = os.path.split(input_path)
+        source_dir, source_name = os.path.split(input_path[0])
         for name in sorted(os.listdir(source_dir)):
             source_path = os.path.join(source_dir, name)
             target_path = os.path.join(
@@ -573,10 +858,21 @@ def convert_movie(
             tmp_dir,  _replace_ext(source_name, temporary_ext))
 
     command = ['ffmpeg']
+    video_inputs = input_path[:2] if is_stereo else input_path[:1]
     for i in input_path:
         if '%' in i:
             # For image sequence
             add_frame_rate_and_number(command)
+        elif movie_frame_rate is not None:
+            # Seek before -i jumps to the previous keyframe, then decoded
+            # frames are dropped until the exact time. Video is sought half
+            # a frame early to never drop the first frame.
+            first = frame_range[0] - 1
+            if i in video_inputs:
+                seek = max(0, (first - Fraction(1, 2)) / movie_frame_rate)
+            else:
+                seek = first / movie_frame_rate
+            command.extend(['-ss', f'{float(seek):.6f}'])
         command.extend(['-i', i])
     if all('%' not in i for i in input_path):
         # For movie output
@@ -599,6 +895,14 @@ def convert_movie(
         command.extend(['-b:v', str(video_bitrate)])
     if pixel_format is not None:
         command.extend(['-pix_fmt', pixel_format])
+    if encoder_options is not None:
+        for k, v in encoder_options.items():
+            command.extend([f'-{k}', str(v)])
+    if total_frames is not None:
+        command.extend(['-frames:v', str(total_frames)])
+    if movie_frame_rate is not None:
+        duration = total_frames / movie_frame_rate
+        command.extend(['-t', f'{float(duration):.6f}'])
     # Color options
     if colorspace is not None:
         cs = _get_ffmpeg_color_option(
@@ -615,14 +919,47 @@ def convert_movie(
             value=color_transfer, codec=vc, option='transfert')
         if ct is not None:
             command.extend(['-color_trc', str(ct)])
-    build_filter(command)
+    qc_raw_path = None
+    if qc_stats_path is not None:
+        qc_raw_path = f'{qc_stats_path}.{os.getpid()}.txt'
+    first_pass_command = command.copy()
+    build_filter(command, qc_raw_path=qc_raw_path)
+    passlog_dir = None
     if two_pass:
-        first_pass_command = command.copy()
+        # Each job has its own pass log to allow concurrent encodes
+        passlog_dir = tempfile.mkdtemp(prefix='vgenc-passlog-')
+        passlog = os.path.join(passlog_dir, 'passlog')
+        build_filter(first_pass_command)
         first_pass_command.extend([
-            '-pass', '1', '-an', '-f', 'null',
+            '-pass', '1', '-passlogfile', passlog, '-an', '-f', 'null',
             'NUL' if os.name == 'nt' else '/dev/null'])
-        run(first_pass_command)
-        command.extend(['-pass', '2'])
+        cache_dir = None
+        if cache_first_pass:
+            # Temporary paths change on each run, their content does not
+            replacements = {
+                escape_filter_value(path, is_path=True): hash_file(path)
+                for path, _ in text_commands.values()}
+            if tmp_dir is not None:
+                replacements[input_path[0]] = hash_key(
+                    source_paths[0], input_colorspace, color_convert, look,
+                    display_view, temporary_ext, temporary_compression)
+            cache_dir = os.path.join(
+                get_cache_dir('passlog'),
+                _first_pass_key(
+                    first_pass_command, source_paths, frame_range,
+                    replacements))
+        if cache_dir is not None and os.path.isdir(cache_dir):
+            for name in os.listdir(cache_dir):
+                shutil.copy(os.path.join(cache_dir, name), passlog_dir)
+        else:
+            returncode = run_ffmpeg(
+                first_pass_command,
+                progress_callback=progress_callback,
+                total_frames=total_frames,
+                stage='movie:pass1')
+            if cache_dir is not None and returncode == 0:
+                _store_pass_logs(passlog_dir, cache_dir)
+        command.extend(['-pass', '2', '-passlogfile', passlog])
     if audio_codec is not None:
         ac = ffmpeg_audio_codecs.get(audio_codec, audio_codec)
         command.extend(['-c:a', ac])
@@ -644,11 +981,25 @@ def convert_movie(
                 missing_files.extend(path)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     command.extend([output_path, '-y'])
-    run(command)
+    run_ffmpeg(
+        command,
+        progress_callback=progress_callback,
+        total_frames=total_frames,
+        stage='movie',
+        outputs=[output_path])
+    if checksum is not None and os.path.exists(output_path):
+        _write_checksum(output_path, checksum)
+    if qc_raw_path is not None and os.path.exists(qc_raw_path):
+        write_qc_stats(parse_qc_stats(qc_raw_path), qc_stats_path)
+        os.remove(qc_raw_path)
     for f in missing_files:
         os.remove(f)
     if tmp_dir is not None:
         shutil.rmtree(tmp_dir)
+    if sendcmd_dir is not None:
+        shutil.rmtree(sendcmd_dir)
+    if passlog_dir is not None:
+        shutil.rmtree(passlog_dir)
 
 
 def convert_gif(
@@ -657,11 +1008,27 @@ def convert_gif(
         fps: int = 15,
         optimize: bool = True,
         depth: int = 8,
-        bounce: bool = False) -> None:
+        bounce: bool = False,
+        dither: str = 'sierra2_4a',
+        stats_mode: Literal['full', 'diff', 'single'] = 'full',
+        use_magick: bool = False) -> None:
     """Convert images to gif
 
+    ffmpeg streams frames twice (palettegen, then paletteuse) so memory
+    does not depend on the number of frames. ImageMagick loads all frames
+    at once but can still be used.
+
     Args:
         input_path: it can be a folder directory or list of image paths
+        optimize: only encode changed rectangles between frames
+        depth: bits per channel, with ffmpeg the palette is limited to
+          2 ** (3 * depth) colors (256 at most)
+        bounce: play forward then backward (first and last frames are not
+          repeated)
+        dither: ffmpeg paletteuse dithering (none, bayer, sierra2_4a, etc)
+        stats_mode: ffmpeg palettegen statistics, 'diff' favors moving
+          parts, 'single' computes a palette per frame in a single pass
+        use_magick: use ImageMagick instead of ffmpeg
     """
 
     if isinstance(input_path, str):
@@ -669,32 +1036,421 @@ def convert_gif(
             input_path = [
                 os.path.join(input_path, i) for i in os.listdir(input_path)]
             input_path.sort()
-
-    fps = '1x{}'.format(fps)
-    command = [
-        'magick',
-        '-delay', fps,
-        '-loop', '0']
-    command.extend(input_path)
-    if bounce:
-        command.extend(['-duplicate', '1,-2-1'])
-    if optimize:
-        command.extend(['-layers', 'optimize'])
-    if depth:
-        command.extend(['-depth', str(depth)])
     if not output_path.endswith('.gif'):
         output_path += '.gif'
-    command.append(output_path)
-    run(command)
+
+    if use_magick:
+        command = [
+            'magick',
+            '-delay', '1x{}'.format(fps),
+            '-loop', '0']
+        command.extend(input_path)
+        if bounce:
+            command.extend(['-duplicate', '1,-2-1'])
+        if optimize:
+            command.extend(['-layers', 'optimize'])
+        if depth:
+            command.extend(['-depth', str(depth)])
+        command.append(output_path)
+        run(command, outputs=[output_path])
+        return
+
+    # Bounce is a reversed list of files instead of the reverse filter,
+    # which would keep every frame in memory
+    frames = list(input_path)
+    if bounce:
+        frames.extend(reversed(frames[1:-1]))
+    max_colors = min(256, 2 ** (depth * 3)) if depth else 256
+    # Concat demuxer input gives timestamps from files, rebuild them
+    timing = f'setpts=N/{fps}/TB'
+    tmp_dir = tempfile.mkdtemp(prefix='vgenc-gif-')
+    try:
+        def write_list(name: str, paths: list[str]) -> str:
+            list_path = os.path.join(tmp_dir, name)
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for path in paths:
+                    path = os.path.abspath(path).replace("'", "'\\''")
+                    f.write(f"file '{path}'\n")
+            return list_path
+
+        use_options = [f'dither={dither}']
+        if optimize:
+            use_options.append('diff_mode=rectangle')
+        palette_options = f'max_colors={max_colors}:stats_mode={stats_mode}'
+        command = [
+            'ffmpeg', '-f', 'concat', '-safe', '0',
+            '-i', write_list('frames.txt', frames)]
+        if stats_mode == 'single':
+            # Each frame palette is generated and used in the same graph
+            use_options.append('new=1')
+            graph = (
+                f'[0:v]{timing},split[a][b];[a]palettegen={palette_options}'
+                f"[p];[b][p]paletteuse={':'.join(use_options)}")
+        else:
+            palette_path = os.path.join(tmp_dir, 'palette.png')
+            run([
+                'ffmpeg', '-f', 'concat', '-safe', '0',
+                '-i', write_list('palette.txt', input_path),
+                '-vf', f'{timing},palettegen={palette_options}',
+                '-frames:v', '1', palette_path, '-y'],
+                check=True, outputs=[palette_path])
+            command.extend(['-i', palette_path])
+            graph = (
+                f"[0:v]{timing}[x];[x][1:v]paletteuse={':'.join(use_options)}")
+        command.extend([
+            '-filter_complex', graph,
+            '-r', str(fps), '-loop', '0', output_path, '-y'])
+        run(command, check=True, outputs=[output_path])
+    finally:
+        shutil.rmtree(tmp_dir)
 
 
-def concatenate(input_paths: list[str], output_path: str):
+# ffprobe codec names to encoders able to produce the same stream
+ffprobe_codec_encoders = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'vp9': 'libvpx-vp9',
+    'av1': 'libaom-av1',
+    'prores': 'prores_ks',
+    'mjpeg': 'mjpeg',
+    'theora': 'libtheora'}
+
+
+def _matching_encoder_args(stream: dict) -> list[str]:
+    """Encoder arguments reproducing the parameters of a probed stream
+
+    Used for re-encoded cut boundaries so they can be joined to copied
+    packets of the same stream.
+    """
+    codec_name = stream['codec_name']
+    encoder = ffprobe_codec_encoders.get(codec_name)
+    if encoder is None:
+        raise ValueError(f'Cannot re-encode {codec_name} for smart cut')
+    args = ['-c:v', encoder, '-pix_fmt', stream['pix_fmt']]
+    if profile := stream.get('profile'):
+        profile = profile.lower().replace(' ', '')
+        if codec_name == 'h264' and profile in (
+                'baseline', 'constrainedbaseline', 'main', 'high', 'high10',
+                'high422', 'high444'):
+            args.extend(['-profile:v', profile.replace('constrained', '')])
+        elif codec_name == 'prores':
+            args.extend(['-profile:v', profile])
+    # ffprobe gives h264 levels times 10 (-99 when unknown)
+    if codec_name == 'h264' and (level := stream.get('level', -99)) > 0:
+        args.extend(['-level:v', f'{level / 10:g}'])
+    if encoder == 'libx265':
+        args.extend(['-x265-params', 'open-gop=0'])
+    if bit_rate := stream.get('bit_rate'):
+        args.extend(['-b:v', bit_rate])
+    for key, option in (
+            ('color_space', '-colorspace'),
+            ('color_primaries', '-color_primaries'),
+            ('color_transfer', '-color_trc'),
+            ('color_range', '-color_range')):
+        if (value := stream.get(key)) not in (None, 'unknown'):
+            args.extend([option, value])
+    return args
+
+
+# ffprobe audio codec names to encoders
+ffprobe_audio_encoders = {
+    'aac': 'aac',
+    'opus': 'libopus',
+    'vorbis': 'libvorbis',
+    'mp3': 'libmp3lame',
+    'flac': 'flac',
+    'alac': 'alac',
+    'pcm_s16le': 'pcm_s16le',
+    'pcm_s24le': 'pcm_s24le'}
+
+
+def _stream_signature(info: dict) -> tuple:
+    """Stream parameters that must be equal to concatenate by stream copy
+
+    Containers keep the global headers (avcC, hvcC, etc) of the first input
+    only, so they are compared too when probed (see get_stream_info).
+    """
+    video = audio = None
+    for stream in info['streams']:
+        if stream.get('codec_type') == 'video' and video is None:
+            video = tuple(stream.get(k) for k in (
+                'codec_name', 'profile', 'level', 'width', 'height',
+                'pix_fmt', 'r_frame_rate', 'time_base', 'extradata_hash'))
+        elif stream.get('codec_type') == 'audio' and audio is None:
+            audio = tuple(stream.get(k) for k in (
+                'codec_name', 'sample_rate', 'channels'))
+    return video, audio
+
+
+def _conform_movie(
+        input_path: str,
+        output_path: str,
+        info: dict,
+        reference: dict) -> None:
+    """Re-encode a movie to the stream parameters of a reference
+
+    The picture is scaled to fit and padded, a silent track is added if
+    the reference has audio and the input has none.
+
+    Args:
+        info: ffprobe streams of the input
+        reference: ffprobe streams of the reference
+    """
+    streams = reference['streams']
+    video = next(s for s in streams if s.get('codec_type') == 'video')
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    width, height = video['width'], video['height']
+    command = ['ffmpeg', '-i', input_path]
+    has_audio = any(s.get('codec_type') == 'audio' for s in info['streams'])
+    if audio is not None and not has_audio:
+        layout = audio.get('channel_layout') or 'stereo'
+        command.extend([
+            '-f', 'lavfi', '-i',
+            f"anullsrc=r={audio['sample_rate']}:cl={layout}", '-shortest'])
+    command.extend([
+        '-map', '0:v:0',
+        '-vf',
+        f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
+        f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1',
+        '-r', video['r_frame_rate']])
+    command.extend(_matching_encoder_args(video))
+    time_base = video.get('time_base')
+    if time_base and output_path.lower().endswith(('.mov', '.mp4', '.m4v')):
+        command.extend(['-video_track_timescale', time_base.split('/')[-1]])
+    if audio is None:
+        command.append('-an')
+    else:
+        command.extend(['-map', '1:a:0' if not has_audio else '0:a:0'])
+        command.extend([
+            '-c:a', ffprobe_audio_encoders.get(
+                audio['codec_name'], audio['codec_name']),
+            '-ar', str(audio['sample_rate']),
+            '-ac', str(audio['channels'])])
+        if bit_rate := audio.get('bit_rate'):
+            command.extend(['-b:a', bit_rate])
+    command.extend([output_path, '-y'])
+    run(command, check=True, outputs=[output_path])
+
+
+def conform_inputs(
+        input_paths: list[str],
+        tmp_dir: str,
+        workers: int | None = None) -> list[str]:
+    """Re-encode inputs whose parameters differ from the dominant ones
+
+    Inputs are probed concurrently and grouped by stream parameters. The
+    most common group (first input on ties) is kept as is, other inputs
+    are re-encoded to match it so all can be joined by stream copy.
+
+    Returns:
+        Input paths with outliers replaced by their re-encoded version
+    """
+    def probe(path: str) -> dict:
+        return get_stream_info(path, data_hash=True)
+
+    with ThreadPoolExecutor(
+            max_workers=workers,
+            initializer=inherit_telemetry()) as executor:
+        infos = list(executor.map(probe, input_paths))
+        signatures = [_stream_signature(info) for info in infos]
+        counts = Counter(signatures)
+        dominant = max(signatures, key=lambda x: counts[x])
+        reference = infos[signatures.index(dominant)]
+        paths = list(input_paths)
+
+        def conform(indices: list[int]) -> None:
+            futures = []
+            for i in indices:
+                logging.info(f'Re-encode {input_paths[i]} to match inputs')
+                paths[i] = os.path.join(
+                    tmp_dir,
+                    f'conform{i:04d}{os.path.splitext(input_paths[i])[1]}')
+                futures.append(executor.submit(
+                    _conform_movie, input_paths[i], paths[i], infos[i],
+                    reference))
+            for future in futures:
+                future.result()
+
+        outliers = [i for i, s in enumerate(signatures) if s != dominant]
+        if not outliers:
+            return paths
+        conform(outliers)
+        # The encoder writes its own global headers: if they differ from the
+        # kept inputs ones, every input is re-encoded to share them
+        results = list(executor.map(probe, [paths[i] for i in outliers]))
+        if any(_stream_signature(r) != dominant for r in results):
+            conform([i for i in range(len(paths)) if i not in outliers])
+            results = list(executor.map(probe, paths))
+            if len(set(_stream_signature(r) for r in results)) > 1:
+                raise RuntimeError(
+                    'Inputs cannot be re-encoded to identical streams')
+    return paths
+
+
+def check_decode(input_path: str, frame_count: int | None = None) -> bool:
+    """Decode the first video stream and report errors
+
+    Args:
+        frame_count: expected number of frames
+
+    Returns:
+        True if every frame decodes (and the frame count matches)
+    """
+    command = [
+        'ffmpeg', '-v', 'error', '-xerror', '-i', input_path,
+        '-map', '0:v:0', '-f', 'null', '-']
+    result = run(command, stderr=PIPE, text=True)
+    if result.returncode != 0 or (result.stderr or '').strip():
+        logging.warning(f'Decoding errors in {input_path}: {result.stderr}')
+        return False
+    if frame_count is not None and (
+            count := get_movie_duration(input_path)) != frame_count:
+        logging.warning(
+            f'{input_path} has {count} frames instead of {frame_count}')
+        return False
+    return True
+
+
+def smart_trim(
+        input_path: str,
+        output_path: str,
+        frame_range: tuple[int, int],
+        encoder_args: list[str] | None = None) -> None:
+    """Trim a movie re-encoding only partial GOPs at the cut points
+
+    Frames from the first keyframe inside the range to the last keyframe
+    before its end are stream copied. Frames before and after are
+    re-encoded with parameters matching the source stream. Audio is
+    stream copied for the same time range.
+
+    Joined segments must share the global headers of the source (avcC,
+    hvcC, etc): containers keep the ones of the first segment only. If a
+    re-encoded segment has other headers, or the result does not decode,
+    the whole range is re-encoded instead.
+
+    Args:
+        frame_range: first and last frame to keep, 1 based like
+          extract_frames_from_movie
+        encoder_args: ffmpeg encoder arguments of re-encoded frames
+          (default: matching the probed source stream)
+    """
+    stream = get_video_stream(input_path)
+    frame_rate = Fraction(stream['r_frame_rate'])
+    keyframes, frame_count = get_keyframes(input_path, frame_rate)
+    if encoder_args is None:
+        encoder_args = _matching_encoder_args(stream)
+    first, last = frame_range[0] - 1, min(frame_range[1], frame_count) - 1
+
+    # Copy GOPs fully inside the range, the end of stream closes the last
+    cut_points = [k for k in keyframes if first <= k <= last + 1]
+    if last + 1 == frame_count:
+        cut_points.append(frame_count)
+    cut_points = sorted(set(cut_points))
+    reencode = [(first, last + 1, False)]
+    if len(cut_points) >= 2:
+        segments = []
+        if first < cut_points[0]:
+            segments.append((first, cut_points[0], False))
+        segments.append((cut_points[0], cut_points[-1], True))
+        if cut_points[-1] <= last:
+            segments.append((cut_points[-1], last + 1, False))
+    else:
+        segments = reencode
+
+    ext = os.path.splitext(output_path)[1]
+    tmp_dir = tempfile.mkdtemp(
+        prefix='vgenc-trim-',
+        dir=os.path.dirname(os.path.abspath(output_path)))
+
+    def trim(segments: list[tuple[int, int, bool]]) -> bool:
+        paths = []
+        for i, (start, end, copy) in enumerate(segments):
+            path = os.path.join(tmp_dir, f'segment{i}{ext}')
+            # Seek half a frame away from the first frame: copy lands on
+            # the keyframe at or before, decoding drops frames before
+            offset = Fraction(1, 2) if copy else Fraction(-1, 2)
+            seek = max(0, float((start + offset) / frame_rate))
+            command = [
+                'ffmpeg', '-ss', f'{seek:.6f}', '-i', input_path,
+                '-map', '0:v:0', '-frames:v', str(end - start)]
+            command.extend(['-c:v', 'copy'] if copy else encoder_args)
+            command.extend([path, '-y'])
+            run(command, check=True, outputs=[path])
+            paths.append(path)
+        mixed = len({copy for _, _, copy in segments}) > 1
+        if mixed and (source_hash := get_extradata_hash(input_path)):
+            for path, (_, _, copy) in zip(paths, segments):
+                if not copy and get_extradata_hash(path) != source_hash:
+                    logging.warning(
+                        f'Re-encoded frames of {input_path} have other '
+                        'global headers than the source')
+                    return False
+        video_path = os.path.join(tmp_dir, f'video{ext}')
+        concatenate(paths, video_path)
+        command = [
+            'ffmpeg', '-i', video_path,
+            '-ss', f'{float(first / frame_rate):.6f}',
+            '-t', f'{float((last + 1 - first) / frame_rate):.6f}',
+            '-i', input_path,
+            '-map', '0:v', '-map', '1:a?', '-c', 'copy', output_path, '-y']
+        run(command, check=True, outputs=[output_path])
+        return check_decode(output_path, last + 1 - first)
+
+    try:
+        if not trim(segments):
+            if segments == reencode:
+                raise RuntimeError(f'Cannot trim {input_path}')
+            logging.warning(f'Re-encode all trimmed frames of {input_path}')
+            if not trim(reencode):
+                raise RuntimeError(f'Cannot trim {input_path}')
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def _trim_inputs(
+        input_paths: list[str],
+        frame_ranges: list[tuple[int, int] | None],
+        tmp_dir: str) -> list[str]:
+    paths = []
+    for i, (path, frame_range) in enumerate(zip(input_paths, frame_ranges)):
+        if frame_range is not None:
+            trimmed_path = os.path.join(
+                tmp_dir, f'trim{i:04d}{os.path.splitext(path)[1]}')
+            smart_trim(path, trimmed_path, frame_range)
+            path = trimmed_path
+        paths.append(path)
+    return paths
+
+
+def concatenate(
+        input_paths: list[str],
+        output_path: str,
+        progress_callback: ProgressCallback | None = None,
+        frame_ranges: list[tuple[int, int] | None] | None = None,
+        conform: bool = False):
     """Concatenate a list of files
 
     Args:
         input_paths: list of inputs
         output_path: concatenated file
+        progress_callback: called with progress events parsed from ffmpeg
+        frame_ranges: frames to keep of each input (1 based, None for all
+          frames), trimmed with smart_trim()
+        conform: re-encode inputs with different stream parameters to
+          match the most common ones (see conform_inputs)
     """
+    if conform or (frame_ranges is not None and any(frame_ranges)):
+        tmp_dir = tempfile.mkdtemp(prefix='vgenc-concat-')
+        try:
+            if frame_ranges is not None:
+                input_paths = _trim_inputs(input_paths, frame_ranges, tmp_dir)
+            if conform:
+                input_paths = conform_inputs(input_paths, tmp_dir)
+            concatenate(input_paths, output_path, progress_callback)
+        finally:
+            shutil.rmtree(tmp_dir)
+        return
+
     with NamedTemporaryFile() as temp_f:
         for path in input_paths:
             line = f"file '{os.path.abspath(path)}'\n"
@@ -708,7 +1464,11 @@ def concatenate(input_paths: list[str], output_path: str):
             '-c:v', 'copy',
             '-c:a', 'copy',
             output_path]
-        run(command)
+        run_ffmpeg(
+            command,
+            progress_callback=progress_callback,
+            stage='concatenate',
+            outputs=[output_path])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,206 @@
+import os
+import time
+import heapq
+import sqlite3
+import statistics
+from fractions import Fraction
+from contextlib import closing
+from subprocess import CalledProcessError
+from .cache import get_cache_dir
+from .files import get_frame_info
+from .metadata import find_images, image_extensions
+from .probe import get_image_size, get_video_stream, get_movie_seconds
+from .process import Telemetry
+
+database_name = 'costs.sqlite'
+# Number of the most recent similar jobs a prediction is based on
+history_size = 50
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    command TEXT NOT NULL,
+    codec TEXT,
+    format TEXT,
+    frames INTEGER NOT NULL,
+    pixels INTEGER,
+    workers INTEGER NOT NULL,
+    wall REAL NOT NULL,
+    cpu REAL)'''
+
+
+def _connect(db_path: str | None = None) -> sqlite3.Connection:
+    db_path = db_path or os.path.join(get_cache_dir(), database_name)
+    # Concurrent jobs record their cost at the same time
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute(_schema)
+    return connection
+
+
+def _input_path(job: dict) -> str:
+    input_path = job['input_path']
+    return input_path if isinstance(input_path, str) else input_path[0]
+
+
+def _first_input(job: dict) -> tuple[str, bool]:
+    """Return the first input file and whether the input is a sequence"""
+    input_path = _input_path(job)
+    frame_info = get_frame_info(input_path)
+    if frame_info is None or frame_info['number'] is not None:
+        return input_path, False
+    frame_range = job.get('frame_range')
+    start = frame_range[0] if frame_range else job.get('start_number')
+    if start is None:
+        images = find_images(input_path)
+        return (images[0] if images else input_path), True
+    return (
+        f"{frame_info['start']}{start:0{frame_info['digits']}}"
+        f"{frame_info['end']}"), True
+
+
+def job_features(job: dict) -> dict:
+    """Describe a job for the cost model
+
+    Frames and pixels come from the job arguments when possible, inputs are
+    probed otherwise (pixels is None if the input cannot be read).
+
+    Args:
+        job: 'command' ('image', 'movie' or 'batch_image') and the
+          arguments of its function
+    """
+    first_path, sequence = _first_input(job)
+    is_image = os.path.splitext(first_path)[1].lower() in image_extensions
+
+    pixels = None
+    for key in ('resize', 'fit', 'resolution'):
+        if size := job.get(key):
+            pixels = size[0] * size[1]
+            break
+    else:
+        try:
+            if is_image:
+                size = get_image_size(first_path)
+            else:
+                stream = get_video_stream(first_path)
+                size = stream['width'], stream['height']
+            if size is not None:
+                pixels = size[0] * size[1]
+        except (OSError, CalledProcessError, ValueError, KeyError):
+            pass
+
+    if frame_range := job.get('frame_range'):
+        frame_jump = job.get('frame_jump') or 1
+        frames = (frame_range[1] - frame_range[0]) // frame_jump + 1
+    elif sequence:
+        frames = len(find_images(_input_path(job)))
+    elif not is_image and job['command'] == 'movie':
+        try:
+            stream = get_video_stream(first_path)
+            frames = round(
+                get_movie_seconds(first_path)
+                * Fraction(stream['r_frame_rate']))
+        except (OSError, CalledProcessError, ValueError, KeyError):
+            frames = 1
+    else:
+        frames = 1
+
+    codec = job.get('video_codec') or job.get('compression')
+    return {
+        'command': job['command'],
+        'codec': None if codec is None else str(codec),
+        'format': os.path.splitext(job['output_path'])[1].lower() or None,
+        'frames': max(frames, 1),
+        'pixels': pixels}
+
+
+def telemetry_cpu_time(telemetry: Telemetry) -> float:
+    """Sum user and system time of the recorded commands"""
+    return sum(
+        (r['user'] or 0.0) + (r['system'] or 0.0)
+        for r in telemetry.records if r['category'] == 'process')
+
+
+def record_job(
+        features: dict,
+        wall: float,
+        cpu: float | None = None,
+        workers: int = 1,
+        db_path: str | None = None) -> None:
+    """Store the cost of a finished job
+
+    Args:
+        features: see job_features
+        cpu: None when commands of concurrent jobs cannot be told apart
+        workers: number of jobs running at the same time
+    """
+    with closing(_connect(db_path)) as connection, connection:
+        connection.execute(
+            'INSERT INTO jobs (time, command, codec, format, frames, pixels, '
+            'workers, wall, cpu) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (time.time(), features['command'], features['codec'],
+             features['format'], features['frames'], features['pixels'],
+             workers, wall, cpu))
+
+
+def _work(frames: int, pixels: int | None) -> float:
+    """Frames, weighted by megapixels when the resolution is known"""
+    return frames * (pixels / 1e6 if pixels else 1.0)
+
+
+def predict_duration(
+        job: dict | None = None,
+        features: dict | None = None,
+        workers: int | None = None,
+        db_path: str | None = None) -> float | None:
+    """Predict the wall time of a job from similar recorded jobs
+
+    The median time per frame and megapixel of the latest jobs with the
+    same command, codec and output format is scaled to the job. Without
+    such history, jobs of the same command and format then of the same
+    command are used. Among them, jobs recorded with the same number of
+    workers are preferred.
+
+    Args:
+        job: see job_features (ignored if features is given)
+        workers: number of jobs running at the same time (concurrent jobs
+          share the CPUs and run longer)
+
+    Returns:
+        Seconds, None without any similar recorded job
+    """
+    if features is None:
+        features = job_features(job)
+    criteria = (('command', 'codec', 'format'), ('command', 'format'),
+                ('command',))
+    # Rates per frame and per megapixel frame are not comparable
+    known_size = 'NOT NULL' if features['pixels'] else 'NULL'
+    with closing(_connect(db_path)) as connection:
+        for keys in criteria:
+            for same_workers in ((True, False) if workers else (False,)):
+                conditions = [f'{k} IS ?' for k in keys]
+                values = [features[k] for k in keys]
+                if same_workers:
+                    conditions.append('workers = ?')
+                    values.append(workers)
+                where = ' AND '.join(
+                    conditions + [f'pixels IS {known_size}'])
+                rows = connection.execute(
+                    f'SELECT wall, frames, pixels FROM jobs WHERE {where} '
+                    'ORDER BY time DESC LIMIT ?',
+                    values + [history_size]).fetchall()
+                if rows:
+                    rate = statistics.median(
+                        wall / _work(frames, pixels)
+                        for wall, frames, pixels in rows)
+                    return rate * _work(
+                        features['frames'], features['pixels'])
+
+
+def estimate_makespan(durations: list[float], workers: int) -> float:
+    """Total time of jobs started in the given order on a pool of workers"""
+    finish_times = [0.0] * min(max(workers, 1), max(len(durations), 1))
+    for duration in durations:
+        heapq.heappush(
+            finish_times, heapq.heappop(finish_times) + duration)
+    return max(finish_times)
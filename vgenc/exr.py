@@ -0,0 +1,123 @@
+import struct
+from typing import BinaryIO
+
+exr_magic = 20000630
+pixel_types = {0: 'uint', 1: 'half', 2: 'float'}
+compressions = {
+    0: 'none', 1: 'rle', 2: 'zips', 3: 'zip', 4: 'piz', 5: 'pxr24',
+    6: 'b44', 7: 'b44a', 8: 'dwaa', 9: 'dwab'}
+line_orders = {0: 'increasing_y', 1: 'decreasing_y', 2: 'random_y'}
+# Number of scanlines stored in each chunk by compression
+lines_per_chunk = {
+    0: 1, 1: 1, 2: 1, 3: 16, 4: 32, 5: 16, 6: 32, 7: 32, 8: 32, 9: 256}
+
+
+def _read_null_terminated(f: BinaryIO) -> bytes:
+    value = b''
+    while (char := f.read(1)) != b'\0':
+        if not char:
+            raise ValueError('truncated header')
+        value += char
+    return value
+
+
+def read_attributes(f: BinaryIO) -> tuple[int, dict[str, tuple[str, bytes]]]:
+    """Read the version field and raw attributes of the first header
+
+    The file position is left at the end of the header.
+
+    Returns:
+        Version field and {name: (type name, raw value)}
+    """
+    data = f.read(8)
+    if len(data) != 8:
+        raise ValueError('truncated header')
+    magic, version = struct.unpack('<ii', data)
+    if magic != exr_magic:
+        raise ValueError('not an OpenEXR file')
+    attributes = {}
+    while name := _read_null_terminated(f):
+        type_name = _read_null_terminated(f)
+        size, = struct.unpack('<i', f.read(4))
+        value = f.read(size)
+        if len(value) != size:
+            raise ValueError('truncated header')
+        attributes[name.decode()] = (type_name.decode(), value)
+    return version, attributes
+
+
+def decode_channels(value: bytes) -> list[tuple[str, str]]:
+    """Decode chlist attribute to [(name, pixel type)]"""
+    channels = []
+    index = 0
+    while value[index:index + 1] not in (b'\0', b''):
+        end = value.index(b'\0', index)
+        pixel_type, = struct.unpack('<i', value[end + 1:end + 5])
+        channels.append((
+            value[index:end].decode(),
+            pixel_types.get(pixel_type, str(pixel_type))))
+        index = end + 1 + 16  # type, pLinear, reserved, x/y sampling
+    return channels
+
+
+def decode_attribute(type_name: str, value: bytes):
+    """Convert raw attribute value to Python types
+
+    Returns:
+        Decoded value or None for unsupported types
+    """
+    match type_name:
+        case 'int':
+            return struct.unpack('<i', value)[0]
+        case 'float':
+            return struct.unpack('<f', value)[0]
+        case 'double':
+            return struct.unpack('<d', value)[0]
+        case 'string':
+            return value.decode(errors='replace')
+        case 'stringvector':
+            strings = []
+            index = 0
+            while index < len(value):
+                size, = struct.unpack('<i', value[index:index + 4])
+                strings.append(
+                    value[index + 4:index + 4 + size].decode(errors='replace'))
+                index += 4 + size
+            return strings
+        case 'v2i' | 'box2i' | 'v3i':
+            return list(struct.unpack(f'<{len(value) // 4}i', value))
+        case 'v2f' | 'box2f' | 'v3f' | 'm33f' | 'm44f' | 'chromaticities':
+            return list(struct.unpack(f'<{len(value) // 4}f', value))
+        case 'v2d' | 'v3d' | 'm33d' | 'm44d':
+            return list(struct.unpack(f'<{len(value) // 8}d', value))
+        case 'rational':
+            numerator, denominator = struct.unpack('<iI', value)
+            return numerator / denominator if denominator else None
+        case 'compression':
+            return compressions.get(value[0], value[0])
+        case 'lineOrder':
+            return line_orders.get(value[0], value[0])
+        case 'chlist':
+            return [name for name, _ in decode_channels(value)]
+        case 'timecode':
+            time_and_flags, _ = struct.unpack('<II', value)
+            digits = [
+                (time_and_flags >> shift) & mask for shift, mask in (
+                    (28, 0x3), (24, 0xf), (20, 0x7), (16, 0xf),
+                    (12, 0x7), (8, 0xf), (4, 0x3), (0, 0xf))]
+            return '{}{}:{}{}:{}{}:{}{}'.format(*digits)
+        case 'keycode':
+            return list(struct.unpack('<7i', value))
+    return None
+
+
+def read_header(path: str) -> dict:
+    """Read and decode all supported attributes of the first header"""
+    with open(path, 'rb') as f:
+        _, attributes = read_attributes(f)
+    result = {}
+    for name, (type_name, value) in attributes.items():
+        decoded = decode_attribute(type_name, value)
+        if decoded is not None:
+            result[name] = decoded
+    return result
@@ -1,17 +1,97 @@
-from subprocess import run
+import os
+import threading
+from fractions import Fraction
+from typing import Literal
+from concurrent.futures import ThreadPoolExecutor
+from .probe import get_movie_frame_rate
+from .process import inherit_telemetry, run
+from .progress import ProgressCallback, ProgressTracker, run_ffmpeg
+
+
+def plan_extraction(
+        frames: list[int],
+        workers: int | None = None,
+        gop_size: int = 250) -> Literal['seek', 'select']:
+    """Choose between one seek per frame and a single select pass
+
+    A seek decodes about half a GOP per frame, spread over workers, the
+    select pass decodes every frame up to the last one requested.
+
+    Args:
+        frames: sorted unique frames (1 based)
+        gop_size: expected distance between keyframes
+    """
+    workers = workers or os.cpu_count() or 1
+    seek_cost = len(frames) * (gop_size / 2 + 1) / workers
+    return 'seek' if seek_cost < frames[-1] else 'select'
+
+
+def _extract_frame(
+        input_path: str,
+        output_path: str,
+        frame: int,
+        frame_rate: Fraction) -> None:
+    # Seek half a frame early: decoding drops frames before the time
+    seek = max(0, (frame - 1 - Fraction(1, 2)) / frame_rate)
+    command = [
+        'ffmpeg', '-ss', f'{float(seek):.6f}', '-i', input_path,
+        '-frames:v', '1', output_path, '-y']
+    run(command, check=True, outputs=[output_path])
 
 
 def extract_frames_from_movie(
         input_path: str, output_path: str, frames: int | list[int],
+        progress_callback: ProgressCallback | None = None,
+        workers: int | None = None,
+        method: Literal['seek', 'select'] | None = None,
         **_) -> None:
     """Extract frames from movie using ffmpeg
 
+    Sparse frames are extracted in parallel with one keyframe seek each,
+    dense frames with a single select pass. Outputs are numbered from 1 in
+    frame order either way.
+
     Args:
         output_path:
-          set frame number with printf syntax padding (%04d, %06d, etc)
+          set frame number with printf syntax padding (%04d, %06d, etc),
+          used as is when a single frame is extracted
+        progress_callback: called with progress events parsed from ffmpeg
+        workers: number of concurrent extractions when seeking
+        method: force 'seek' or 'select' (default: see plan_extraction)
     """
     if isinstance(frames, int):
         frames = [frames]
+    frames = sorted(set(frames))
+    numbered = '%' in output_path
+    if method is None:
+        method = plan_extraction(frames, workers)
+    if not numbered and len(frames) > 1:
+        # Without a frame number, outputs cannot be named per seek
+        method = 'select'
+
+    if method == 'seek':
+        frame_rate = get_movie_frame_rate(input_path)
+        tracker = None
+        if progress_callback is not None:
+            tracker = ProgressTracker(
+                progress_callback, total_frames=len(frames), stage='extract')
+        lock = threading.Lock()
+
+        def extract(index: int) -> None:
+            path = output_path % (index + 1) if numbered else output_path
+            _extract_frame(input_path, path, frames[index], frame_rate)
+            if tracker is not None:
+                with lock:
+                    tracker.update(tracker.frames_done + 1)
+
+        with ThreadPoolExecutor(
+                max_workers=workers,
+                initializer=inherit_telemetry()) as executor:
+            list(executor.map(extract, range(len(frames))))
+        if tracker is not None:
+            tracker.finish()
+        return
+
     command = [
         'ffmpeg', '-i', input_path,
         '-filter:v', 'select=' + '+'.join(
@@ -19,4 +99,8 @@ def extract_frames_from_movie(
         '-frames:v', str(len(frames)),
         '-vsync', 'vfr',
         output_path, '-y']
-    run(command)
+    run_ffmpeg(
+        command,
+        progress_callback=progress_callback,
+        total_frames=len(frames),
+        stage='extract')
@@ -1,13 +1,24 @@
 import os
 import re
+import sys
 from pathlib import Path
-from subprocess import run
 from typing import Literal
+from .process import run
 from .probe import get_image_size
 
 MissingFramesLiteral = Literal['previous', 'black', 'checkerboard']
 
 
+def convert_os_path(path):
+    if sys.platform.startswith('linux'):
+        if path.startswith(r'\\'):
+            path = '/' + path.replace('\\', '/')[2:]
+    elif sys.platform.startswith('win'):
+        if path.startswith('/') and not path.startswith('//'):
+            path = r'\\' + os.path.normpath(path)[1:]
+    return path
+
+
 def get_frame_info(path: str) -> dict:
     # "#" successive number
     if pattern := re.search(r'#+', path):
@@ -40,16 +51,22 @@ def find_image_sequence_range(
         suffix: str = '',
         filter_files: bool = False) -> tuple[int, int]:
     dirname = os.path.dirname(path)
-    files = sorted(os.listdir(dirname))
+    files = sorted(os.listdir(dirname or '.'))
     if filter_files:
         files = [f for f in files if os.path.isfile(os.path.join(dirname, f))]
-    search_pattern = rf'{prefix}(\d{{{digits}}}){suffix}'
-    files_ = files[0], files[-1]
-    frames = [
-        int(m.group(1)) for m in [re.search(search_pattern, f) for f in files_]
-        if m is not None]
-    if frames:
-        return (frames[0], frames[-1])
+    # Prefix can be given with its directory (see get_frame_info)
+    search_pattern = re.compile(
+        rf'{re.escape(os.path.basename(prefix))}(\d{{{digits}}})'
+        rf'{re.escape(suffix)}')
+    # Padded frame numbers sort in order, other files are skipped from both
+    # ends
+    first = next(
+        (m for m in map(search_pattern.fullmatch, files) if m), None)
+    last = next(
+        (m for m in map(search_pattern.fullmatch, reversed(files)) if m),
+        None)
+    if first is not None:
+        return (int(first.group(1)), int(last.group(1)))
 
 
 def generate_missing_frames(
@@ -95,7 +112,8 @@ def generate_missing_frames(
                     '-size',
                     f'{x}x{y}',
                     bg_args[c],
-                    target_filepath])
+                    target_filepath],
+                    outputs=[target_filepath])
         missing_files.append(target_filepath)
     return missing_files
 
@@ -158,6 +158,11 @@ oiiotool_bit_depths = {
     (16, 'float'): 'half',
     (32, 'float'): 'float'}
 
+stereo_layouts = [
+    'anaglyph',  # Default one
+    'sbs',
+    'tb']
+
 SelectionDataType = TypedDict('Data', {
     'resolution': str | None,
     'file_format': str | None,
@@ -1,9 +1,9 @@
-# TODO: stereo anaglyph movie
 # TODO: add ocio looks
 # TODO: read ocio config for listing colorspaces, view transforms and looks
 # TODO: image preview
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import (
     Tk, Listbox, Entry, Button, Frame, LabelFrame, StringVar, IntVar,
     OptionMenu, Checkbutton, PhotoImage)
@@ -11,6 +11,7 @@ from tkinter.filedialog import askopenfilename, askdirectory
 from functools import partial
 from typing import Callable, Iterable
 from ..convert import convert_movie
+from ..audio import prepare_audio
 from ..files import get_frame_info, find_image_sequence_range
 from ..probe import get_image_size
 from ..batch import batch_convert_image
@@ -24,6 +25,7 @@ from . import (
     audio_codecs,
     movie_codecs,
     oiiotool_bit_depths,
+    stereo_layouts,
     SelectionDataType,
     find_views_paths)
 
@@ -41,24 +43,58 @@ def convert(
     view_paths = find_views_paths(input_path)
     if view_paths is None:
         view_paths = [(None, input_path)]
+    # Encode left and right views in a single stereo movie
+    stereo_layout = None
+    views = {view for view, _ in view_paths}
+    if stereo_movie_variable.get() and views == {'left', 'right'}:
+        stereo_layout = stereo_layout_variable.get()
+
+    # Read widgets here, views are converted in worker threads
+    if frame_range_variable.get():
+        frame_range = (
+            int(frame_start_entry.get()), int(frame_end_entry.get()))
+        frame_jump = int(frame_jump_entry.get())
+    else:
+        frame_range = None
+        frame_jump = 1
+    input_colorspace = input_colorspace_variable.get()
+
+    # Take the selection batch list if not empty, or take the listboxes
+    # selection
+    if batch_selection:
+        selection = batch_selection.copy()
+    else:
+        selection = [get_current_selection()]
 
-    for view, input_path in view_paths:
+    # Encode audio once for all views and renditions, then copy it in each
+    # movie
+    prepared_audio = {}
+    if audio_path and os.path.exists(audio_path):
+        for data in selection:
+            acodec = data.get('audio_codec')
+            if acodec and acodec not in prepared_audio:
+                prepared_audio[acodec] = prepare_audio(
+                    audio_path, audio_codecs[acodec].get('codec'))
+
+    def convert_view(view: str | None, input_path: str) -> list[dict | None]:
+        """Convert images of a view then encode its movies
+
+        Returns:
+            Movie arguments for each selection (None without movie), the
+            movies are left to encode if stereo_layout is set
+        """
         frame_info = get_frame_info(input_path)
         if frame_info is None:
-            continue
-        if frame_range_variable.get():
-            input_range = (
-                int(frame_start_entry.get()), int(frame_end_entry.get()))
-            frame_jump = int(frame_jump_entry.get())
-        else:
+            return []
+        input_range = frame_range
+        if input_range is None:
             input_range = find_image_sequence_range(
                 path=input_path,
                 digits=frame_info['digits'],
                 prefix=frame_info['start'],
                 suffix=frame_info['end'])
             if input_range is None:
-                continue
-            frame_jump = 1
+                return []
 
         first_frame_path = (
             f"{frame_info['start']}"
@@ -68,13 +104,7 @@ def convert(
             raise IOError(f'Cannot find file: {first_frame_path}')
         input_x, input_y = get_image_size(first_frame_path)
 
-        # Take the selection batch list if not empty, or take the listboxes
-        # selection
-        if batch_selection:
-            selection = batch_selection.copy()
-        else:
-            selection = [get_current_selection()]
-
+        movies = []
         for data in selection:
             resolution = data['resolution']
             resolution_value = resolutions.get(resolution)
@@ -127,45 +157,64 @@ def convert(
                 compression=file_compression,
                 data_format=oiio_color_depth,
                 color_depth=color_depth_value[0],
-                input_colorspace=input_colorspace_variable.get(),
+                input_colorspace=input_colorspace,
                 display_view=view_transform_value)
 
             # Movie
-            if all(x is not None for x in (movie_container, movie_codec)):
-                movie_ext = movie_container_value['ext']
-                movie_quality = movie_codec_value.get('quality')
-                movie_crf = movie_codec_value.get('crf')
-                movie_bitrate = movie_codec_value.get('bitrate')
-                movie_encoder_codec = movie_codec_value.get('codec')
-                movie_encoder_profile = movie_codec_value.get('profile')
-                movie_encoder_pixfmt = movie_codec_value.get('pixel_format')
-
-                # Movie encoding
-                printf_input_path = output_image.replace(
-                    '#' * frame_info['digits'], f"%0{frame_info['digits']}d")
+            if any(x is None for x in (movie_container, movie_codec)):
+                movies.append(None)
+                continue
+            movie_ext = movie_container_value['ext']
+
+            # Movie encoding
+            printf_input_path = output_image.replace(
+                '#' * frame_info['digits'], f"%0{frame_info['digits']}d")
+            output_movie = os.path.join(
+                expanded_output_dir, f'movie.{view}{movie_ext}')
+            if stereo_layout is not None:
                 output_movie = os.path.join(
-                    expanded_output_dir, f'movie.{view}{movie_ext}')
-
-                # Set audio
-                audio_codec = None
-                input_ = printf_input_path
-                if audio_path and os.path.exists(audio_path):
-                    input_ = [printf_input_path, audio_path]
-                    if acodec := data.get('audio_codec'):
-                        audio_codec_value = audio_codecs.get(acodec)
-                        audio_codec = audio_codec_value.get('codec')
-
-                exec_movie_convert(
-                    input_path=input_,
-                    output_path=output_movie,
-                    start_number=input_range[0],
-                    video_codec=movie_encoder_codec,
-                    video_profile=movie_encoder_profile,
-                    video_quality=movie_quality,
-                    constrained_quality=movie_crf,
-                    video_bitrate=movie_bitrate,
-                    pixel_format=movie_encoder_pixfmt,
-                    audio_codec=audio_codec)
+                    expanded_output_dir, f'movie.{stereo_layout}{movie_ext}')
+
+            # Set audio
+            audio_codec = None
+            audio_inputs = []
+            if audio_path and os.path.exists(audio_path):
+                prepared_audio_path = audio_path
+                if acodec := data.get('audio_codec'):
+                    prepared_audio_path = prepared_audio[acodec]
+                    audio_codec = 'copy'
+                audio_inputs = [prepared_audio_path]
+
+            movie = dict(
+                input_path=[printf_input_path, *audio_inputs],
+                output_path=output_movie,
+                start_number=input_range[0],
+                video_codec=movie_codec_value.get('codec'),
+                video_profile=movie_codec_value.get('profile'),
+                video_quality=movie_codec_value.get('quality'),
+                constrained_quality=movie_codec_value.get('crf'),
+                video_bitrate=movie_codec_value.get('bitrate'),
+                pixel_format=movie_codec_value.get('pixel_format'),
+                audio_codec=audio_codec)
+            if stereo_layout is None:
+                exec_movie_convert(**movie)
+            movies.append(movie)
+        return movies
+
+    with ThreadPoolExecutor(max_workers=len(view_paths)) as executor:
+        futures = {
+            view: executor.submit(convert_view, view, path)
+            for view, path in view_paths}
+        view_movies = {view: f.result() for view, f in futures.items()}
+
+    if stereo_layout is not None:
+        # Left view first, the right view input is inserted before audio
+        for left, right in zip(view_movies['left'], view_movies['right']):
+            if left is None or right is None:
+                continue
+            left['input_path'].insert(1, right['input_path'][0])
+            exec_movie_convert(
+                is_stereo=True, stereo_layout=stereo_layout, **left)
 
     clear_batch_selection()
 
@@ -467,6 +516,13 @@ frame_range_variable = IntVar(main)
 frame_range_checkbox = Checkbutton(
     frame_range_frame, text='Frame Range', variable=frame_range_variable,
     command=frame_range_checkbox_command)
+stereo_movie_variable = IntVar(main)
+stereo_movie_checkbox = Checkbutton(
+    frame_range_frame, text='Stereo Movie', variable=stereo_movie_variable)
+stereo_layout_variable = StringVar(main)
+stereo_layout_variable.set(stereo_layouts[0])
+stereo_layout_choice = OptionMenu(
+    frame_range_frame, stereo_layout_variable, *stereo_layouts)
 frame_start_entry = Entry(frame_range_frame)
 frame_end_entry = Entry(frame_range_frame)
 frame_jump_entry = Entry(frame_range_frame)
@@ -518,6 +574,8 @@ frame_range_checkbox.grid(row=0, column=0, sticky='news')
 frame_start_entry.grid(row=0, column=1, sticky='news')
 frame_end_entry.grid(row=0, column=2, sticky='news')
 frame_jump_entry.grid(row=0, column=3, sticky='news')
+stereo_movie_checkbox.grid(row=1, column=0, sticky='news')
+stereo_layout_choice.grid(row=1, column=1, sticky='news')
 action_frame.pack(fill='both')
 resolutions_listbox.pack(side='left', fill='both', expand=True)
 file_formats_listbox.pack(side='left', fill='both', expand=True)
@@ -0,0 +1,221 @@
+import os
+import re
+import csv
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from . import exr
+from .files import get_frame_info
+from .probe import get_metadata_from_image
+try:
+    import pyarrow  # Needed for parquet output only
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+image_extensions = (
+    '.exr', '.dpx', '.tif', '.tiff', '.png', '.jpg', '.jpeg', '.tga', '.hdr',
+    '.tx', '.j2c', '.jp2')
+# OpenEXR standard attribute names to the OpenImageIO names given by iinfo,
+# so EXR and other files share table columns
+exr_attribute_names = {
+    'channels': 'channel list',
+    'owner': 'Copyright',
+    'comments': 'ImageDescription',
+    'capDate': 'DateTime',
+    'pixelAspectRatio': 'PixelAspectRatio',
+    'xDensity': 'XResolution',
+    'expTime': 'ExposureTime',
+    'aperture': 'FNumber',
+    'framesPerSecond': 'FramesPerSecond',
+    'lineOrder': 'openexr:lineOrder',
+    'chunkCount': 'openexr:chunkCount',
+    'dwaCompressionLevel': 'openexr:dwaCompressionLevel',
+    'worldToCamera': 'worldtocamera',
+    'worldToNDC': 'worldtoscreen'}
+
+
+def _normalize(value):
+    """Convert values to types storable in a table cell"""
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return value
+
+
+def read_metadata(path: str) -> dict:
+    """Read metadata of an image
+
+    OpenEXR headers are decoded in Python with attributes named like
+    `iinfo -v` does for other formats.
+    """
+    if path.lower().endswith('.exr'):
+        try:
+            metadata = {
+                exr_attribute_names.get(k, k): v
+                for k, v in exr.read_header(path).items()}
+            if channels := metadata.get('channel list'):
+                metadata['channel list'] = ', '.join(channels)
+        except (OSError, ValueError):
+            metadata = get_metadata_from_image(path)
+    else:
+        metadata = get_metadata_from_image(path)
+    return {k: _normalize(v) for k, v in metadata.items()}
+
+
+def _frame_pattern(input_path: str | None) -> re.Pattern:
+    """Pattern of image names capturing the frame number
+
+    Names in directories need digits between a separator and the extension
+    (image.1001.exr, image_1001.exr), a sequence path gives its own prefix,
+    padding and suffix.
+    """
+    frame_info = None if input_path is None else get_frame_info(input_path)
+    if frame_info is None or frame_info['number'] is not None \
+            or os.path.isdir(input_path):
+        return re.compile(r'.*[._](\d+)\.[^.]+$')
+    return re.compile(
+        re.escape(os.path.basename(frame_info['start']))
+        + rf"(\d{{{frame_info['digits']}}})"
+        + re.escape(frame_info['end']) + '$')
+
+
+def _read_row(path: str, frame: int | None = None) -> dict:
+    row = {
+        'path': path,
+        'frame': frame}
+    try:
+        row.update(read_metadata(path))
+    except Exception as e:  # Keep the row to show unreadable files
+        row['error'] = str(e)
+    return row
+
+
+def find_images(
+        input_path: str,
+        frame_range: tuple[int, int] | None = None) -> list[str]:
+    """List images from a sequence path or a directory tree
+
+    Args:
+        input_path: directory (walked recursively), path with hash or
+          printf frame padding, or a single image
+        frame_range: limit the sequence frames, all found frames if None
+    """
+    if os.path.isdir(input_path):
+        paths = []
+        for root, _, files in os.walk(input_path):
+            paths.extend(
+                os.path.join(root, f) for f in files
+                if os.path.splitext(f)[1].lower() in image_extensions)
+        return sorted(paths)
+    frame_info = get_frame_info(input_path)
+    if frame_info is None or frame_info['number'] is not None:
+        return [input_path] if os.path.isfile(input_path) else []
+    if frame_range is not None:
+        return [
+            f"{frame_info['start']}{frame:0{frame_info['digits']}}"
+            f"{frame_info['end']}"
+            for frame in range(frame_range[0], frame_range[1] + 1)]
+    directory = os.path.dirname(frame_info['start'])
+    pattern = _frame_pattern(input_path)
+    return sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if pattern.match(f))
+
+
+def extract_metadata(
+        paths: list[str],
+        workers: int | None = None,
+        chunksize: int = 16,
+        input_path: str | None = None) -> list[dict]:
+    """Read metadata of many images with a process pool
+
+    Args:
+        input_path: sequence path the paths were found from, used to read
+          frame numbers (see find_images), names are parsed as in a
+          directory if None
+
+    Returns:
+        One row per image with 'path' and 'frame' columns
+    """
+    pattern = _frame_pattern(input_path)
+    frames = [
+        int(m.group(1)) if (m := pattern.match(os.path.basename(p)))
+        else None for p in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            _read_row, paths, frames, chunksize=chunksize))
+
+
+def _columns(rows: list[dict]) -> list[str]:
+    columns = {'path': None, 'frame': None}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    return list(columns)
+
+
+def write_metadata_table(
+        rows: list[dict], output_path: str, table: str = 'metadata') -> None:
+    """Write rows to SQLite (.db, .sqlite), CSV (.csv) or Parquet (.parquet)
+    """
+    columns = _columns(rows)
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext == '.csv':
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif ext == '.parquet':
+        if pyarrow is None:
+            raise ImportError('pyarrow is needed to write parquet files')
+        # Mixed types in a column are stored as text
+        data = {}
+        for column in columns:
+            values = [row.get(column) for row in rows]
+            types = {type(v) for v in values if v is not None}
+            if len(types) > 1:
+                values = [None if v is None else str(v) for v in values]
+            data[column] = values
+        pyarrow.parquet.write_table(pyarrow.table(data), output_path)
+    elif ext in ('.db', '.sqlite', '.sqlite3'):
+        sql_types = {int: 'INTEGER', float: 'REAL', bool: 'INTEGER'}
+
+        def column_type(column: str) -> str:
+            types = {
+                type(row[column]) for row in rows
+                if row.get(column) is not None}
+            if len(types) == 1:
+                return sql_types.get(types.pop(), 'TEXT')
+            if types == {int, float}:
+                return 'REAL'
+            return 'TEXT'
+
+        def quote(name: str) -> str:
+            return '"{}"'.format(name.replace('"', '""'))
+
+        definitions = ', '.join(
+            f'{quote(c)} {column_type(c)}' for c in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        with sqlite3.connect(output_path) as connection:
+            connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+            connection.execute(f'CREATE TABLE "{table}" ({definitions})')
+            connection.executemany(
+                f'INSERT INTO "{table}" VALUES ({placeholders})',
+                ([row.get(c) for c in columns] for row in rows))
+            connection.execute(
+                f'CREATE INDEX "{table}_frame" ON "{table}" (frame)')
+        connection.close()
+    else:
+        raise ValueError(f'Unsupported table format: {ext}')
+
+
+def extract_metadata_table(
+        input_path: str,
+        output_path: str,
+        frame_range: tuple[int, int] | None = None,
+        workers: int | None = None) -> list[dict]:
+    """Extract metadata of a sequence or directory tree to a table file"""
+    rows = extract_metadata(
+        find_images(input_path, frame_range), workers=workers,
+        input_path=input_path)
+    write_metadata_table(rows, output_path)
+    return rows
@@ -1,4 +1,10 @@
-from subprocess import run
+import re
+import json
+from fractions import Fraction
+from subprocess import PIPE
+from .files import get_frame_info, find_image_sequence_range
+from .probe import get_movie_frame_rate, get_movie_seconds, get_video_stream
+from .process import run
 
 
 def generate_vertical_sliced_image(
@@ -17,4 +23,194 @@ def generate_vertical_sliced_image(
         '-tile', 'x1',
         '-colorspace', 'srgb',
         output])
-    run(command)
+    run(command, outputs=[output])
+
+
+def generate_vertical_sliced_movie(
+        inputs: list[str],
+        output: str,
+        width: int,
+        height: int,
+        frame_range: tuple[int, int] | None = None,
+        frame_rate: int = 25,
+        video_codec: str | None = None,
+        encoder_options: dict | None = None) -> None:
+    """Sequence version of generate_vertical_sliced_image
+
+    Every input is resized to height and its left part is cropped to a
+    slice, slices are stacked side by side. All frames are processed by a
+    single ffmpeg graph, written to a movie or an image sequence.
+
+    Args:
+        inputs: image sequences with printf syntax padding, or movies
+        output: movie or image sequence with printf syntax padding
+        frame_range: image sequence frames, 1 based frames for movies
+        video_codec: ffmpeg encoder name
+        encoder_options: additional encoder options without dash
+    """
+    slice_width = int(width / len(inputs))
+    if '%' not in output:
+        slice_width -= slice_width % 2  # Chroma subsampled encoders
+    command = ['ffmpeg']
+    for path in inputs:
+        if '%' in path:
+            command.extend(['-framerate', str(frame_rate)])
+            if frame_range is not None:
+                command.extend(['-start_number', str(frame_range[0])])
+        elif frame_range is not None:
+            # Fast seek, decoding drops frames until the exact time
+            seek = (frame_range[0] - 1.5) / get_movie_frame_rate(path)
+            command.extend(['-ss', f'{max(0, float(seek)):.6f}'])
+        command.extend(['-i', path])
+    graph = [
+        f'[{i}:v]scale=-2:{height},crop={slice_width}:{height}:0:0[s{i}]'
+        for i in range(len(inputs))]
+    labels = ''.join(f'[s{i}]' for i in range(len(inputs)))
+    if len(inputs) > 1:
+        graph.append(f'{labels}hstack=inputs={len(inputs)}:shortest=1[out]')
+    else:
+        graph[0] = graph[0].replace('[s0]', '[out]')
+    command.extend(['-filter_complex', ';'.join(graph), '-map', '[out]'])
+    if frame_range is not None:
+        command.extend(['-frames:v', str(frame_range[1] - frame_range[0] + 1)])
+    if '%' in output and frame_range is not None:
+        command.extend(['-start_number', str(frame_range[0])])
+    if video_codec is not None:
+        command.extend(['-c:v', video_codec])
+    for k, v in (encoder_options or {}).items():
+        command.extend([f'-{k}', str(v)])
+    command.extend([output, '-y'])
+    run(command, check=True, outputs=[] if '%' in output else [output])
+
+
+def _timecode(frame: int, frame_rate: Fraction) -> str:
+    """Non-drop-frame timecode counting frames at the rounded rate
+
+    23.976 fps content counts 24 frames per timecode second, so it runs
+    slower than the clock, like NDF timecodes of video tools.
+    """
+    fps = round(frame_rate)
+    seconds, frames = divmod(frame, fps)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}:{frames:02d}'
+
+
+def generate_contact_sheet(
+        input_path: str,
+        output_path: str,
+        columns: int = 5,
+        rows: int = 4,
+        tile_width: int = 320,
+        frame_rate: int | None = None,
+        frame_range: tuple[int, int] | None = None,
+        keyframes_only: bool = True,
+        thumbnail_batch: int | None = None,
+        index_path: str | None = None) -> dict:
+    """Generate a contact sheet from a movie or image sequence in one pass
+
+    Frames are picked at regular intervals, scaled and tiled by a single
+    ffmpeg graph, no intermediate still is written. Times of the picked
+    frames are read from showinfo to write a JSON tile index.
+
+    Args:
+        input_path: movie or image sequence with printf syntax padding
+        rows: 1 gives a thumbnail strip
+        frame_rate: image sequence frame rate (default 25), movies use the
+          stream frame rate
+        frame_range: image sequence frames (default: all files found)
+        keyframes_only: decode movie keyframes only, much faster but tiles
+          are snapped to keyframes
+        thumbnail_batch: pick the most representative frame of batches of
+          this many frames (ffmpeg thumbnail filter) before sampling
+        index_path: write the tile index there
+
+    Returns:
+        Tile index: columns, rows, tile size and tiles with position, time
+        from the first frame, frame and non-drop-frame timecode
+    """
+    tile_count = columns * rows
+    command = ['ffmpeg']
+    if '%' in input_path:
+        if frame_range is None:
+            frame_info = get_frame_info(input_path)
+            frame_range = find_image_sequence_range(
+                input_path,
+                digits=frame_info['digits'],
+                prefix=frame_info['start'],
+                suffix=frame_info['end'])
+            if frame_range is None:
+                raise ValueError(f'Cannot find sequence frames: {input_path}')
+        frame_rate = Fraction(frame_rate or 25)
+        start_number = frame_range[0]
+        start_time = 0.0
+        duration = (frame_range[1] - frame_range[0] + 1) / frame_rate
+        command.extend([
+            '-framerate', str(frame_rate),
+            '-start_number', str(start_number),
+            '-i', input_path])
+    else:
+        stream = get_video_stream(input_path)
+        frame_rate = Fraction(stream['r_frame_rate'])
+        start_number = 1  # Same numbering as extract_frames_from_movie
+        # Timestamps of movies do not always start at 0
+        try:
+            start_time = float(stream.get('start_time', 0))
+        except ValueError:  # N/A
+            start_time = 0.0
+        duration = get_movie_seconds(input_path)
+        if keyframes_only:
+            command.extend(['-skip_frame', 'nokey'])
+        command.extend(['-i', input_path])
+    interval = duration / tile_count
+    filters = []
+    if thumbnail_batch is not None:
+        filters.append(f'thumbnail={thumbnail_batch}')
+    filters.extend([
+        r'select=isnan(prev_selected_t)+gte(t-prev_selected_t\,'
+        f'{float(interval):.6f})',
+        f'scale={tile_width}:-2',
+        'showinfo',
+        f'tile={columns}x{rows}'])
+    command.extend([
+        '-an', '-vf', ','.join(filters), '-vsync', 'vfr',
+        '-frames:v', '1', output_path, '-y'])
+    result = run(command, check=True, stderr=PIPE, text=True,
+                 outputs=[output_path])
+
+    tiles = []
+    tile_size = (tile_width, None)
+    for line in result.stderr.splitlines():
+        if 'Parsed_showinfo' not in line or 'pts_time:' not in line:
+            continue
+        time_ = float(
+            re.search(r'pts_time:\s*(\S+)', line).group(1)) - start_time
+        if size := re.search(r'\ss:(\d+)x(\d+)', line):
+            tile_size = (int(size.group(1)), int(size.group(2)))
+        index = len(tiles)
+        if index >= tile_count:
+            break
+        frame = round(time_ * frame_rate)
+        row, column = divmod(index, columns)
+        tiles.append({
+            'index': index,
+            'column': column,
+            'row': row,
+            'x': column * tile_size[0],
+            'y': row * tile_size[1] if tile_size[1] else None,
+            'time': time_,
+            'frame': frame + start_number,
+            'timecode': _timecode(frame, frame_rate)})
+    sheet_index = {
+        'input': input_path,
+        'image': output_path,
+        'columns': columns,
+        'rows': rows,
+        'tile_width': tile_size[0],
+        'tile_height': tile_size[1],
+        'frame_rate': float(frame_rate),
+        'tiles': tiles}
+    if index_path is not None:
+        with open(index_path, 'w') as f:
+            json.dump(sheet_index, f, indent=1)
+    return sheet_index
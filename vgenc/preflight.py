@@ -0,0 +1,216 @@
+import os
+import re
+import struct
+import statistics
+from subprocess import PIPE
+from concurrent.futures import ThreadPoolExecutor
+from . import exr
+from .files import get_frame_info
+from .process import run
+try:
+    import OpenImageIO  # Faster header reads but shouldn't be mandatory
+except ImportError:
+    OpenImageIO = None
+
+
+class PreflightError(IOError):
+    def __init__(self, report: dict):
+        self.report = report
+        super().__init__(format_report(report))
+
+
+def _read_exr_header(path: str) -> dict:
+    """Read resolution, channels and data type from an OpenEXR header
+
+    For scanline files, the chunk offset table is checked against the file
+    size to detect truncated files without reading pixels.
+    """
+    with open(path, 'rb') as f:
+        version, attributes = exr.read_attributes(f)
+        channels = exr.decode_channels(attributes['channels'][1])
+        xmin, ymin, xmax, ymax = struct.unpack(
+            '<iiii', attributes['dataWindow'][1])
+        width, height = xmax - xmin + 1, ymax - ymin + 1
+
+        is_tiled = bool(version & 0x200)
+        is_multipart = bool(version & 0x1000)
+        if not is_tiled and not is_multipart:
+            compression = attributes['compression'][1][0]
+            chunk_count = -(-height // exr.lines_per_chunk.get(compression, 1))
+            table = f.read(chunk_count * 8)
+            if len(table) != chunk_count * 8:
+                raise ValueError('truncated offset table')
+            offsets = struct.unpack(f'<{chunk_count}Q', table)
+            file_size = os.fstat(f.fileno()).st_size
+            if 0 in offsets or max(offsets) + 8 > file_size:
+                raise ValueError('truncated pixel data')
+            # Last chunk: y coordinate and data size followed by data
+            f.seek(max(offsets))
+            _, data_size = struct.unpack('<ii', f.read(8))
+            if max(offsets) + 8 + data_size > file_size:
+                raise ValueError('truncated pixel data')
+    return {
+        'width': width,
+        'height': height,
+        'channels': tuple(name for name, _ in channels),
+        'data_type': '/'.join(sorted(set(t for _, t in channels)))}
+
+
+def _read_dpx_header(path: str) -> dict:
+    with open(path, 'rb') as f:
+        header = f.read(804)
+    if len(header) < 804:
+        raise ValueError('truncated header')
+    order = {b'SDPX': '>', b'XPDS': '<'}.get(header[:4])
+    if order is None:
+        raise ValueError('not a DPX file')
+    file_size, = struct.unpack(f'{order}I', header[16:20])
+    if os.path.getsize(path) < file_size:
+        raise ValueError('truncated pixel data')
+    width, height = struct.unpack(f'{order}II', header[772:780])
+    descriptor, bit_size = header[800], header[803]
+    channels = {50: ('R', 'G', 'B'), 51: ('R', 'G', 'B', 'A'),
+                6: ('Y',)}.get(descriptor, (str(descriptor),))
+    return {
+        'width': width,
+        'height': height,
+        'channels': channels,
+        'data_type': f'uint{bit_size}'}
+
+
+def _read_oiio_header(path: str) -> dict:
+    image_input = OpenImageIO.ImageInput.open(path)
+    if image_input is None:
+        raise ValueError(OpenImageIO.geterror())
+    spec = image_input.spec()
+    image_input.close()
+    return {
+        'width': spec.width,
+        'height': spec.height,
+        'channels': tuple(spec.channelnames),
+        'data_type': str(spec.format)}
+
+
+def _read_iinfo_header(path: str) -> dict:
+    output = run(['iinfo', path], stdout=PIPE, stderr=PIPE, text=True)
+    # '/path/file.jpg : 1920 x 1080, 3 channel, uint8 jpeg'
+    matched = re.search(
+        r'(\d+)\s*x\s*(\d+)(?:\s*x\s*\d+)?,\s*(\d+)\s+channel,\s*(\S+)',
+        output.stdout or '')
+    if output.returncode != 0 or matched is None:
+        raise ValueError((output.stderr or '').strip() or 'unreadable')
+    width, height, channels, data_type = matched.groups()
+    return {
+        'width': int(width),
+        'height': int(height),
+        'channels': int(channels),
+        'data_type': data_type}
+
+
+def read_image_header(path: str) -> dict:
+    """Read image description without decoding pixels
+
+    Pure Python parsers are used for OpenEXR and DPX, OpenImageIO module
+    for other formats if available, iinfo otherwise.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.exr':
+        return _read_exr_header(path)
+    if ext == '.dpx':
+        return _read_dpx_header(path)
+    if OpenImageIO is not None:
+        return _read_oiio_header(path)
+    return _read_iinfo_header(path)
+
+
+def _check_frame(path: str) -> dict:
+    result = {'path': path, 'size': None, 'header': None, 'error': None}
+    try:
+        result['size'] = os.path.getsize(path)
+    except OSError:
+        return result
+    if result['size'] == 0:
+        return result
+    try:
+        result['header'] = read_image_header(path)
+    except (OSError, ValueError, KeyError, IndexError, struct.error) as e:
+        result['error'] = str(e) or type(e).__name__
+    return result
+
+
+def validate_sequence(
+        input_path: str,
+        frame_range: tuple[int, int],
+        frame_jump: int = 1,
+        workers: int | None = None,
+        size_ratio: float = 4.0,
+        allow_missing: bool = False) -> dict:
+    """Check every frame of an image sequence from headers only
+
+    Args:
+        input_path: path with hash or printf frame padding
+        workers: number of threads (default from ThreadPoolExecutor)
+        size_ratio: frames smaller or larger than the median size by this
+          ratio are reported as outliers
+        allow_missing: missing frames are reported but still ok
+
+    Returns:
+        Report dict with 'ok' and lists of frame numbers for each problem
+    """
+    frame_info = get_frame_info(input_path)
+    frames = list(range(frame_range[0], frame_range[1] + 1, frame_jump))
+    paths = [
+        f"{frame_info['start']}{frame:0{frame_info['digits']}}"
+        f"{frame_info['end']}" for frame in frames]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(frames, executor.map(_check_frame, paths)))
+
+    report = {
+        'input_path': input_path,
+        'frame_range': frame_range,
+        'missing': [],
+        'empty': [],
+        'unreadable': {},
+        'mismatched': {},
+        'size_outliers': [],
+        'reference': None}
+    headers = {}
+    for frame, result in results.items():
+        if result['size'] is None:
+            report['missing'].append(frame)
+        elif result['size'] == 0:
+            report['empty'].append(frame)
+        elif result['error'] is not None:
+            report['unreadable'][frame] = result['error']
+        else:
+            headers[frame] = result['header']
+
+    if headers:
+        # The most common description is the reference
+        descriptions = [tuple(sorted(h.items())) for h in headers.values()]
+        reference = max(set(descriptions), key=descriptions.count)
+        report['reference'] = dict(reference)
+        for frame, header in headers.items():
+            if tuple(sorted(header.items())) != reference:
+                report['mismatched'][frame] = header
+        sizes = [results[frame]['size'] for frame in headers]
+        median = statistics.median(sizes)
+        for frame in headers:
+            size = results[frame]['size']
+            if size * size_ratio < median or size > median * size_ratio:
+                report['size_outliers'].append(frame)
+
+    errors = ['empty', 'unreadable', 'mismatched']
+    if not allow_missing:
+        errors.append('missing')
+    report['ok'] = not any(report[k] for k in errors)
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{report['input_path']} {report['frame_range']}"]
+    for key in ('missing', 'empty', 'unreadable', 'mismatched',
+                'size_outliers'):
+        if values := report[key]:
+            lines.append(f'  {key}: {sorted(values)}')
+    return '\n'.join(lines)
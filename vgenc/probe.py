@@ -1,22 +1,15 @@
-from subprocess import run, PIPE
-import subprocess
-import platform
+from subprocess import PIPE
 import json
 import re
-
-startupinfo = None
-if platform.system() == 'Windows':
-    # Do not pop window when process is called
-    startupinfo = subprocess.STARTUPINFO()
-    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+from fractions import Fraction
+from .process import run
 
 
 def get_movie_size(input_path: str, stream_index: int = 0) -> tuple[int, int]:
     command = [
         'ffprobe', input_path,
         '-show_entries', 'stream=width,height', '-print_format', 'json']
-    output = run(
-        command, check=True, stdout=PIPE, startupinfo=startupinfo).stdout
+    output = run(command, check=True, stdout=PIPE).stdout
     result = json.loads(output.decode())
     size = (
         result['streams'][stream_index]['width'],
@@ -28,8 +21,7 @@ def get_movie_duration(input_path: str, stream_index: int = 0) -> int:
     command = [
         'ffprobe', input_path, '-count_packets',
         '-show_entries', 'stream=nb_read_packets', '-print_format', 'json']
-    output = run(
-        command, check=True, stdout=PIPE, startupinfo=startupinfo).stdout
+    output = run(command, check=True, stdout=PIPE).stdout
     result = json.loads(output.decode())
     value = result['streams'][stream_index]['nb_read_packets']
     return int(value)
@@ -37,8 +29,7 @@ def get_movie_duration(input_path: str, stream_index: int = 0) -> int:
 
 def get_image_size(input_path: str) -> tuple[int, int]:
     command = ['iinfo', input_path]
-    output = run(
-        command, check=True, stdout=PIPE, startupinfo=startupinfo).stdout
+    output = run(command, check=True, stdout=PIPE).stdout
     # Output format:
     # '/path/to/file.jpg : WIDTH x HEIGHT, additional info...'
     # We want to extract WIDTH and HEIGHT numbers separated by 'x'.
@@ -55,8 +46,7 @@ def get_image_size(input_path: str) -> tuple[int, int]:
 
 def get_metadata_from_movie(input_path: str) -> dict:
     command = ['ffprobe', input_path, '-show_format', '-print_format', 'json']
-    output = run(
-        command, check=True, stdout=PIPE, startupinfo=startupinfo).stdout
+    output = run(command, check=True, stdout=PIPE).stdout
     result = json.loads(output.decode())
     return result['format']['tags']
 
@@ -79,17 +69,23 @@ def get_metadata_from_image(input_path: str) -> dict:
         return value
 
     command = ['iinfo', '-v', input_path]
-    output = run(
-        command, check=True, stdout=PIPE, startupinfo=startupinfo).stdout
+    output = run(command, check=True, stdout=PIPE).stdout
     return {
         get_key(i): get_value(i)
         for i in output.decode().split('\n') if len(i.split(': ')) > 1}
 
 
-def get_stream_info(input_path: str) -> dict:
+def get_stream_info(input_path: str, data_hash: bool = False) -> dict:
+    """Return ffprobe description of the streams
+
+    Args:
+        data_hash: add the hash of global headers (extradata_hash) to
+          streams having some
+    """
     command = ['ffprobe', input_path, '-show_streams', '-print_format', 'json']
-    output = run(
-        command, check=True, stdout=PIPE, startupinfo=startupinfo).stdout
+    if data_hash:
+        command.extend(['-show_data_hash', 'sha256'])
+    output = run(command, check=True, stdout=PIPE).stdout
     return json.loads(output.decode())
 
 
@@ -100,3 +96,67 @@ def has_audio_stream(input_path: str) -> bool:
             if stream['codec_type'] == 'audio':
                 return True
     return False
+
+
+def get_video_stream(input_path: str) -> dict:
+    """Return ffprobe description of the first video stream"""
+    for stream in get_stream_info(input_path)['streams']:
+        if stream.get('codec_type') == 'video':
+            return stream
+    raise ValueError(f'No video stream: {input_path}')
+
+
+def get_movie_frame_rate(input_path: str) -> Fraction:
+    stream = get_video_stream(input_path)
+    return Fraction(stream['r_frame_rate'])
+
+
+def get_keyframes(
+        input_path: str,
+        frame_rate: Fraction | None = None) -> tuple[list[int], int]:
+    """List keyframes of the first video stream from packets (no decoding)
+
+    Returns:
+        Keyframe numbers (0 based, presentation order) and number of frames
+    """
+    if frame_rate is None:
+        frame_rate = get_movie_frame_rate(input_path)
+    command = [
+        'ffprobe', input_path, '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-print_format', 'json']
+    output = run(command, check=True, stdout=PIPE).stdout
+    packets = [
+        (float(p['pts_time']), 'K' in p.get('flags', ''))
+        for p in json.loads(output.decode())['packets']
+        if p.get('pts_time') not in (None, 'N/A')]
+    if not packets:
+        return [], 0
+    origin = min(pts for pts, _ in packets)
+    keyframes = sorted(
+        round((pts - origin) * frame_rate)
+        for pts, key in packets if key)
+    return keyframes, len(packets)
+
+
+def get_extradata_hash(input_path: str) -> str | None:
+    """Hash of the first video stream global headers (avcC, hvcC, etc)
+
+    Returns:
+        'algorithm:hex' or None if the stream has no global headers
+    """
+    command = [
+        'ffprobe', input_path, '-select_streams', 'v:0', '-show_streams',
+        '-show_data_hash', 'sha256', '-print_format', 'json']
+    output = run(command, check=True, stdout=PIPE).stdout
+    streams = json.loads(output.decode()).get('streams', [])
+    if streams and streams[0].get('extradata_size'):
+        return streams[0].get('extradata_hash')
+
+
+def get_movie_seconds(input_path: str) -> float:
+    """Duration in seconds read from the container (no packet counting)"""
+    command = [
+        'ffprobe', input_path, '-show_entries', 'format=duration',
+        '-print_format', 'json']
+    output = run(command, check=True, stdout=PIPE).stdout
+    return float(json.loads(output.decode())['format']['duration'])
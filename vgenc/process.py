@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import platform
+import threading
+import subprocess
+from contextvars import ContextVar
+from subprocess import Popen, PIPE, CompletedProcess, CalledProcessError
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+startupinfo = None
+if platform.system() == 'Windows':
+    # Do not pop window when process is called
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+# ru_maxrss is given in kilobytes except on macOS
+_maxrss_unit = 1 if sys.platform == 'darwin' else 1024
+
+_active_telemetries: list['Telemetry'] = []
+# Telemetries of the jobs the current thread is running for
+_job_telemetries: ContextVar[tuple['Telemetry', ...]] = ContextVar(
+    'job_telemetries', default=())
+_lock = threading.Lock()
+
+
+class Telemetry:
+    """Collect records of external commands and Python spans"""
+
+    def __init__(self, name: str = 'job'):
+        self.name = name
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.records: list[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: dict) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    @property
+    def wall_time(self) -> float:
+        end_time = self.end_time or time.perf_counter()
+        return end_time - self.start_time
+
+    def to_trace_events(self) -> list[dict]:
+        """Convert records to Chrome trace_event format"""
+        pid = os.getpid()
+        events = [{
+            'name': self.name,
+            'cat': 'job',
+            'ph': 'X',
+            'ts': 0,
+            'dur': self.wall_time * 1e6,
+            'pid': pid,
+            'tid': 0}]
+        for record in self.records:
+            args = {
+                k: v for k, v in record.items()
+                if k not in ('name', 'category', 'start', 'wall', 'thread')}
+            events.append({
+                'name': record['name'],
+                'cat': record['category'],
+                'ph': 'X',
+                'ts': (record['start'] - self.start_time) * 1e6,
+                'dur': record['wall'] * 1e6,
+                'pid': pid,
+                'tid': record['thread'],
+                'args': args})
+        return events
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Write a JSON file loadable in chrome://tracing or Perfetto"""
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.to_trace_events()}, f)
+
+    def summary(self) -> list[dict]:
+        """Aggregate command records by program name
+
+        The 'python' row is the job wall time not covered by any command.
+        """
+        rows = {}
+        for record in self.records:
+            if record['category'] != 'process':
+                continue
+            row = rows.setdefault(record['name'], {
+                'name': record['name'],
+                'count': 0,
+                'wall': 0.0,
+                'cpu': 0.0,
+                'max_rss': 0,
+                'bytes_written': 0,
+                'failures': 0})
+            row['count'] += 1
+            row['wall'] += record['wall']
+            row['cpu'] += (record['user'] or 0.0) + (record['system'] or 0.0)
+            row['max_rss'] = max(row['max_rss'], record['max_rss'] or 0)
+            row['bytes_written'] += record['bytes_written']
+            if record['returncode'] != 0:
+                row['failures'] += 1
+        covered = 0.0
+        current_start = current_end = None
+        intervals = sorted(
+            (r['start'], r['start'] + r['wall']) for r in self.records
+            if r['category'] == 'process')
+        for start, end in intervals:
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    covered += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            covered += current_end - current_start
+        result = sorted(rows.values(), key=lambda r: r['wall'], reverse=True)
+        result.append({
+            'name': 'python',
+            'count': 1,
+            'wall': max(self.wall_time - covered, 0.0),
+            'cpu': None,
+            'max_rss': None,
+            'bytes_written': None,
+            'failures': None})
+        return result
+
+    def format_summary(self) -> str:
+        header = ('name', 'count', 'wall', 'cpu', 'max_rss', 'bytes_written',
+                  'failures')
+        lines = [
+            f'{self.name}: {self.wall_time:.2f}s',
+            '{:<12}{:>8}{:>12}{:>12}{:>14}{:>16}{:>10}'.format(*header)]
+        for row in self.summary():
+            values = [
+                '-' if row[k] is None else
+                f'{row[k]:.2f}' if isinstance(row[k], float) else
+                str(row[k]) for k in header]
+            lines.append(
+                '{:<12}{:>8}{:>12}{:>12}{:>14}{:>16}{:>10}'.format(*values))
+        return '\n'.join(lines)
+
+
+def _add_record(record: dict) -> None:
+    with _lock:
+        telemetries = list(_active_telemetries)
+    for telemetry in telemetries + list(_job_telemetries.get()):
+        telemetry.add(record)
+
+
+def inherit_telemetry() -> Callable[[], None]:
+    """Return a thread initializer recording in the caller job telemetries
+
+    Threads don't inherit the context, ThreadPoolExecutor running commands
+    for a job are given it as initializer.
+    """
+    telemetries = _job_telemetries.get()
+
+    def initializer() -> None:
+        _job_telemetries.set(telemetries)
+    return initializer
+
+
+@contextmanager
+def record_telemetry(
+        name: str = 'job',
+        trace_path: str | None = None,
+        print_summary: bool = False,
+        job: bool = False) -> Iterator[Telemetry]:
+    """Record every command run through `run` inside the context
+
+    Args:
+        name: job name used in the trace and summary
+        trace_path: write a Chrome trace_event JSON file at exit
+        print_summary: print the summary table to stderr at exit
+        job: record only the commands of the current thread (and of
+          executors using inherit_telemetry) instead of every thread, for
+          concurrent jobs
+    """
+    telemetry = Telemetry(name)
+    if job:
+        token = _job_telemetries.set(_job_telemetries.get() + (telemetry,))
+    else:
+        with _lock:
+            _active_telemetries.append(telemetry)
+    try:
+        yield telemetry
+    finally:
+        telemetry.end_time = time.perf_counter()
+        if job:
+            _job_telemetries.reset(token)
+        else:
+            with _lock:
+                _active_telemetries.remove(telemetry)
+        if trace_path is not None:
+            telemetry.write_chrome_trace(trace_path)
+        if print_summary:
+            print(telemetry.format_summary(), file=sys.stderr)
+
+
+@contextmanager
+def span(name: str, **args) -> Iterator[None]:
+    """Record a Python section in the active telemetries"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_record({
+            'name': name,
+            'category': 'python',
+            'start': start,
+            'wall': time.perf_counter() - start,
+            'thread': threading.get_ident(),
+            **args})
+
+
+def _get_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def run(
+        command: list[str],
+        check: bool = False,
+        stdout: int | None = None,
+        stderr: int | None = None,
+        text: bool = False,
+        on_line: Callable[[str], None] | None = None,
+        outputs: list[str] | None = None) -> CompletedProcess:
+    """Run an external command and record its resource usage
+
+    Child CPU time and peak memory are read with os.wait4 when available.
+
+    Args:
+        stdout, stderr: same as subprocess.run (PIPE to capture)
+        on_line: called with each stdout line, stdout is not captured
+        outputs: files written by the command, used to count bytes written
+    """
+    if on_line is not None:
+        stdout, text = PIPE, True
+    start = time.perf_counter()
+    process = Popen(
+        command, stdout=stdout, stderr=stderr, text=text,
+        startupinfo=startupinfo)
+    rusage = None
+    if on_line is not None:
+        readers = {}
+        if process.stderr is not None:
+            readers['stderr'] = _start_reader(process.stderr)
+        for line in process.stdout:
+            on_line(line)
+        process.stdout.close()
+        out = None
+        err = readers['stderr'].join_result() if readers else None
+    else:
+        readers = {
+            name: _start_reader(stream) for name, stream in (
+                ('stdout', process.stdout), ('stderr', process.stderr))
+            if stream is not None}
+        out = readers['stdout'].join_result() if 'stdout' in readers else None
+        err = readers['stderr'].join_result() if 'stderr' in readers else None
+    if hasattr(os, 'wait4'):
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        process.wait()
+    wall = time.perf_counter() - start
+    _add_record({
+        'name': os.path.basename(command[0]),
+        'category': 'process',
+        'argv': [str(arg) for arg in command],
+        'start': start,
+        'wall': wall,
+        'user': rusage.ru_utime if rusage else None,
+        'system': rusage.ru_stime if rusage else None,
+        'max_rss': rusage.ru_maxrss * _maxrss_unit if rusage else None,
+        'returncode': process.returncode,
+        'bytes_written': sum(_get_size(p) for p in outputs or []),
+        'thread': threading.get_ident()})
+    if check and process.returncode != 0:
+        raise CalledProcessError(process.returncode, command, out, err)
+    return CompletedProcess(command, process.returncode, out, err)
+
+
+class _Reader(threading.Thread):
+    """Read a whole stream in a thread to avoid pipe deadlocks"""
+
+    def __init__(self, stream):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.result = None
+
+    def run(self):
+        self.result = self.stream.read()
+        self.stream.close()
+
+    def join_result(self):
+        self.join()
+        return self.result
+
+
+def _start_reader(stream) -> _Reader:
+    reader = _Reader(stream)
+    reader.start()
+    return reader
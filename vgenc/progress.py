@@ -0,0 +1,169 @@
+import sys
+import json
+import time
+import logging
+from typing import Callable, IO
+from .process import run
+
+ProgressCallback = Callable[[dict], None]
+
+
+class ProgressTracker:
+    """Build progress events from frames done and send them to a callback
+
+    Events are dict with keys:
+        stage: name of the running step (image, movie, extract, etc)
+        status: 'progress' or 'end'
+        frames_done: number of processed frames
+        total_frames: number of frames to process, None if unknown
+        fps: processed frames per second
+        speed: encoder speed relative to real time (ffmpeg only)
+        bytes_written: size of the generated data
+        elapsed: seconds since the tracker has been created
+        eta: estimated remaining seconds, None if unknown
+    """
+
+    def __init__(
+            self,
+            callback: ProgressCallback,
+            total_frames: int | None = None,
+            stage: str = 'convert'):
+        self.callback = callback
+        self.total_frames = total_frames
+        self.stage = stage
+        self.start_time = time.monotonic()
+        self.frames_done = 0
+        self.bytes_written = 0
+
+    def update(
+            self,
+            frames_done: int | None = None,
+            bytes_written: int | None = None,
+            fps: float | None = None,
+            speed: float | None = None,
+            status: str = 'progress',
+            **extra) -> dict:
+        if frames_done is not None:
+            self.frames_done = frames_done
+        if bytes_written is not None:
+            self.bytes_written = bytes_written
+        elapsed = time.monotonic() - self.start_time
+        if fps is None and elapsed > 0:
+            fps = self.frames_done / elapsed
+        eta = None
+        if self.total_frames is not None and fps:
+            eta = max(self.total_frames - self.frames_done, 0) / fps
+        event = {
+            'stage': self.stage,
+            'status': status,
+            'frames_done': self.frames_done,
+            'total_frames': self.total_frames,
+            'fps': fps,
+            'speed': speed,
+            'bytes_written': self.bytes_written,
+            'elapsed': elapsed,
+            'eta': eta}
+        event.update(extra)
+        self.callback(event)
+        return event
+
+    def finish(self, **extra) -> dict:
+        return self.update(status='end', eta=0.0, **extra)
+
+
+def print_progress(event: dict) -> None:
+    """Default callback printing the percentage of processed frames"""
+    if event['status'] != 'progress' or not event['total_frames']:
+        return
+    percentage = (event['frames_done'] * 100) / event['total_frames']
+    print(f'Progress: {round(percentage)}%')
+
+
+def json_lines_emitter(stream: IO | None = None) -> ProgressCallback:
+    """Create a callback writing each event as a JSON line
+
+    Args:
+        stream: file object to write to (stdout by default)
+    """
+    def emit(event: dict) -> None:
+        target = sys.stdout if stream is None else stream
+        target.write(json.dumps(event) + '\n')
+        target.flush()
+    return emit
+
+
+def ffmpeg_progress_parser(
+        callback: Callable[[dict], None]) -> Callable[[str], None]:
+    """Create a line handler grouping `ffmpeg -progress` key=value lines
+
+    The callback is called with a block each time the 'progress' key is
+    reached.
+    """
+    block = {}
+
+    def parse_line(line: str) -> None:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return
+        block[key] = value.strip()
+        if key == 'progress':
+            callback(dict(block))
+            block.clear()
+    return parse_line
+
+
+def _to_number(value: str | None, type_: type = float) -> int | float | None:
+    if value is None:
+        return None
+    try:
+        return type_(value.rstrip('x'))
+    except ValueError:  # N/A
+        return None
+
+
+def run_ffmpeg(
+        command: list[str],
+        progress_callback: ProgressCallback | None = None,
+        total_frames: int | None = None,
+        stage: str = 'movie',
+        outputs: list[str] | None = None) -> int:
+    """Run ffmpeg command and report progress from `-progress pipe:1`
+
+    Returns:
+        The process return code
+    """
+    if progress_callback is None:
+        return run(command, outputs=outputs).returncode
+    command = [command[0], '-progress', 'pipe:1', '-nostats', *command[1:]]
+    tracker = ProgressTracker(
+        progress_callback, total_frames=total_frames, stage=stage)
+
+    def on_block(block: dict) -> None:
+        update = tracker.finish if block['progress'] == 'end' else (
+            tracker.update)
+        update(
+            frames_done=_to_number(block.get('frame'), int),
+            bytes_written=_to_number(block.get('total_size'), int),
+            fps=_to_number(block.get('fps')) or None,
+            speed=_to_number(block.get('speed')))
+
+    return run(
+        command,
+        on_line=ffmpeg_progress_parser(on_block),
+        outputs=outputs).returncode
+
+
+def run_oiiotool(
+        command: list[str], outputs: list[str] | None = None) -> int:
+    """Run oiiotool keeping its verbose output out of stdout
+
+    Lines are sent to logging so stdout stays available for JSON events.
+
+    Returns:
+        The process return code
+    """
+    def on_line(line: str) -> None:
+        if line := line.rstrip():
+            logging.debug(line)
+
+    return run(command, on_line=on_line, outputs=outputs).returncode
@@ -0,0 +1,104 @@
+import os
+import re
+import csv
+import json
+
+qc_columns = ['frame', 'pts_time', 'y_min', 'y_max', 'y_avg', 'black',
+              'frozen']
+
+
+def escape_filter_value(value: str, is_path: bool = False) -> str:
+    """Escape a filter option value used inside a filtergraph
+
+    Option level escaping is done first, then filtergraph level.
+
+    Args:
+        is_path: the value is a file path, Windows separators are replaced
+          by slashes (texts keep their backslashes)
+    """
+    if is_path and os.name == 'nt':
+        value = value.replace('\\', '/')
+    value = (
+        value.replace('\\', '\\\\').replace("'", "\\'").replace(':', '\\:'))
+    for char in '\\\'[],;':
+        value = value.replace(char, '\\' + char)
+    return value
+
+
+def build_qc_filter(
+        raw_stats_path: str,
+        black_threshold: float = 0.1,
+        freeze_noise: str = '-60dB',
+        freeze_duration: float = 0.5) -> str:
+    """Build a filter branch printing per-frame QC metadata
+
+    The branch starts from a [qc] label fed by a split of the main chain
+    and ends in a nullsink, so the encoded stream is not affected.
+    """
+    raw_stats_path = escape_filter_value(raw_stats_path, is_path=True)
+    return ','.join([
+        '[qc]signalstats',
+        f'blackdetect=d=0:pix_th={black_threshold}',
+        f'freezedetect=n={freeze_noise}:d={freeze_duration}',
+        f'metadata=mode=print:file={raw_stats_path}',
+        'nullsink'])
+
+
+def parse_qc_stats(raw_stats_path: str) -> list[dict]:
+    """Parse `metadata=mode=print` output to one row per frame
+
+    Black and frozen intervals are given on start and end frames only,
+    they are expanded to every frame in between.
+    """
+    rows = []
+    events = {'black': [], 'frozen': []}
+    with open(raw_stats_path) as f:
+        for line in f:
+            if matched := re.match(
+                    r'frame:(\d+)\s+pts:\S+\s+pts_time:(\S+)', line):
+                rows.append({
+                    'frame': int(matched.group(1)),
+                    'pts_time': float(matched.group(2)),
+                    'y_min': None,
+                    'y_max': None,
+                    'y_avg': None,
+                    'black': False,
+                    'frozen': False})
+                continue
+            key, sep, value = line.strip().partition('=')
+            if not sep or not rows:
+                continue
+            match key:
+                case 'lavfi.signalstats.YMIN':
+                    rows[-1]['y_min'] = float(value)
+                case 'lavfi.signalstats.YMAX':
+                    rows[-1]['y_max'] = float(value)
+                case 'lavfi.signalstats.YAVG':
+                    rows[-1]['y_avg'] = float(value)
+                case 'lavfi.black_start':
+                    events['black'].append([float(value), None])
+                case 'lavfi.black_end' if events['black']:
+                    events['black'][-1][1] = float(value)
+                case 'lavfi.freezedetect.freeze_start':
+                    events['frozen'].append([float(value), None])
+                case 'lavfi.freezedetect.freeze_end' if events['frozen']:
+                    events['frozen'][-1][1] = float(value)
+    for key, intervals in events.items():
+        for start, end in intervals:
+            for row in rows:
+                if row['pts_time'] >= start and (
+                        end is None or row['pts_time'] < end):
+                    row[key] = True
+    return rows
+
+
+def write_qc_stats(rows: list[dict], output_path: str) -> None:
+    """Write QC rows as CSV, or JSON if output_path ends with .json"""
+    if output_path.endswith('.json'):
+        with open(output_path, 'w') as f:
+            json.dump(rows, f, indent=1)
+        return
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=qc_columns)
+        writer.writeheader()
+        writer.writerows(rows)